@@ -0,0 +1,79 @@
+# alert_images.py - Adjuntos de las alertas: vista completa reducida y recortes
+import cv2
+import numpy as np
+
+
+def encode_capped(image, max_bytes, quality=80, min_quality=40):
+    """
+    Codifica a JPEG bajando la calidad (y luego la escala) hasta que el
+    resultado entre en `max_bytes`. Retorna los bytes.
+    """
+    while True:
+        for q in range(quality, min_quality - 1, -10):
+            ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, q])
+            if ok and (not max_bytes or buffer.nbytes <= max_bytes):
+                return buffer.tobytes()
+        height, width = image.shape[:2]
+        if width <= 64 or height <= 64:
+            return buffer.tobytes()
+        image = cv2.resize(image, (int(width * 0.75), int(height * 0.75)), interpolation=cv2.INTER_AREA)
+
+
+class AlertImageBuilder:
+    """
+    Prepara las imágenes de una alerta. La vista completa reutiliza el JPEG
+    ya codificado para el stream si cumple el ancho y el tamaño máximos; si
+    no, se reduce y se recodifica. Además agrega hasta `max_crops` recortes
+    ajustados a las cajas en violación. Cada adjunto queda por debajo de
+    `max_bytes` para no saturar enlaces de subida lentos.
+    """
+    def __init__(self, max_width=960, max_bytes=150 * 1024, quality=80, max_crops=2,
+                 crop_padding=0.25, crop_min_size=96):
+        self.max_width = max_width
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.max_crops = max_crops
+        self.crop_padding = crop_padding
+        self.crop_min_size = crop_min_size
+        self.stats = {'reused': 0, 'encoded': 0, 'crops': 0}
+
+    def full_view(self, frame, jpeg=None):
+        """JPEG de la vista completa, reutilizando `jpeg` cuando es posible"""
+        if jpeg is not None and (frame is None or frame.shape[1] <= self.max_width) \
+                and (not self.max_bytes or len(jpeg) <= self.max_bytes):
+            self.stats['reused'] += 1
+            return jpeg
+        if frame is None:
+            # Solo hay bytes: decodificar para poder reducirlos
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        height, width = frame.shape[:2]
+        if self.max_width and width > self.max_width:
+            scale = self.max_width / width
+            frame = cv2.resize(frame, (self.max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+        self.stats['encoded'] += 1
+        return encode_capped(frame, self.max_bytes, self.quality)
+
+    def crops(self, frame, boxes):
+        """JPEGs recortados alrededor de cada caja xyxy (con margen), en orden"""
+        if frame is None or boxes is None or not self.max_crops:
+            return []
+        height, width = frame.shape[:2]
+        result = []
+        for x1, y1, x2, y2 in np.asarray(boxes, dtype=np.float32).reshape(-1, 4)[:self.max_crops]:
+            # Margen proporcional y tamaño mínimo para que el recorte tenga contexto
+            pad_x = max((x2 - x1) * self.crop_padding, (self.crop_min_size - (x2 - x1)) / 2, 0)
+            pad_y = max((y2 - y1) * self.crop_padding, (self.crop_min_size - (y2 - y1)) / 2, 0)
+            left, top = int(max(0, x1 - pad_x)), int(max(0, y1 - pad_y))
+            right, bottom = int(min(width, x2 + pad_x)), int(min(height, y2 + pad_y))
+            if right - left < 2 or bottom - top < 2:
+                continue
+            result.append(encode_capped(frame[top:bottom, left:right], self.max_bytes, self.quality))
+        self.stats['crops'] += len(result)
+        return result
+
+    def build(self, frame, jpeg=None, boxes=None):
+        """Retorna la lista de adjuntos: primero la vista completa y luego los recortes"""
+        return [self.full_view(frame, jpeg)] + self.crops(frame, boxes)
+
+    def get_stats(self):
+        return dict(self.stats)
@@ -1,18 +1,29 @@
 # app.py - Backend Flask modular para Sistema de Detección de Cascos
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response, stream_with_context
 import cv2
 import time
 import threading
-import base64
 from datetime import datetime
-import json
 import re
 import os
 
 # Importar nuestros módulos existentes
 import config
-from detector import HelmetDetector
+from detector import HelmetDetector, InferenceSettings, ModelRegistry
 from notifier import TelegramNotifier
+from alert_images import AlertImageBuilder
+from outbox import NotificationOutbox
+from pipeline import FramePipeline
+from frame_store import FrameStore
+from log_buffer import LogRingBuffer
+from event_hub import EventHub
+from metrics import MetricsRegistry
+from inference_pool import ProcessPoolDetector
+from detection_scheduler import DetectionScheduler
+from video_source import VideoSource
+from violation_tracker import ViolationDebouncer, ViolationTracker
+from incident_store import IncidentStore
+from clip_recorder import ClipRecorder
 
 # Configuración de la aplicación Flask
 app = Flask(__name__)
@@ -78,6 +89,264 @@ class ConfigManager:
             print(f"❌ Error actualizando config.py: {e}")
             return False
 
+class CameraSource:
+    """Fuente de video registrada en el scheduler multi-cámara"""
+    
+    def __init__(self, source_id, source):
+        self.source_id = source_id
+        self.source = source
+        self.video = VideoSource(prefetch=config.CAPTURE_PREFETCH)
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+        
+        # Último frame capturado (se sobrescribe, nunca se encola)
+        self.latest_frame = None
+        self.latest_captured_at = 0.0
+        self.frame_seq = 0
+        self.processed_seq = 0
+        self.pending_frames = 0  # Frames de la fuente desde el último frame tomado
+        
+        # Estado por fuente tras la inferencia
+        self.frame_store = FrameStore()
+        self.detection_scheduler = create_detection_scheduler()
+        self.inference_settings = create_inference_settings(source_id)
+        self.last_viewed = 0
+        self.frames_processed = 0
+        self.violations_detected = 0
+    
+    def start(self):
+        """Abre la fuente e inicia el hilo lector"""
+        self.video.open(self.source)
+        
+        self.running = True
+        self.thread = threading.Thread(target=self.read_loop, daemon=True)
+        self.thread.start()
+    
+    def read_loop(self):
+        """Lee continuamente y conserva solo el frame más reciente"""
+        while self.running:
+            # Sin espectadores solo se decodifican los frames que se van a analizar
+            if config.SKIP_DECODE_WHEN_UNWATCHED and self.detection_scheduler \
+                    and (time.time() - self.last_viewed) >= config.VIEWER_TIMEOUT_SECONDS:
+                self.video.decode_stride = self.detection_scheduler.decode_stride()
+            else:
+                self.video.decode_stride = 1
+            
+            ret, frame = self.video.read()
+            if not ret:
+                time.sleep(0.033)
+                continue
+            captured_at = time.time()
+            
+            height, width = frame.shape[:2]
+            if width > 640:
+                scale = 640 / width
+                frame = cv2.resize(frame, (int(width * scale), int(height * scale)))
+            
+            with self.lock:
+                self.latest_frame = frame
+                self.latest_captured_at = captured_at
+                self.frame_seq += 1
+                self.pending_frames += self.video.last_advance
+            
+            if self.video.is_file:
+                time.sleep(self.video.frame_interval * self.video.last_advance)
+    
+    def take_new_frame(self):
+        """
+        Retorna (frame, frames de la fuente que representa, momento de captura)
+        si el último frame no ha sido procesado todavía, o (None, 0, None).
+        """
+        with self.lock:
+            if self.latest_frame is None or self.frame_seq == self.processed_seq:
+                return None, 0, None
+            self.processed_seq = self.frame_seq
+            frames, self.pending_frames = self.pending_frames, 0
+            return self.latest_frame, frames, self.latest_captured_at
+    
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        self.video.release()
+
+
+class MultiSourceScheduler:
+    """
+    Recoge el último frame de cada fuente registrada y los procesa en una sola
+    pasada batch de YOLO. Los resultados se devuelven al estado de cada fuente.
+    """
+    
+    def __init__(self, system, max_batch_size=16):
+        self.system = system
+        self.max_batch_size = max_batch_size
+        self.sources = {}
+        self.sources_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.last_batch_size = 0
+        self.last_batch_latency = 0.0
+    
+    def register_source(self, source_id, source):
+        """Registra e inicia una nueva fuente de video"""
+        camera = CameraSource(source_id, source)
+        camera.start()
+        with self.sources_lock:
+            old = self.sources.get(source_id)
+            self.sources[source_id] = camera
+        if old:
+            old.stop()
+        return camera
+    
+    def remove_source(self, source_id):
+        with self.sources_lock:
+            camera = self.sources.pop(source_id, None)
+        if camera:
+            camera.stop()
+        return camera is not None
+    
+    def get_source(self, source_id):
+        with self.sources_lock:
+            return self.sources.get(source_id)
+    
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.schedule_loop, daemon=True)
+        self.thread.start()
+    
+    def schedule_loop(self):
+        """Loop del scheduler: recolectar → inferencia batch → despachar"""
+        while self.running:
+            with self.sources_lock:
+                cameras = list(self.sources.values())
+            
+            if not self.system.detector:
+                time.sleep(0.1)
+                continue
+            
+            batch = []
+            reused = []
+            for camera in cameras:
+                if len(batch) >= self.max_batch_size:
+                    break
+                frame, frames, captured_at = camera.take_new_frame()
+                if frame is None:
+                    continue
+                scheduler = camera.detection_scheduler
+                if scheduler and not scheduler.should_detect(frame, frames):
+                    reused.append((camera, frame, captured_at))
+                else:
+                    batch.append((camera, frame, captured_at))
+            
+            # Fuentes sin cambios: dibujar las últimas detecciones sobre el frame nuevo
+            for camera, frame, captured_at in reused:
+                self.dispatch(camera, camera.detection_scheduler.last_results, captured_at, frame)
+            
+            if not batch:
+                if not reused:
+                    time.sleep(0.005)
+                continue
+            
+            try:
+                start = time.perf_counter()
+                results_list = self.system.detector.detect_batch(
+                    [frame for _, frame, _ in batch],
+                    [camera.inference_settings for camera, _, _ in batch]
+                )
+                self.last_batch_latency = time.perf_counter() - start
+                self.last_batch_size = len(batch)
+                self.system.observe_stage('batch_inference', self.last_batch_latency)
+            except Exception as e:
+                print(f"⚠️ Error en detección batch: {e}")
+                time.sleep(0.1)
+                continue
+            
+            # Latencia amortizada por frame dentro del batch
+            latency = self.last_batch_latency / len(batch)
+            for (camera, _, captured_at), results in zip(batch, results_list):
+                violation = self.dispatch(camera, results, captured_at)
+                if camera.detection_scheduler:
+                    camera.detection_scheduler.record_inference(results, latency, violation)
+    
+    def dispatch(self, camera, results, captured_at, frame=None):
+        """
+        Aplica los resultados de un frame (capturado en `captured_at`) al estado
+        de su fuente. Si se pasa `frame`, los resultados son reutilizados de una
+        inferencia anterior.
+        Retorna si el frame tuvo cajas en violación (antes de la confirmación).
+        """
+        detector = self.system.detector
+        fresh = frame is None
+        violation = False
+        
+        detected = False
+        violation_info = None
+        if fresh and self.system.is_detection_active:
+            violation_info = detector.find_violations(results)
+            detected = violation_info['count'] > 0
+            violation = self.system.confirm_violation(camera.source_id, violation_info)
+            self.system.count_stat('total_detections')
+        elif not fresh:
+            violation = self.system.is_detection_active and self.system.is_violation_confirmed(
+                camera.source_id, camera.detection_scheduler.last_violation)
+        
+        image = results[0].orig_img if fresh else frame
+        annotated_frame = image
+        is_alert = violation and fresh
+        camera.frames_processed += 1
+        
+        # Se dibuja y codifica solo para quien lo consume: espectadores,
+        # buffer de clips (frames anotados) o una alerta
+        watched = (time.time() - camera.last_viewed) < config.VIEWER_TIMEOUT_SECONDS
+        to_clip = bool(self.system.clips) and self.system.clips.wants_frame(camera.source_id, captured_at)
+        if is_alert or watched or to_clip:
+            buffer = camera.frame_store.acquire(image.shape, image.dtype)
+            annotated_frame = detector.draw_detections(results, image, out=buffer)
+        
+        # Se cuenta al entrar en violación, no en cada frame mientras dura
+        if self.system.publish_violation_state(camera.source_id, violation):
+            camera.violations_detected += 1
+        
+        jpeg = None
+        if watched or to_clip:
+            _, buffer = cv2.imencode('.jpg', annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            jpeg = buffer.tobytes()
+        else:
+            self.system.count_stat('frames_not_encoded')
+        camera.frame_store.publish(annotated_frame, jpeg, violation)
+        if to_clip:
+            self.system.clips.add_frame(camera.source_id, jpeg, captured_at)
+        if fresh:
+            self.system.track_violations(camera.source_id, results, violation_info, annotated_frame, jpeg)
+        return detected
+    
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        with self.sources_lock:
+            cameras = list(self.sources.values())
+            self.sources.clear()
+        for camera in cameras:
+            camera.stop()
+    
+    def get_stats(self):
+        with self.sources_lock:
+            cameras = list(self.sources.values())
+        return {
+            'sources': {
+                str(camera.source_id): {
+                    'source': str(camera.source),
+                    'frames_processed': camera.frames_processed,
+                    'violations_detected': camera.violations_detected,
+                    'adaptive_detection': camera.detection_scheduler.get_stats() if camera.detection_scheduler else {}
+                } for camera in cameras
+            },
+            'last_batch_size': self.last_batch_size,
+            'last_batch_latency_ms': round(self.last_batch_latency * 1000, 2)
+        }
+
 class WebHelmetSystem:
     """Sistema principal de detección de cascos para web"""
     
@@ -91,36 +360,113 @@ class WebHelmetSystem:
         
         # Control de hilos
         self.running = False
-        self.camera_thread = None
-        self.frame_lock = threading.Lock()
+        self.pipeline = None
+        self.scheduler = None
         
-        # Video y detección
-        self.cap = None
-        self.current_frame = None
-        self.current_violation = False
+        # Video y detección (la fuente es independiente del detector y notificador)
+        self.source = VideoSource(prefetch=config.CAPTURE_PREFETCH)
+        self.frame_store = FrameStore()
+        self.detection_scheduler = create_detection_scheduler()
+        self.inference_settings = create_inference_settings('main')
+        self.last_viewed = 0
         
         # Estadísticas
         self.stats = {
             'total_detections': 0,
             'violations_detected': 0,
             'notifications_sent': 0,
+            'frames_not_encoded': 0,  # Sin espectadores ni clips
             'uptime_start': time.time()
         }
         
         # Logs
-        self.logs = []
-        self.max_logs = 100
-        self.logs_lock = threading.Lock()
+        self.logs = LogRingBuffer(config.LOG_CAPACITY)
+        self.max_logs = 100  # Entradas que se devuelven sin paginar
+        
+        # Métricas de latencia por etapa (/metrics)
+        self.metrics = MetricsRegistry()
+        self.metrics.describe('stage_latency_seconds', "Latencia por frame de cada etapa del procesamiento")
+        self.metrics.describe('notify_latency_seconds', "Tiempo desde que se encola una alerta hasta su entrega")
+        
+        # Confirmación k-de-n de las violaciones por fuente. El pipeline y el
+        # hilo multi-cámara comparten el debouncer, violation_states y los
+        # contadores de self.stats (ver count_stat)
+        self.debouncer = None
+        self.violation_lock = threading.Lock()
+        if config.DEBOUNCE_ENABLED:
+            self.debouncer = ViolationDebouncer(
+                window=config.DEBOUNCE_WINDOW,
+                min_hits=config.DEBOUNCE_MIN_HITS,
+                min_score=config.DEBOUNCE_MIN_SCORE
+            )
+        
+        # Incidentes: una persona sin casco seguida entre frames = un evento
+        self.incidents = IncidentStore(config.INCIDENT_DB_PATH, config.INCIDENT_SNAPSHOT_DIR)
+        self.tracker = None
+        self.tracker_lock = threading.Lock()
+        if config.TRACKING_ENABLED:
+            self.tracker = ViolationTracker(
+                iou_threshold=config.TRACK_IOU_THRESHOLD,
+                max_age=config.TRACK_MAX_AGE_SECONDS,
+                min_hits=config.TRACK_MIN_HITS,
+                realert_seconds=config.TRACK_REALERT_SECONDS,
+                first_id=self.incidents.next_id()
+            )
+        
+        # Clips MP4 de cada incidente (buffer previo en memoria + escritor propio)
+        self.clips = None
+        if config.CLIPS_ENABLED:
+            self.clips = ClipRecorder(
+                config.CLIP_DIR,
+                pre_seconds=config.CLIP_PRE_SECONDS,
+                post_seconds=config.CLIP_POST_SECONDS,
+                buffer_mb=config.CLIP_BUFFER_MB,
+                retention_days=config.CLIP_RETENTION_DAYS,
+                max_dir_mb=config.CLIP_MAX_DIR_MB,
+                fourcc=config.CLIP_FOURCC,
+                max_fps=config.CLIP_MAX_FPS,
+                on_missing=self.incidents.clear_clip
+            )
+        
+        # Eventos push (SSE): estado, violaciones y logs solo cuando cambian
+        self.events = EventHub(config.EVENTS_QUEUE_SIZE)
+        self.violation_states = {}
+        self.last_status = {}
+        self.events_stop = threading.Event()
+        self.events_thread = threading.Thread(target=self.events_loop, daemon=True)
         
         # Inicializar componentes
         self.init_detector()
         self.init_notifier()
         self.start_camera()
+        self.start_extra_cameras()
+        self.events_thread.start()
     
     def init_detector(self):
         """Inicializa el detector YOLO"""
         try:
-            self.detector = HelmetDetector(config.MODEL_PATH)
+            kwargs = dict(
+                target_class=config.TARGET_CLASS_NAME,
+                conf_threshold=config.VIOLATION_CONF_THRESHOLD,
+                backend=config.INFERENCE_BACKEND,
+                imgsz=config.INFERENCE_IMGSZ,
+                precision=config.MODEL_PRECISION,
+                warmup=config.MODEL_WARMUP,
+                mmap_weights=config.MODEL_MMAP_WEIGHTS
+            )
+            if config.INFERENCE_WORKERS > 0:
+                # Inferencia en procesos separados; frames por memoria compartida
+                self.detector = ProcessPoolDetector(
+                    config.MODEL_PATH,
+                    workers=config.INFERENCE_WORKERS,
+                    slots=config.INFERENCE_WORKER_SLOTS,
+                    max_frame_shape=config.INFERENCE_MAX_FRAME_SHAPE,
+                    threads=config.INFERENCE_WORKER_THREADS,
+                    task_timeout=config.INFERENCE_TASK_TIMEOUT,
+                    **kwargs
+                )
+            else:
+                self.detector = HelmetDetector(config.MODEL_PATH, **kwargs)
             print("✅ Detector YOLO inicializado correctamente")
             self.log_event("SYSTEM", "Detector YOLO inicializado")
         except Exception as e:
@@ -131,7 +477,28 @@ class WebHelmetSystem:
     def init_notifier(self):
         """Inicializa el notificador de Telegram"""
         try:
-            self.notifier = TelegramNotifier(config.BOT_TOKEN, config.CHAT_ID)
+            self.notifier = TelegramNotifier(
+                config.BOT_TOKEN,
+                config.CHAT_ID,
+                queue_size=config.NOTIFICATION_QUEUE_SIZE,
+                coalesce=config.NOTIFICATION_COALESCE,
+                drop_policy=config.NOTIFICATION_DROP_POLICY,
+                base_url=config.TELEGRAM_API_URL,
+                send_timeout=config.NOTIFICATION_SEND_TIMEOUT,
+                image_builder=AlertImageBuilder(
+                    max_width=config.ALERT_IMAGE_MAX_WIDTH,
+                    max_bytes=config.ALERT_IMAGE_MAX_KB * 1024,
+                    quality=config.ALERT_IMAGE_QUALITY,
+                    max_crops=config.ALERT_CROPS,
+                    crop_padding=config.ALERT_CROP_PADDING
+                ),
+                media_group=config.ALERT_MEDIA_GROUP,
+                outbox=create_outbox(),
+                retry_base=config.NOTIFICATION_RETRY_BASE_SECONDS,
+                retry_max=config.NOTIFICATION_RETRY_MAX_SECONDS,
+                batch_size=config.NOTIFICATION_BATCH_SIZE
+            )
+            self.notifier.start()
             print("✅ Notificador de Telegram inicializado")
             self.log_event("SYSTEM", "Notificador de Telegram inicializado")
         except Exception as e:
@@ -147,24 +514,14 @@ class WebHelmetSystem:
             source = config.WEBCAM_ID if config.USE_WEBCAM else config.VIDEO_PATH
             print(f"📹 Fuente configurada: {source}")
             
-            self.cap = cv2.VideoCapture(source)
-            
-            if not self.cap.isOpened():
-                raise Exception(f"No se pudo abrir la fuente de video: {source}")
-            
-            # Configurar propiedades de la cámara
-            if config.USE_WEBCAM:
-                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                self.cap.set(cv2.CAP_PROP_FPS, 30)
+            self.source.open(source)
             
             print("✅ Cámara inicializada correctamente")
             self.log_event("SYSTEM", f"Cámara iniciada - Fuente: {source}")
             
-            # Iniciar hilo de procesamiento
+            # Iniciar pipeline de procesamiento
             self.running = True
-            self.camera_thread = threading.Thread(target=self.camera_loop, daemon=True)
-            self.camera_thread.start()
+            self.start_pipeline()
             
             return True
             
@@ -173,110 +530,404 @@ class WebHelmetSystem:
             self.log_event("ERROR", f"Error iniciando cámara: {e}")
             return False
     
-    def camera_loop(self):
-        """Loop principal de procesamiento de video"""
-        print("🎥 Iniciando loop de procesamiento de video...")
-        frame_count = 0
-        last_log_time = time.time()
+    def switch_source(self, source):
+        """
+        Cambia la fuente de video en caliente. El modelo, el notificador, las
+        estadísticas y los logs se conservan; solo se reemplaza la captura.
+        """
+        start = time.perf_counter()
+        try:
+            self.source.open(source)
+        except Exception as e:
+            print(f"❌ Error cambiando fuente: {e}")
+            self.log_event("ERROR", f"Error cambiando fuente a {source}: {e}")
+            return False
         
-        while self.running:
+        # Las detecciones previas no aplican a la nueva escena
+        self.detection_scheduler = create_detection_scheduler()
+        if self.debouncer:
+            with self.violation_lock:
+                self.debouncer.reset('main')
+        self.close_incidents('main')
+        if self.clips:
+            self.clips.flush('main')
+        self.next_frame_time = 0
+        
+        # Si la fuente inicial había fallado, el pipeline aún no existe
+        if not self.pipeline:
+            self.running = True
+            self.start_pipeline()
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"🔄 Fuente cambiada a {source} en {elapsed_ms:.0f} ms")
+        return True
+    
+    def start_extra_cameras(self):
+        """Registra las cámaras adicionales configuradas en el scheduler batch"""
+        self.scheduler = MultiSourceScheduler(self, max_batch_size=config.MAX_BATCH_SIZE)
+        
+        for source_id, source in config.EXTRA_CAMERAS.items():
             try:
-                if not self.cap or not self.cap.isOpened():
-                    time.sleep(0.1)
-                    continue
-                
-                ret, frame = self.cap.read()
-                
-                if not ret:
-                    # Reiniciar video si es archivo
-                    if not config.USE_WEBCAM:
-                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    time.sleep(0.033)
-                    continue
-                
-                frame_count += 1
-                
-                # Redimensionar para optimizar rendimiento
-                height, width = frame.shape[:2]
-                if width > 640:
-                    scale = 640 / width
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    frame = cv2.resize(frame, (new_width, new_height))
-                
-                # Procesar detección solo si el detector está disponible
-                violation_detected = False
-                annotated_frame = frame.copy()
-                
-                if self.detector:
-                    try:
-                        results = self.detector.detect_on_frame(frame)
-                        annotated_frame = self.detector.draw_detections(results)
-                        
-                        # Verificar violaciones si la detección está activa
-                        if self.is_detection_active:
-                            violation_detected = self.detector.find_violation(results, config.TARGET_CLASS_NAME)
-                            self.stats['total_detections'] += 1
-                            
-                            if violation_detected:
-                                self.stats['violations_detected'] += 1
-                                self.handle_violation(annotated_frame)
-                                
-                    except Exception as e:
-                        print(f"⚠️ Error en detección: {e}")
-                        if frame_count % 100 == 0:  # Log cada 100 frames
-                            self.log_event("ERROR", f"Error en detección: {e}")
+                self.scheduler.register_source(source_id, source)
+                self.log_event("SYSTEM", f"Cámara adicional '{source_id}' iniciada - Fuente: {source}")
+            except Exception as e:
+                print(f"❌ Error iniciando cámara '{source_id}': {e}")
+                self.log_event("ERROR", f"Error iniciando cámara '{source_id}': {e}")
+        
+        self.scheduler.start()
+    
+    def start_pipeline(self):
+        """Crea y arranca el pipeline captura → inferencia → anotación → codificación"""
+        self.frame_count = 0
+        self.last_log_time = time.time()
+        self.next_frame_time = 0
+        
+        self.pipeline = FramePipeline(queue_size=config.PIPELINE_QUEUE_SIZE)
+        capture = self.pipeline.add_stage('capture', self.capture_stage)
+        self.pipeline.add_stage('inference', self.inference_stage)
+        self.pipeline.add_stage('annotation', self.annotation_stage)
+        self.pipeline.add_stage('encode', self.encode_stage)
+        self.pipeline.set_error_handler(self.on_stage_error)
+        self.pipeline.set_observer(self.observe_stage)
+        # La captura se mide en capture_stage, sin la espera para respetar el FPS del video
+        capture.observer = None
+        self.pipeline.start()
+        print("🎥 Pipeline de procesamiento de video iniciado")
+    
+    def observe_stage(self, stage_name, latency):
+        self.metrics.observe('stage_latency_seconds', latency, stage=stage_name)
+    
+    def on_stage_error(self, stage_name, error):
+        """Registra errores de una etapa sin detener el pipeline"""
+        print(f"❌ Error en etapa {stage_name}: {error}")
+        self.log_event("ERROR", f"Error en etapa {stage_name}: {error}")
+    
+    def capture_stage(self):
+        """Etapa 1: lee un frame de la fuente y lo redimensiona"""
+        if not self.source.is_opened():
+            time.sleep(0.1)
+            return None
+        
+        # Los archivos de video se leen a su FPS nativo; la webcam ya bloquea en read()
+        if self.source.is_file:
+            delay = self.next_frame_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        
+        # Sin espectadores solo se decodifican los frames que se van a analizar
+        scheduler = self.detection_scheduler
+        if config.SKIP_DECODE_WHEN_UNWATCHED and scheduler and not self.has_viewers():
+            self.source.decode_stride = scheduler.decode_stride()
+        else:
+            self.source.decode_stride = 1
+        
+        # En archivos, read() vuelve al inicio al llegar al final
+        read_start = time.perf_counter()
+        ret, frame = self.source.read()
+        if self.source.is_file:
+            self.next_frame_time = read_start + self.source.frame_interval * self.source.last_advance
+        
+        if not ret:
+            time.sleep(0.033)
+            return None
+        
+        self.frame_count += 1
+        
+        # Redimensionar para optimizar rendimiento
+        height, width = frame.shape[:2]
+        if width > 640:
+            scale = 640 / width
+            new_width = int(width * scale)
+            new_height = int(height * scale)
+            frame = cv2.resize(frame, (new_width, new_height))
+        
+        self.observe_stage('capture', time.perf_counter() - read_start)
+        return {
+            'index': self.frame_count,
+            'frame': frame,
+            'frames': self.source.last_advance,
+            'captured_at': time.time(),
+            'results': None,
+            'violation': False,
+            'violation_info': None,
+            'fresh': True
+        }
+    
+    def inference_stage(self, packet):
+        """Etapa 2: ejecuta YOLO (o reutiliza detecciones) y verifica violaciones"""
+        if self.detector:
+            try:
+                scheduler = self.detection_scheduler
                 
-                # Guardar frame actual de forma thread-safe
-                with self.frame_lock:
-                    try:
-                        _, buffer = cv2.imencode('.jpg', annotated_frame, 
-                                              [cv2.IMWRITE_JPEG_QUALITY, 85])
-                        self.current_frame = base64.b64encode(buffer).decode('utf-8')
-                        self.current_violation = violation_detected
-                    except Exception as e:
-                        print(f"⚠️ Error codificando frame: {e}")
+                if scheduler and not scheduler.should_detect(packet['frame'], packet['frames']):
+                    # Escena sin cambios: se reutilizan las últimas detecciones
+                    packet['results'] = scheduler.last_results
+                    packet['violation'] = self.is_detection_active and self.is_violation_confirmed(
+                        'main', scheduler.last_violation)
+                    packet['fresh'] = False
+                    return packet
                 
-                # Log periódico de estado
-                current_time = time.time()
-                if current_time - last_log_time > 60:  # Cada minuto
-                    self.log_event("SYSTEM", f"Sistema funcionando - Frame {frame_count}")
-                    last_log_time = current_time
+                start = time.perf_counter()
+                results = self.detector.detect_on_frame(packet['frame'], self.inference_settings)
+                latency = time.perf_counter() - start
+                packet['results'] = results
                 
-                # Control de FPS
-                time.sleep(0.033)  # ~30 FPS
+                # Verificar violaciones si la detección está activa
+                detected = False
+                if self.is_detection_active:
+                    packet['violation_info'] = self.detector.find_violations(results)
+                    detected = packet['violation_info']['count'] > 0
+                    packet['violation'] = self.confirm_violation('main', packet['violation_info'])
+                    self.count_stat('total_detections')
                 
+                # El scheduler ve la detección cruda para no espaciar inferencias
+                # mientras una violación se está confirmando
+                if scheduler:
+                    scheduler.record_inference(results, latency, detected)
+                    
+            except Exception as e:
+                print(f"⚠️ Error en detección: {e}")
+                if packet['index'] % 100 == 0:  # Log cada 100 frames
+                    self.log_event("ERROR", f"Error en detección: {e}")
+        
+        return packet
+    
+    def annotation_stage(self, packet):
+        """Etapa 3: dibuja las detecciones y publica el estado de violación"""
+        frame = packet['frame']
+        annotated_frame = frame
+        is_alert = packet['violation'] and packet['fresh']
+        
+        # Consumidores del frame: espectadores y buffer de clips (que guarda
+        # frames anotados, para que todo el clip se vea igual)
+        packet['watched'] = self.has_viewers()
+        packet['clip'] = bool(self.clips) and self.clips.wants_frame('main', packet['captured_at'])
+        
+        # Solo se dibuja si algún consumidor lo usa o hay una alerta que enviar
+        if packet['results'] is not None and (is_alert or packet['watched'] or packet['clip']):
+            try:
+                buffer = self.frame_store.acquire(frame.shape, frame.dtype)
+                annotated_frame = self.detector.draw_detections(packet['results'], frame, out=buffer)
+            except Exception as e:
+                print(f"⚠️ Error dibujando detecciones: {e}")
+        
+        self.publish_violation_state('main', packet['violation'], packet['violation_info'])
+        
+        packet['annotated'] = annotated_frame
+        return packet
+    
+    def encode_stage(self, packet):
+        """Etapa 4: codifica a JPEG, publica el frame actual y maneja violaciones"""
+        # Se codifica una sola vez por frame, sin importar cuántos clientes lo vean.
+        # Si ni los espectadores ni el buffer de clips lo necesitan no se codifica
+        # (una alerta, si la hay, genera su propia imagen reducida)
+        jpeg = None
+        if packet['watched'] or packet['clip']:
+            try:
+                _, buffer = cv2.imencode('.jpg', packet['annotated'],
+                                         [cv2.IMWRITE_JPEG_QUALITY, 85])
+                jpeg = buffer.tobytes()
             except Exception as e:
-                print(f"❌ Error en camera_loop: {e}")
-                self.log_event("ERROR", f"Error en camera_loop: {e}")
-                time.sleep(1)
+                print(f"⚠️ Error codificando frame: {e}")
+                return None
+        else:
+            self.count_stat('frames_not_encoded')
+        
+        # Publicar frame actual (array + JPEG) y despertar a los clientes del stream
+        self.frame_store.publish(packet['annotated'], jpeg, packet['violation'])
+        if packet['clip']:
+            # Los mismos bytes alimentan el buffer previo de los clips
+            self.clips.add_frame('main', jpeg, packet['captured_at'])
+        
+        # Después de codificar, para que la alerta reutilice el mismo JPEG
+        if packet['fresh'] and packet['results'] is not None:
+            self.track_violations('main', packet['results'], packet['violation_info'], packet['annotated'], jpeg)
+        
+        # Log periódico de estado
+        current_time = time.time()
+        if current_time - self.last_log_time > 60:  # Cada minuto
+            self.log_event("SYSTEM", f"Sistema funcionando - Frame {packet['index']}")
+            self.last_log_time = current_time
+        
+        return packet
+    
+    def count_stat(self, key, amount=1):
+        """Incrementa un contador de self.stats que actualizan varios hilos"""
+        with self.violation_lock:
+            self.stats[key] += amount
+    
+    def publish_violation_state(self, source_id, violation, violation_info=None):
+        """
+        Publica un evento cuando una fuente entra o sale de violación y cuenta
+        cada entrada (flanco de subida). Retorna True si la fuente entró en violación.
+        """
+        violation = bool(violation)
+        with self.violation_lock:
+            if self.violation_states.get(source_id, False) == violation:
+                return False
+            self.violation_states[source_id] = violation
+            if violation:
+                self.stats['violations_detected'] += 1
+        event = {'source': str(source_id), 'active': violation, 'time': time.time()}
+        if violation_info:
+            event['count'] = violation_info['count']
+            event['max_conf'] = round(violation_info['max_conf'], 3)
+        self.events.publish('violation', event)
+        return violation
+    
+    def get_status(self):
+        """Estado compacto que muestra el panel (lo que se publica por SSE)"""
+        _, _, violation = self.frame_store.get_jpeg()
+        return {
+            'detection_active': self.is_detection_active,
+            'violation': bool(violation),
+            'camera_active': self.source.is_opened(),
+            'total_detections': self.stats['total_detections'],
+            'violations_detected': self.stats['violations_detected'],
+            'notifications_sent': self.stats['notifications_sent'],
+            # Resolución de minutos: el panel muestra HH:MM
+            'uptime': int((time.time() - self.stats['uptime_start']) // 60) * 60
+        }
     
-    def handle_violation(self, frame):
-        """Maneja una violación detectada"""
+    def events_loop(self):
+        """Publica solo los campos del estado que cambiaron desde el último envío"""
+        # Independiente de self.running: el panel sigue recibiendo estado con la detección parada
+        while not self.events_stop.wait(config.EVENTS_STATS_INTERVAL):
+            if not self.events.has_subscribers():
+                continue
+            try:
+                status = self.get_status()
+            except Exception:
+                continue
+            delta = {key: value for key, value in status.items() if self.last_status.get(key) != value}
+            if delta:
+                self.last_status = status
+                self.events.publish('stats', delta)
+    
+    def confirm_violation(self, source_id, violation_info):
+        """Pasa la violación de un frame analizado por la confirmación k-de-n"""
+        detected = violation_info['count'] > 0
+        if not self.debouncer:
+            return detected
+        with self.violation_lock:
+            return self.debouncer.update(source_id, violation_info['max_conf'] if detected else 0.0)
+    
+    def is_violation_confirmed(self, source_id, detected):
+        """Estado confirmado de la fuente (para frames que reutilizan detecciones)"""
+        if not self.debouncer:
+            return bool(detected)
+        with self.violation_lock:
+            return self.debouncer.is_confirmed(source_id)
+    
+    def get_debounce_stats(self):
+        if not self.debouncer:
+            return {}
+        with self.violation_lock:
+            return self.debouncer.get_stats()
+    
+    def track_violations(self, source_id, results, violation_info, frame, jpeg=None):
+        """
+        Actualiza los incidentes de una fuente con un frame analizado (con o sin
+        violación, para que los incidentes terminen). Alerta una vez por persona
+        confirmada; sin seguimiento se usa el enfriamiento global. Mientras la
+        fuente no confirma la violación (k-de-n) no se alerta. `jpeg` es el
+        frame ya codificado, que la alerta reutiliza si cumple los límites.
+        """
+        detected = bool(violation_info) and violation_info['count'] > 0
+        confirmed = self.is_violation_confirmed(source_id, detected)
+        if detected:
+            xyxy, conf, _ = self.detector.boxes_arrays(results)
+            indices = violation_info['indices']
+            boxes, confs = xyxy[indices], conf[indices]
+        else:
+            boxes, confs = (), ()
+        
+        if not self.tracker:
+            if detected and confirmed:
+                # Copia propia: el buffer compartido se reutiliza en frames siguientes
+                order = confs.argsort()[::-1]
+                if self.handle_violation(frame.copy(), violation_info, jpeg, boxes[order]) and self.clips:
+                    self.clips.trigger(source_id, f"violation_{source_id}_{datetime.now():%Y%m%d_%H%M%S}")
+            return
+        
+        with self.tracker_lock:
+            _, alerts, ended = self.tracker.update(source_id, boxes, confs, time.time(), frame, alert=confirmed)
+        
+        for track in alerts:
+            if track.alerts == 1:
+                clip = self.clips.trigger(source_id, f"incident_{track.id}") if self.clips else None
+                self.incidents.record_start(track, clip)
+                self.log_event("VIOLATION", f"Incidente #{track.id} en {source_id}: persona sin casco "
+                                            f"(confianza máx. {track.max_conf:.2f})")
+            else:
+                self.incidents.record_alert(track)
+                self.log_event("VIOLATION", f"Incidente #{track.id} en {source_id} continúa "
+                                            f"({time.time() - track.first_seen:.0f} s)")
+        
+        if alerts:
+            # Una sola alerta por frame, con un recorte por persona
+            ids = ', '.join(f"#{track.id}" for track in alerts)
+            max_conf = max(track.max_conf for track in alerts)
+            self.send_notification(frame.copy(), caption=f"⚠️ Incidente {ids}: {len(alerts)} persona(s) sin casco "
+                                                         f"(confianza {max_conf:.0%})",
+                                   jpeg=jpeg, boxes=[track.box for track in alerts])
+        self.end_incidents(ended)
+    
+    def end_incidents(self, tracks):
+        """Cierra en el historial los incidentes confirmados de `tracks`"""
+        for track in tracks:
+            if track.alerts:
+                self.incidents.record_end(track)
+    
+    def close_incidents(self, source_id=None):
+        """Termina los incidentes abiertos (cambio de fuente o apagado)"""
+        if not self.tracker:
+            return
+        with self.tracker_lock:
+            ended = self.tracker.flush(source_id)
+        self.end_incidents(ended)
+    
+    def handle_violation(self, frame, violation_info=None, jpeg=None, boxes=None):
+        """Maneja una violación detectada; retorna True si se encoló la alerta"""
         current_time = time.time()
         
         if (current_time - self.last_notification_time) > config.NOTIFICATION_COOLDOWN_SECONDS:
-            if self.send_notification(frame):
+            if violation_info:
+                self.log_event("VIOLATION", f"{violation_info['count']} persona(s) sin casco "
+                                            f"(confianza máx. {violation_info['max_conf']:.2f})")
+            # El cooldown se consume cuando la alerta es aceptada por la cola
+            if self.send_notification(frame, jpeg=jpeg, boxes=boxes):
                 self.last_notification_time = current_time
-                self.stats['notifications_sent'] += 1
+                return True
+        return False
     
-    def send_notification(self, frame):
-        """Envía notificación a Telegram de forma asíncrona"""
+    def send_notification(self, frame, wait=False, caption=None, jpeg=None, boxes=None):
+        """
+        Encola la notificación en el trabajador de Telegram.
+        Sin `wait` retorna True si la alerta fue aceptada; con `wait` espera y
+        retorna el resultado real de la entrega.
+        """
         if not self.notifier or not self.notifier.bot:
             return False
         
         try:
             # Actualizar chat_id si cambió
             self.notifier.chat_id = self.current_chat_id
+            chat_id = self.current_chat_id
+            
+            future = self.notifier.send_alert(frame, caption, jpeg=jpeg, boxes=boxes)
+            if future is None:
+                self.log_event("ERROR", "Notificación descartada (cola llena o bot no disponible)")
+                return False
             
-            # Enviar notificación en hilo separado
-            threading.Thread(
-                target=self._send_notification_async,
-                args=(frame,),
-                daemon=True
-            ).start()
+            queued_at = time.perf_counter()
+            future.add_done_callback(lambda f: self._on_notification_done(f, chat_id, queued_at))
             
-            self.log_event("NOTIFICATION", f"Alerta enviada a chat {self.current_chat_id}")
+            if wait:
+                try:
+                    return future.result(timeout=config.NOTIFICATION_SEND_TIMEOUT + 5)
+                except Exception:
+                    return False
             return True
             
         except Exception as e:
@@ -284,17 +935,44 @@ class WebHelmetSystem:
             self.log_event("ERROR", f"Error enviando notificación: {e}")
             return False
     
-    def _send_notification_async(self, frame):
-        """Envía la notificación de forma asíncrona"""
-        try:
-            self.notifier.send_alert(frame)
-        except Exception as e:
-            print(f"❌ Error en notificación asíncrona: {e}")
+    def _on_notification_done(self, future, chat_id, queued_at=None):
+        """Registra el resultado real de la entrega (se llama desde el trabajador)"""
+        delivered = future.result()
+        if queued_at is not None:
+            self.metrics.observe('notify_latency_seconds', time.perf_counter() - queued_at,
+                                 result='delivered' if delivered else 'failed')
+        if delivered:
+            self.stats['notifications_sent'] += 1
+            self.log_event("NOTIFICATION", f"Alerta enviada a chat {chat_id}")
+        else:
+            self.log_event("ERROR", f"No se pudo entregar la alerta a chat {chat_id}: "
+                                    f"{self.notifier.last_error}")
+    
+    def mark_viewed(self):
+        """Registra que un cliente está consumiendo el video"""
+        self.last_viewed = time.time()
+    
+    def has_viewers(self):
+        """Indica si algún cliente pidió frames recientemente"""
+        return (time.time() - self.last_viewed) < config.VIEWER_TIMEOUT_SECONDS
     
     def get_current_frame(self):
-        """Obtiene el frame actual de forma thread-safe"""
-        with self.frame_lock:
-            return self.current_frame, self.current_violation
+        """Obtiene el frame actual en base64 de forma thread-safe"""
+        return self.frame_store.get_base64(), self.frame_store.violation
+    
+    def get_current_jpeg(self):
+        """Obtiene los bytes JPEG del frame actual"""
+        _, jpeg, violation = self.frame_store.get_jpeg()
+        return jpeg, violation
+    
+    def get_current_array(self):
+        """Obtiene una copia del frame anotado actual como ndarray"""
+        _, frame, violation = self.frame_store.get_frame(copy=True)
+        return frame, violation
+    
+    def wait_for_frame(self, last_seq, timeout=1.0):
+        """Espera un frame más nuevo que last_seq y retorna (seq, jpeg)"""
+        return self.frame_store.wait_for_frame(last_seq, timeout)
     
     def toggle_detection(self):
         """Activa/desactiva la detección"""
@@ -328,9 +1006,68 @@ class WebHelmetSystem:
             'uptime': uptime,
             'detection_active': self.is_detection_active,
             'current_chat_id': self.current_chat_id,
-            'camera_active': self.cap is not None and self.cap.isOpened() if self.cap else False
+            'camera_active': self.source.is_opened(),
+            'pipeline': self.pipeline.get_stats() if self.pipeline else {},
+            'adaptive_detection': self.detection_scheduler.get_stats() if self.detection_scheduler else {},
+            'cameras': self.scheduler.get_stats() if self.scheduler else {},
+            'notifier': self.notifier.get_stats() if self.notifier else {},
+            'models': ModelRegistry.get_stats(),
+            'events': self.events.get_stats(),
+            'debounce': self.get_debounce_stats(),
+            'clips': self.clips.get_stats() if self.clips else {},
+            'active_incidents': len(self.tracker.active()) if self.tracker else 0,
+            'inference_workers': self.detector.get_stats() if isinstance(self.detector, ProcessPoolDetector) else {}
         }
     
+    def render_metrics(self):
+        """Métricas en formato de texto Prometheus (histogramas + gauges del estado actual)"""
+        stages = [stage for stage in self.pipeline.stages] if self.pipeline else []
+        queued = [stage for stage in stages if stage.in_queue is not None]
+        notifier = self.notifier.get_stats() if self.notifier and self.notifier.bot else None
+        adaptive = self.detection_scheduler.get_stats() if self.detection_scheduler else None
+        cameras = self.scheduler.get_stats()['sources'] if self.scheduler else {}
+        
+        metrics = [
+            ('up', 'gauge', "Sistema en ejecución", [({}, True)]),
+            ('uptime_seconds', 'gauge', "Segundos desde el inicio", [({}, time.time() - self.stats['uptime_start'])]),
+            ('detection_active', 'gauge', "Detección activada", [({}, self.is_detection_active)]),
+            ('camera_active', 'gauge', "Fuente principal abierta", [({}, self.source.is_opened())]),
+            ('pipeline_fps', 'gauge', "FPS efectivo a la salida del pipeline",
+             [({}, round(stages[-1].get_fps(), 3) if stages else 0.0)]),
+            ('stage_fps', 'gauge', "FPS a la salida de cada etapa",
+             [({'stage': stage.name}, round(stage.get_fps(), 3)) for stage in stages]),
+            ('stage_processed_total', 'counter', "Elementos procesados por etapa",
+             [({'stage': stage.name}, stage.processed) for stage in stages]),
+            ('stage_errors_total', 'counter', "Errores por etapa",
+             [({'stage': stage.name}, stage.errors) for stage in stages]),
+            ('queue_depth', 'gauge', "Elementos esperando en la cola de entrada de cada etapa",
+             [({'stage': stage.name}, stage.in_queue.qsize()) for stage in queued]),
+            ('frames_dropped_total', 'counter', "Frames descartados por colas llenas",
+             [({'stage': stage.name}, stage.in_queue.dropped) for stage in queued]),
+            ('detections_total', 'counter', "Frames con inferencia", [({}, self.stats['total_detections'])]),
+            ('violations_total', 'counter', "Violaciones detectadas", [({}, self.stats['violations_detected'])]),
+            ('notifications_sent_total', 'counter', "Alertas entregadas", [({}, self.stats['notifications_sent'])]),
+            ('event_subscribers', 'gauge', "Clientes SSE conectados", [({}, self.events.get_stats()['subscribers'])]),
+            ('incidents_active', 'gauge', "Incidentes abiertos (personas sin casco en seguimiento)",
+             [({}, len(self.tracker.active()) if self.tracker else 0)]),
+        ]
+        if adaptive:
+            metrics.append(('detection_interval', 'gauge', "Frames entre inferencias (detección adaptativa)",
+                            [({}, adaptive['interval'])]))
+        if notifier:
+            metrics += [
+                ('notifier_backlog', 'gauge', "Alertas pendientes de envío", [({}, notifier['pending'])]),
+                ('notifier_alerts_total', 'counter', "Alertas por resultado",
+                 [({'result': key}, notifier[key])
+                  for key in ('sent', 'failed', 'coalesced', 'dropped', 'retried', 'expired')]),
+                ('notifier_outbox_pending', 'gauge', "Alertas guardadas en disco esperando entrega",
+                 [({}, notifier['outbox'].get('pending', 0))]),
+            ]
+        if cameras:
+            metrics.append(('camera_frames_total', 'counter', "Frames procesados por cámara adicional",
+                            [({'camera': camera_id}, camera['frames_processed']) for camera_id, camera in cameras.items()]))
+        return self.metrics.render(metrics)
+    
     def log_event(self, level, message):
         """Registra un evento en el sistema de logs"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -340,34 +1077,81 @@ class WebHelmetSystem:
             'message': message
         }
         
-        with self.logs_lock:
-            self.logs.insert(0, log_entry)  # Agregar al inicio
-            if len(self.logs) > self.max_logs:
-                self.logs = self.logs[:self.max_logs]  # Mantener límite
+        self.logs.append(log_entry)
+        self.events.publish('log', log_entry)
         
         print(f"📋 [{timestamp}] {level}: {message}")
     
-    def get_logs(self):
-        """Obtiene los logs actuales"""
-        with self.logs_lock:
-            return self.logs.copy()
+    def get_logs(self, since=None, limit=None):
+        """
+        Obtiene los logs. Sin `since` retorna los más recientes primero; con
+        `since` retorna solo las entradas posteriores a esa secuencia, en orden.
+        """
+        if since is None:
+            return self.logs.latest(limit or self.max_logs)
+        return self.logs.since(since, limit)
     
     def stop(self):
         """Detiene el sistema de forma segura"""
         print("🛑 Deteniendo WebHelmetSystem...")
         self.running = False
         
-        if self.camera_thread and self.camera_thread.is_alive():
-            self.camera_thread.join(timeout=5)
+        self.events_stop.set()
+        if self.events_thread.is_alive():
+            self.events_thread.join(timeout=2)
+        
+        if self.pipeline:
+            self.pipeline.stop(timeout=5)
+        
+        if self.scheduler:
+            self.scheduler.stop()
         
-        if self.cap:
-            self.cap.release()
+        if self.notifier:
+            self.notifier.close()
+        
+        if self.detector:
+            self.detector.close()
+        
+        self.source.release()
+        
+        self.close_incidents()
+        self.incidents.close()
+        if self.clips:
+            self.clips.close()
         
         self.log_event("SYSTEM", "Sistema detenido")
 
 # Instancia global del sistema
 helmet_system = None
 
+def create_inference_settings(source_id):
+    """Combina los ajustes por defecto con los de la fuente indicada"""
+    values = dict(config.SOURCE_SETTINGS.get('default', {}))
+    values.update(config.SOURCE_SETTINGS.get(str(source_id), {}))
+    return InferenceSettings.from_dict(values)
+
+def create_outbox():
+    """Crea el outbox persistente de alertas según config, o None"""
+    if not config.NOTIFICATION_OUTBOX_DIR or not config.BOT_TOKEN:
+        return None
+    return NotificationOutbox(
+        config.NOTIFICATION_OUTBOX_DIR,
+        max_entries=config.NOTIFICATION_OUTBOX_MAX_ENTRIES,
+        max_mb=config.NOTIFICATION_OUTBOX_MAX_MB,
+        max_age_hours=config.NOTIFICATION_OUTBOX_MAX_AGE_HOURS
+    )
+
+def create_detection_scheduler():
+    """Crea el scheduler de detección adaptativa según config, o None"""
+    if not config.ADAPTIVE_DETECTION:
+        return None
+    return DetectionScheduler(
+        latency_budget_ms=config.DETECTION_LATENCY_BUDGET_MS,
+        min_interval=config.DETECTION_MIN_INTERVAL,
+        max_interval=config.DETECTION_MAX_INTERVAL,
+        motion_threshold=config.MOTION_THRESHOLD
+    )
+
 def get_helmet_system():
     """Obtiene o crea la instancia del sistema"""
     global helmet_system
@@ -382,11 +1166,85 @@ def index():
     """Página principal"""
     return render_template('index.html', config=config)
 
+def generate_mjpeg_stream():
+    """Generador multipart que envía cada frame JPEG nuevo al cliente"""
+    last_seq = 0
+    while True:
+        # Se consulta en cada vuelta por si el sistema fue recreado
+        system = get_helmet_system()
+        # Antes de esperar: sin espectadores la etapa de codificación no genera JPEG
+        system.mark_viewed()
+        seq, jpeg = system.wait_for_frame(last_seq, timeout=1.0)
+        if jpeg is None:
+            if seq < last_seq:
+                last_seq = 0
+            continue
+        last_seq = seq
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n'
+               b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' +
+               jpeg + b'\r\n')
+
+@app.route('/api/stream')
+def api_stream():
+    """Stream MJPEG del video procesado"""
+    return Response(
+        stream_with_context(generate_mjpeg_stream()),
+        mimetype='multipart/x-mixed-replace; boundary=frame',
+        headers={'Cache-Control': 'no-cache, no-store, must-revalidate'}
+    )
+
+def generate_event_stream(system):
+    """Generador SSE: estado inicial completo y luego solo los cambios"""
+    subscriber = system.events.subscribe()
+    try:
+        yield EventHub.format('hello', {
+            'status': system.get_status(),
+            'last_log_seq': system.logs.last_seq
+        })
+        while True:
+            message = subscriber.get(timeout=config.EVENTS_KEEPALIVE_SECONDS)
+            # Comentario SSE para mantener viva la conexión en proxies
+            yield message if message is not None else ": keepalive\n\n"
+    finally:
+        system.events.unsubscribe(subscriber)
+
+@app.route('/api/events')
+def api_events():
+    """Canal Server-Sent Events con estado, violaciones y logs nuevos"""
+    system = get_helmet_system()
+    return Response(
+        stream_with_context(generate_event_stream(system)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/metrics')
+def metrics():
+    """Métricas para Prometheus (formato de texto)"""
+    system = get_helmet_system()
+    return Response(system.render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/status')
+def api_status():
+    """API ligera con el estado compacto del panel (las estadísticas completas están en /api/stats)"""
+    try:
+        system = get_helmet_system()
+        status = system.get_status()
+        status['success'] = True
+        return jsonify(status)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/frame')
 def api_frame():
-    """API para obtener el frame actual"""
+    """API para obtener el frame actual (base64, usar /api/stream para video)"""
     try:
         system = get_helmet_system()
+        system.mark_viewed()
         frame_data, violation = system.get_current_frame()
         
         if frame_data:
@@ -409,15 +1267,120 @@ def api_frame():
             'error': str(e)
         }), 500
 
+@app.route('/api/cameras/<camera_id>/frame')
+def api_camera_frame(camera_id):
+    """API para obtener el frame actual de una cámara adicional"""
+    try:
+        system = get_helmet_system()
+        camera = system.scheduler.get_source(camera_id) if system.scheduler else None
+        
+        if not camera:
+            return jsonify({
+                'success': False,
+                'error': 'Cámara no encontrada'
+            }), 404
+        
+        camera.last_viewed = time.time()
+        frame_data = camera.frame_store.get_base64()
+        violation = camera.frame_store.violation
+        
+        if frame_data:
+            return jsonify({
+                'success': True,
+                'frame': frame_data,
+                'violation': violation
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'No hay frame disponible'
+            }), 503
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/logs')
 def api_logs():
     """API para obtener los logs del sistema"""
     try:
         system = get_helmet_system()
-        return jsonify(system.get_logs())
+        limit = request.args.get('limit', type=int)
+        since = request.args.get('since', type=int)
+        if since is None:
+            return jsonify(system.get_logs(limit=limit))
+        
+        # Delta: solo entradas nuevas; el cliente reenvía 'last_seq' como since.
+        # Una secuencia futura indica que el servidor se reinició.
+        reset = since > system.logs.last_seq
+        if reset:
+            since = 0
+        logs = system.get_logs(since=since, limit=min(limit or 1000, 1000))
+        return jsonify({
+            'logs': logs,
+            'reset': reset,
+            'last_seq': logs[-1]['seq'] if logs else max(since, 0),
+            'capacity': system.logs.capacity
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_time_arg(name):
+    """Lee un parámetro de tiempo como timestamp Unix o fecha ISO 8601"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/incidents')
+def api_incidents():
+    """Historial de incidentes en un rango de tiempo (los más recientes primero)"""
+    try:
+        system = get_helmet_system()
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        offset = request.args.get('offset', 0, type=int)
+        incidents = system.incidents.query(
+            start=parse_time_arg('start'),
+            end=parse_time_arg('end'),
+            source=request.args.get('source'),
+            limit=limit,
+            offset=offset
+        )
+        for incident in incidents:
+            incident['snapshot'] = (f"/api/incidents/{incident['id']}/snapshot"
+                                    if incident['snapshot'] else None)
+            incident['clip'] = f"/api/incidents/{incident['id']}/clip" if incident['clip'] else None
+        return jsonify({'incidents': incidents, 'limit': limit, 'offset': offset})
+    except ValueError as e:
+        return jsonify({'error': f"Parámetro inválido: {e}"}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/incidents/<int:incident_id>/snapshot')
+def api_incident_snapshot(incident_id):
+    """Mejor captura guardada de un incidente"""
+    system = get_helmet_system()
+    incident = system.incidents.get(incident_id)
+    if not incident or not incident['snapshot'] or not os.path.exists(incident['snapshot']):
+        return jsonify({'error': 'Captura no disponible'}), 404
+    directory, filename = os.path.split(os.path.abspath(incident['snapshot']))
+    return send_from_directory(directory, filename, mimetype='image/jpeg')
+
+@app.route('/api/incidents/<int:incident_id>/clip')
+def api_incident_clip(incident_id):
+    """Clip MP4 de un incidente (segundos previos y posteriores)"""
+    system = get_helmet_system()
+    incident = system.incidents.get(incident_id)
+    if not incident or not incident['clip'] or not os.path.exists(incident['clip']):
+        return jsonify({'error': 'Clip no disponible'}), 404
+    directory, filename = os.path.split(os.path.abspath(incident['clip']))
+    return send_from_directory(directory, filename, mimetype='video/mp4')
+
 @app.route('/api/stats')
 def api_stats():
     """API para obtener estadísticas del sistema"""
@@ -489,25 +1452,16 @@ def api_test_notification():
     try:
         system = get_helmet_system()
         
-        # Obtener frame actual
-        frame_data, _ = system.get_current_frame()
+        # Obtener frame actual ya decodificado (sin transcodificar)
+        frame_array, _ = system.get_current_array()
         
-        if not frame_data:
+        if frame_array is None:
             return jsonify({
                 'success': False,
                 'error': 'No hay frame disponible para la prueba'
             }), 503
         
-        # Decodificar frame
-        import base64
-        frame_bytes = base64.b64decode(frame_data)
-        import numpy as np
-        frame_array = cv2.imdecode(
-            np.frombuffer(frame_bytes, np.uint8), 
-            cv2.IMREAD_COLOR
-        )
-        
-        if system.send_notification(frame_array):
+        if system.send_notification(frame_array, wait=True):
             return jsonify({
                 'success': True,
                 'message': 'Notificación de prueba enviada correctamente'
@@ -651,7 +1605,10 @@ def api_test_video_source():
 def change_to_webcam(camera_id):
     """Cambia a una cámara web específica"""
     try:
-        global helmet_system
+        # Cambiar solo la captura: el detector y el notificador siguen activos
+        system = get_helmet_system()
+        if not system.switch_source(camera_id):
+            return False
         
         # Actualizar configuración
         config.USE_WEBCAM = True
@@ -659,13 +1616,6 @@ def change_to_webcam(camera_id):
         config.VIDEO_SOURCE_TYPE = 'webcam'
         config.CURRENT_CAMERA_ID = camera_id
         
-        # Reiniciar sistema de cámara
-        if helmet_system:
-            helmet_system.stop()
-            helmet_system = None
-        
-        # Crear nuevo sistema
-        system = get_helmet_system()
         system.log_event("CONFIG", f"Cambiado a cámara {camera_id}")
         
         return True
@@ -677,24 +1627,20 @@ def change_to_webcam(camera_id):
 def change_to_video(video_index):
     """Cambia a un video específico"""
     try:
-        global helmet_system
-        
         if video_index >= len(config.AVAILABLE_VIDEOS):
             return False
         
+        # Cambiar solo la captura: el detector y el notificador siguen activos
+        system = get_helmet_system()
+        if not system.switch_source(config.AVAILABLE_VIDEOS[video_index]):
+            return False
+        
         # Actualizar configuración
         config.USE_WEBCAM = False
         config.VIDEO_PATH = config.AVAILABLE_VIDEOS[video_index]
         config.VIDEO_SOURCE_TYPE = 'video'
         config.CURRENT_VIDEO_INDEX = video_index
         
-        # Reiniciar sistema de cámara
-        if helmet_system:
-            helmet_system.stop()
-            helmet_system = None
-        
-        # Crear nuevo sistema
-        system = get_helmet_system()
         system.log_event("CONFIG", f"Cambiado a video: {config.VIDEO_PATH}")
         
         return True
@@ -751,9 +1697,6 @@ def test_video_file(video_index):
 # REEMPLAZA LA PARTE FINAL DE app.py (líneas finales) CON ESTO:
 
 if __name__ == '__main__':
-    import numpy as np
-    import os
-    
     try:
         print("🚀 INICIANDO SISTEMA WEB DE DETECCIÓN DE CASCOS")
         print("=" * 60)
@@ -0,0 +1,281 @@
+# batch_process.py - Procesamiento offline de grabaciones con índice de violaciones
+import argparse
+import glob
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import time
+
+import cv2
+
+import config
+from detector import HelmetDetector, InferenceSettings
+from video_source import FrameReader
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.ts')
+
+# Detector del proceso (uno por trabajador, se crea en el inicializador)
+_detector = None
+
+
+def _init_worker(detector_kwargs, threads):
+    global _detector
+    if threads:
+        cv2.setNumThreads(threads)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    _detector = HelmetDetector(**detector_kwargs)
+
+
+def timecode(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def collect_videos(inputs):
+    """Expande archivos, directorios y patrones glob a una lista de videos"""
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            videos += sorted(os.path.join(item, name) for name in os.listdir(item)
+                             if name.lower().endswith(VIDEO_EXTENSIONS))
+        else:
+            videos += sorted(glob.glob(item)) or [item]
+    return videos
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"No se pudo abrir el video: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, frames
+
+
+def split_segments(path, frames, workers, segment_frames):
+    """Divide un video en rangos de frames [inicio, fin) para repartir entre procesos"""
+    if workers <= 1 or frames <= 0:
+        return [(path, 0, frames if frames > 0 else None)]
+    count = max(workers, math.ceil(frames / segment_frames))
+    size = math.ceil(frames / count)
+    return [(path, start, min(start + size, frames)) for start in range(0, frames, size)]
+
+
+def process_segment(job):
+    """
+    Decodifica un rango de frames lo más rápido posible y ejecuta la detección
+    en lotes. La decodificación corre en un FrameReader (hilo propio) que
+    prepara el lote siguiente mientras el detector procesa el actual. Los
+    frames salteados por `stride` solo se hacen grab() (sin decodificar la
+    imagen completa). Retorna los registros de violación.
+    """
+    path, start, end, fps, stride, batch_size, settings_values = job
+    detector = _detector
+    settings = InferenceSettings.from_dict(settings_values)
+
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    records = []
+    decoded = 0
+    index = start
+    batch, numbers = [], []
+
+    def flush():
+        for number, results in zip(numbers, detector.detect_batch(batch, settings)):
+            violation = detector.find_violations(results)
+            if violation['count'] == 0:
+                continue
+            xyxy, conf, _ = detector.boxes_arrays(results)
+            boxes = [[round(float(v), 1) for v in xyxy[i]] + [round(float(conf[i]), 3)]
+                     for i in violation['indices']]
+            records.append({
+                'frame': number,
+                'time': round(number / fps, 3),
+                'timecode': timecode(number / fps),
+                'count': violation['count'],
+                'max_conf': round(violation['max_conf'], 3),
+                'boxes': boxes
+            })
+        batch.clear()
+        numbers.clear()
+
+    # Primer frame muestreado (índice absoluto múltiplo de stride); desde ahí
+    # el lector decodifica uno de cada `stride`
+    reader = None
+    try:
+        while index % stride and (end is None or index < end) and cap.grab():
+            index += 1
+        first = None
+        if (end is None or index < end) and index % stride == 0:
+            ret, first = cap.read()
+        if first is not None:
+            reader = FrameReader(cap, is_file=True, prefetch=max(2, batch_size), loop=False,
+                                 stride=lambda: stride)
+            frame, number = first, index
+            while frame is not None and (end is None or number < end):
+                decoded += 1
+                batch.append(frame)
+                numbers.append(number)
+                index = number + 1
+                if len(batch) >= batch_size:
+                    flush()
+                # Un frame lento de decodificar no es el final del video
+                frame, advance = reader.read(timeout=1.0)
+                while frame is None and not reader.ended:
+                    frame, advance = reader.read(timeout=1.0)
+                number += advance
+            if frame is not None:
+                index = end  # Segmento completo (el lector ya pasó de `end`)
+            else:
+                # Fin del video: contar también los frames salteados tras el último decodificado
+                reader.thread.join(timeout=1)
+                index = max(index, int(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+        if batch:
+            flush()
+    finally:
+        if reader:
+            reader.stop(release=True)
+        else:
+            cap.release()
+
+    return path, start, index - start, decoded, records
+
+
+def violation_events(records, fps, max_gap_seconds):
+    """Agrupa frames con violación cercanos en eventos (inicio, fin, pico de confianza)"""
+    events = []
+    for record in records:
+        if events and record['time'] - events[-1]['end'] <= max_gap_seconds:
+            event = events[-1]
+            event['end'] = record['time']
+            event['frames'] += 1
+            event['max_conf'] = max(event['max_conf'], record['max_conf'])
+            event['max_count'] = max(event['max_count'], record['count'])
+        else:
+            events.append({'start': record['time'], 'end': record['time'], 'frames': 1,
+                           'max_conf': record['max_conf'], 'max_count': record['count']})
+    for event in events:
+        event['start_timecode'] = timecode(event['start'])
+        event['end_timecode'] = timecode(event['end'] + 1 / fps)
+    return events
+
+
+def write_index(output_dir, path, records, summary):
+    """Escribe el índice (JSON Lines, un frame por línea) y el resumen del video"""
+    # Prefijo de la ruta completa: videos homónimos de carpetas distintas no se pisan
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    base = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_{digest}")
+    with open(base + '.violations.jsonl', 'w', encoding='utf-8') as file:
+        for record in records:
+            file.write(json.dumps(record, separators=(',', ':')) + '\n')
+    with open(base + '.summary.json', 'w', encoding='utf-8') as file:
+        json.dump(summary, file, indent=2)
+    return base + '.violations.jsonl'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesa grabaciones sin interfaz y genera un índice de violaciones")
+    parser.add_argument('inputs', nargs='+', help="Videos, directorios o patrones glob")
+    parser.add_argument('--output-dir', default='violations_index')
+    parser.add_argument('--batch-size', type=int, default=config.MAX_BATCH_SIZE)
+    parser.add_argument('--stride', type=int, default=1, help="Procesar 1 de cada N frames")
+    parser.add_argument('--workers', type=int, default=1, help="Procesos de detección")
+    parser.add_argument('--threads', type=int, default=0, help="Hilos de cómputo por proceso (0 = por defecto)")
+    parser.add_argument('--segment-frames', type=int, default=9000, help="Frames por segmento al repartir un video")
+    parser.add_argument('--settings', default='default', help="Clave de SOURCE_SETTINGS a usar")
+    parser.add_argument('--event-gap', type=float, default=2.0, help="Segundos sin violación que separan eventos")
+    parser.add_argument('--model', default=config.MODEL_PATH)
+    parser.add_argument('--backend', default=config.INFERENCE_BACKEND)
+    parser.add_argument('--imgsz', type=int, default=config.INFERENCE_IMGSZ)
+    parser.add_argument('--precision', default=config.MODEL_PRECISION)
+    args = parser.parse_args()
+
+    videos = collect_videos(args.inputs)
+    if not videos:
+        print("ERROR: No se encontraron videos")
+        return
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    settings = dict(config.SOURCE_SETTINGS.get('default', {}))
+    settings.update(config.SOURCE_SETTINGS.get(args.settings, {}))
+    detector_kwargs = dict(model_path=args.model, target_class=config.TARGET_CLASS_NAME,
+                           conf_threshold=config.VIOLATION_CONF_THRESHOLD, backend=args.backend,
+                           imgsz=args.imgsz, precision=args.precision, warmup=True)
+
+    # Segmentos de todos los videos
+    info = {}
+    jobs = []
+    for path in videos:
+        try:
+            fps, frames = video_info(path)
+        except IOError as e:
+            print(f"WARN: {e}")
+            continue
+        info[path] = {'fps': fps, 'frames': frames, 'segments': 0, 'records': [], 'read': 0, 'decoded': 0}
+        for segment in split_segments(path, frames, args.workers, args.segment_frames):
+            jobs.append(segment + (fps, max(1, args.stride), args.batch_size, settings))
+            info[path]['segments'] += 1
+
+    print(f"INFO: {len(info)} videos, {len(jobs)} segmentos, {args.workers} proceso(s)")
+    start = time.perf_counter()
+
+    if args.workers > 1:
+        context = multiprocessing.get_context('spawn')
+        pool = context.Pool(args.workers, initializer=_init_worker, initargs=(detector_kwargs, args.threads))
+        results = pool.imap_unordered(process_segment, jobs)
+    else:
+        pool = None
+        _init_worker(detector_kwargs, args.threads)
+        results = map(process_segment, jobs)
+
+    try:
+        for path, segment_start, read, decoded, records in results:
+            entry = info[path]
+            entry['records'] += records
+            entry['read'] += read
+            entry['decoded'] += decoded
+            entry['segments'] -= 1
+            if entry['segments'] > 0:
+                continue
+
+            # Video completo: ordenar y escribir el índice
+            records = sorted(entry['records'], key=lambda r: r['frame'])
+            duration = entry['read'] / entry['fps']
+            summary = {
+                'video': path,
+                'fps': entry['fps'],
+                'frames': entry['read'],
+                'frames_processed': entry['decoded'],
+                'stride': args.stride,
+                'duration_s': round(duration, 2),
+                'violation_frames': len(records),
+                'events': violation_events(records, entry['fps'], args.event_gap),
+                'settings': settings
+            }
+            index_path = write_index(args.output_dir, path, records, summary)
+            print(f"INFO: {os.path.basename(path)}: {len(records)} frames con violación, "
+                  f"{len(summary['events'])} eventos → {index_path}")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    total_frames = sum(entry['read'] for entry in info.values())
+    total_seconds = sum(entry['read'] / entry['fps'] for entry in info.values())
+    print(f"INFO: {total_frames} frames ({total_seconds / 60:.1f} min de video) en {elapsed:.1f} s "
+          f"({total_frames / elapsed:.0f} FPS, {total_seconds / elapsed:.1f}x tiempo real)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmark_backends.py - Compara la latencia de los backends de inferencia
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import config
+from detector import HelmetDetector
+
+
+def load_frames(video_path, count):
+    """Lee los primeros `count` frames del video"""
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def benchmark_backend(backend, frames, warmup=5):
+    """Mide la latencia por frame de un backend; retorna un dict de resultados"""
+    start = time.perf_counter()
+    detector = HelmetDetector(config.MODEL_PATH, target_class=config.TARGET_CLASS_NAME,
+                              backend=backend, imgsz=config.INFERENCE_IMGSZ)
+    load_time = time.perf_counter() - start
+
+    for frame in frames[:warmup]:
+        detector.detect_on_frame(frame)
+
+    latencies = []
+    violations = 0
+    for frame in frames:
+        start = time.perf_counter()
+        results = detector.detect_on_frame(frame)
+        latencies.append(time.perf_counter() - start)
+        violations += detector.find_violation(results)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'backend': detector.backend.name,
+        'load_s': load_time,
+        'mean_ms': latencies.mean(),
+        'p50_ms': np.percentile(latencies, 50),
+        'p95_ms': np.percentile(latencies, 95),
+        'fps': 1000 / latencies.mean(),
+        'violation_frames': violations
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara backends de inferencia del detector de cascos")
+    parser.add_argument('--video', default=config.VIDEO_PATH, help="Video de prueba")
+    parser.add_argument('--frames', type=int, default=100, help="Cantidad de frames a medir")
+    parser.add_argument('--backends', nargs='+', default=['pytorch', 'onnx', 'openvino'])
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    if not frames:
+        print(f"ERROR: No se pudieron leer frames de: {args.video}")
+        return
+
+    print(f"INFO: {len(frames)} frames de '{args.video}'")
+    rows = []
+    for backend in args.backends:
+        try:
+            rows.append(benchmark_backend(backend, frames))
+        except Exception as e:
+            print(f"WARN: Backend '{backend}' no disponible: {e}")
+
+    print(f"\n{'backend':<10} {'carga(s)':>9} {'media(ms)':>10} {'p50(ms)':>9} {'p95(ms)':>9} {'FPS':>7} {'violaciones':>12}")
+    for row in rows:
+        print(f"{row['backend']:<10} {row['load_s']:>9.2f} {row['mean_ms']:>10.1f} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['fps']:>7.1f} {row['violation_frames']:>12}")
+
+
+if __name__ == "__main__":
+    main()
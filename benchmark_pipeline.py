@@ -0,0 +1,412 @@
+# benchmark_pipeline.py - Benchmark reproducible de las etapas del pipeline y de la API web
+import argparse
+import base64
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage, el reporte omite el RSS
+    resource = None
+
+import config
+from detector import HelmetDetector, InferenceSettings
+from frame_store import FrameStore
+
+STAGES = ['capture', 'detect', 'find_violations', 'draw', 'jpeg', 'base64', 'total']
+
+
+def peak_rss_mb():
+    """
+    Memoria residente máxima del proceso en MB (ru_maxrss está en KB en Linux,
+    bytes en macOS). Retorna None donde no existe el módulo resource.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def summarize(latencies):
+    """Percentiles en ms y FPS equivalente de una lista de latencias en segundos"""
+    if not latencies:
+        return {'count': 0}
+    values = np.array(latencies) * 1000
+    return {
+        'count': int(len(values)),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+        'fps': round(1000 / float(values.mean()), 2) if values.mean() > 0 else None
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def replay_video(detector, video_path, max_frames, settings, warmup=5):
+    """
+    Reproduce el video sin pausas y mide cada etapa por frame, igual que el
+    pipeline web: captura → inferencia → violaciones → dibujo → JPEG → base64.
+    """
+    timings = {stage: [] for stage in STAGES}
+    frame_store = FrameStore()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"No se pudo abrir el video: {video_path}")
+
+    index = 0
+    violations = 0
+    try:
+        while index < max_frames + warmup:
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            captured = time.perf_counter()
+            if not ret:
+                break
+
+            results = detector.detect_on_frame(frame, settings)
+            detected = time.perf_counter()
+            violation = detector.find_violations(results)
+            checked = time.perf_counter()
+            buffer = frame_store.acquire(frame.shape, frame.dtype)
+            annotated = detector.draw_detections(results, frame, out=buffer)
+            drawn = time.perf_counter()
+            _, jpeg = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            encoded = time.perf_counter()
+            base64.b64encode(jpeg.tobytes())
+            finished = time.perf_counter()
+            frame_store.publish(annotated, jpeg.tobytes(), violation['count'] > 0)
+
+            # Los primeros frames pagan la inicialización diferida
+            if index >= warmup:
+                violations += violation['count'] > 0
+                for stage, elapsed in (('capture', captured - start), ('detect', detected - captured),
+                                       ('find_violations', checked - detected), ('draw', drawn - checked),
+                                       ('jpeg', encoded - drawn), ('base64', finished - encoded),
+                                       ('total', finished - start)):
+                    timings[stage].append(elapsed)
+            index += 1
+    finally:
+        cap.release()
+
+    return timings, violations
+
+
+def run_stage_benchmark(args):
+    detector = HelmetDetector(
+        args.model,
+        target_class=config.TARGET_CLASS_NAME,
+        conf_threshold=config.VIOLATION_CONF_THRESHOLD,
+        backend=args.backend,
+        imgsz=args.imgsz,
+        precision=args.precision,
+        warmup=True
+    )
+    settings = InferenceSettings.from_dict(config.SOURCE_SETTINGS.get('default'))
+
+    report = {}
+    for video in args.videos:
+        print(f"INFO: Reproduciendo '{video}' ({args.frames} frames)...")
+        timings, violations = replay_video(detector, video, args.frames, settings)
+        report[os.path.basename(video)] = {
+            'stages': {stage: summarize(values) for stage, values in timings.items()},
+            'violation_frames': violations
+        }
+    return report, detector.backend.name if detector.backend else args.backend
+
+
+def _client(url, requests, latencies, errors, lock):
+    local = []
+    failed = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                response.read()
+            local.append(time.perf_counter() - start)
+        except Exception:
+            failed += 1
+    with lock:
+        latencies.extend(local)
+        errors[0] += failed
+
+
+def _stream_client(url, duration, counts, lock):
+    """Lee el stream MJPEG durante `duration` segundos contando frames"""
+    frames = 0
+    deadline = time.time() + duration
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            while time.time() < deadline:
+                line = response.readline()
+                if not line:
+                    break
+                if line.startswith(b'Content-Length:'):
+                    length = int(line.split(b':', 1)[1])
+                    response.readline()
+                    response.read(length)
+                    frames += 1
+    except Exception:
+        pass
+    with lock:
+        counts.append(frames)
+
+
+def run_load_test(args):
+    """
+    Levanta la app Flask real sobre un video (sin Telegram) y la somete a
+    clientes concurrentes por endpoint. Retorna latencias y throughput.
+    """
+    from werkzeug.serving import make_server
+
+    # Fuente offline y notificaciones desactivadas para no enviar alertas reales
+    config.USE_WEBCAM = False
+    config.VIDEO_PATH = args.videos[0]
+    config.BOT_TOKEN = None
+    # Mismo modelo que el benchmark de etapas
+    config.MODEL_PATH = args.model
+    config.INFERENCE_BACKEND = args.backend
+    config.INFERENCE_IMGSZ = args.imgsz
+    config.MODEL_PRECISION = args.precision
+    # Incidentes, clips y outbox en un directorio temporal, no en el de trabajo
+    data_dir = tempfile.mkdtemp(prefix='load_test_')
+    config.DATA_DIR = data_dir
+    config.INCIDENT_DB_PATH = os.path.join(data_dir, 'incidents.db')
+    config.INCIDENT_SNAPSHOT_DIR = os.path.join(data_dir, 'incidents')
+    config.CLIP_DIR = os.path.join(data_dir, 'clips')
+    config.NOTIFICATION_OUTBOX_DIR = os.path.join(data_dir, 'outbox')
+
+    import app as web
+    system = web.get_helmet_system()
+    system.is_detection_active = True
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    # Esperar el primer frame del pipeline
+    system.wait_for_frame(0, timeout=30)
+
+    report = {}
+    try:
+        for endpoint in args.endpoints:
+            latencies, errors, lock = [], [0], threading.Lock()
+            clients = [threading.Thread(target=_client, args=(base + endpoint, args.requests, latencies, errors, lock))
+                       for _ in range(args.clients)]
+            start = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - start
+
+            result = summarize(latencies)
+            result.pop('fps', None)
+            result.update({'clients': args.clients, 'errors': errors[0],
+                           'requests_per_s': round(len(latencies) / elapsed, 2)})
+            report[endpoint] = result
+            print(f"INFO: {endpoint}: {result['requests_per_s']} req/s, p95 {result.get('p95_ms')} ms, "
+                  f"{errors[0]} errores")
+
+        # Stream MJPEG: FPS que recibe cada cliente con N clientes simultáneos
+        counts, lock = [], threading.Lock()
+        clients = [threading.Thread(target=_stream_client, args=(base + '/api/stream', args.stream_seconds, counts, lock))
+                   for _ in range(args.clients)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        report['/api/stream'] = {
+            'clients': args.clients,
+            'fps_per_client_mean': round(float(np.mean(counts)) / args.stream_seconds, 2) if counts else 0.0,
+            'fps_per_client_min': round(min(counts) / args.stream_seconds, 2) if counts else 0.0
+        }
+        report['pipeline'] = system.get_stats().get('pipeline', {})
+    finally:
+        server.shutdown()
+        system.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return report
+
+
+def run_notify_test(args):
+    """
+    Mide el notificador con outbox contra la Bot API falsa: throughput con
+    conexión y, tras un corte simulado, cuánto tarda en vaciar lo acumulado.
+    """
+    from fake_bot_api import FakeBotAPI
+    from notifier import TelegramNotifier
+    from outbox import NotificationOutbox
+
+    api = FakeBotAPI(port=0, latency=args.bot_latency).start()
+    directory = tempfile.mkdtemp(prefix='outbox_bench_')
+    notifier = TelegramNotifier('123:bench', '1', queue_size=args.notify_alerts, coalesce=False,
+                                base_url=api.base_url, outbox=NotificationOutbox(directory, max_entries=0),
+                                retry_base=0.25, retry_max=1.0)
+    notifier.start()
+    frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    _, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    jpeg = encoded.tobytes()
+
+    def send(count):
+        futures = []
+        for _ in range(count):
+            future = notifier.send_alert(frame, jpeg=jpeg)
+            while future is None:  # Cola en memoria llena: esperar al trabajador
+                time.sleep(0.001)
+                future = notifier.send_alert(frame, jpeg=jpeg)
+            futures.append(future)
+        return futures
+
+    report = {'bot_latency_s': args.bot_latency, 'alerts': args.notify_alerts}
+    try:
+        # 1) Conexión estable: una alerta por mensaje
+        start = time.perf_counter()
+        delivered = sum(future.result(timeout=120) for future in send(args.notify_alerts))
+        elapsed = time.perf_counter() - start
+        report['online'] = {'delivered': delivered, 'alerts_per_s': round(delivered / elapsed, 2),
+                            'requests': api.count('sendPhoto') + api.count('sendMediaGroup')}
+        print(f"INFO: Notificador con conexión: {report['online']['alerts_per_s']} alertas/s")
+
+        # 2) Corte: las alertas quedan en disco y se envían en lotes al volver la red
+        api.down = True
+        before = api.count('sendPhoto') + api.count('sendMediaGroup')
+        futures = send(args.notify_alerts)
+        time.sleep(args.outage_seconds)
+        persisted = notifier.outbox.pending()
+        api.down = False
+        start = time.perf_counter()
+        delivered = sum(future.result(timeout=120) for future in futures)
+        elapsed = time.perf_counter() - start
+        report['outage'] = {'seconds': args.outage_seconds, 'persisted': persisted, 'delivered': delivered,
+                            'drain_s': round(elapsed, 3),
+                            'requests': api.count('sendPhoto') + api.count('sendMediaGroup') - before}
+        print(f"INFO: Tras el corte: {persisted} alertas en disco, {delivered} entregadas en "
+              f"{elapsed:.2f} s con {report['outage']['requests']} peticiones")
+    finally:
+        notifier.close()
+        api.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Lista de regresiones de p95 por etapa respecto a un reporte anterior"""
+    regressions = []
+    for video, current in report.get('videos', {}).items():
+        previous = baseline.get('videos', {}).get(video)
+        if not previous:
+            continue
+        for stage, stats in current['stages'].items():
+            old = previous['stages'].get(stage, {}).get('p95_ms')
+            new = stats.get('p95_ms')
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"{video}/{stage}: p95 {old:.2f} → {new:.2f} ms")
+    for endpoint, current in report.get('load_test', {}).items():
+        old = baseline.get('load_test', {}).get(endpoint, {}).get('p95_ms')
+        new = current.get('p95_ms')
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {old:.2f} → {new:.2f} ms")
+    old = baseline.get('notifier', {}).get('online', {}).get('alerts_per_s')
+    new = report.get('notifier', {}).get('online', {}).get('alerts_per_s')
+    if old and new is not None and new < old * (1 - tolerance):
+        regressions.append(f"notificador: {old:.2f} → {new:.2f} alertas/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reproducible del pipeline de detección de cascos")
+    parser.add_argument('--videos', nargs='+', default=sorted(set(config.AVAILABLE_VIDEOS)))
+    parser.add_argument('--frames', type=int, default=300, help="Frames medidos por video")
+    parser.add_argument('--model', default=config.MODEL_PATH)
+    parser.add_argument('--backend', default=config.INFERENCE_BACKEND)
+    parser.add_argument('--imgsz', type=int, default=config.INFERENCE_IMGSZ)
+    parser.add_argument('--precision', default=config.MODEL_PRECISION)
+    parser.add_argument('--load-test', action='store_true', help="Incluir prueba de carga de la API Flask")
+    parser.add_argument('--endpoints', nargs='+', default=['/api/status', '/api/frame', '/api/logs?since=0'])
+    parser.add_argument('--clients', type=int, default=8, help="Clientes concurrentes en la prueba de carga")
+    parser.add_argument('--requests', type=int, default=50, help="Peticiones por cliente y endpoint")
+    parser.add_argument('--stream-seconds', type=float, default=5.0)
+    parser.add_argument('--notify-test', action='store_true', help="Incluir throughput del notificador con outbox")
+    parser.add_argument('--notify-alerts', type=int, default=100, help="Alertas por fase de la prueba del notificador")
+    parser.add_argument('--bot-latency', type=float, default=0.05, help="Latencia simulada de la Bot API (s)")
+    parser.add_argument('--outage-seconds', type=float, default=3.0, help="Duración del corte simulado")
+    parser.add_argument('--output', default='benchmark_report.json')
+    parser.add_argument('--baseline', help="Reporte anterior para detectar regresiones")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Aumento de p95 (o caída de alertas/s) tolerado (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    stages, backend = run_stage_benchmark(args)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model': args.model,
+            'backend': backend,
+            'imgsz': args.imgsz,
+            'precision': args.precision,
+            'frames_per_video': args.frames
+        },
+        'videos': stages
+    }
+    if args.load_test:
+        report['load_test'] = run_load_test(args)
+    if args.notify_test:
+        report['notifier'] = run_notify_test(args)
+    peak = peak_rss_mb()
+    if peak is not None:
+        report['peak_rss_mb'] = round(peak, 1)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+
+    print(f"\n{'video/etapa':<36} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'FPS':>8}")
+    for video, result in stages.items():
+        for stage, stats in result['stages'].items():
+            if stats['count']:
+                print(f"{video + '/' + stage:<36} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                      f"{stats['p99_ms']:>9.2f} {stats['fps']:>8.1f}")
+    rss = f"RSS máximo: {report['peak_rss_mb']} MB. " if 'peak_rss_mb' in report else ''
+    print(f"\nINFO: {rss}Reporte guardado en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        if regressions:
+            print("WARN: Regresiones detectadas:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("INFO: Sin regresiones respecto al baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# clip_recorder.py - Clips MP4 de violaciones con buffer previo al evento
+import collections
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class _Recording:
+    """Clip en curso: frames previos + frames hasta `end_time`"""
+    def __init__(self, path, frames, end_time):
+        self.path = path
+        self.frames = frames        # [(timestamp, jpeg)]
+        self.bytes = sum(len(jpeg) for _, jpeg in frames)
+        self.end_time = end_time
+
+
+class ClipRecorder:
+    """
+    Guarda por fuente los últimos frames ya codificados en JPEG (los mismos
+    bytes que se publican al stream, sin volver a codificar), acotados por
+    `pre_seconds` y por un presupuesto de memoria. Al dispararse una violación
+    el clip toma esos frames, sigue acumulando `post_seconds` más y se entrega
+    a un hilo escritor que decodifica y escribe el MP4; la captura nunca
+    espera al disco. Después de cada clip se aplican los límites de
+    antigüedad y de tamaño del directorio. Si un clip disparado no llega a
+    escribirse se llama a `on_missing(ruta)` para que nadie apunte a él.
+
+    Con `max_fps` el buffer guarda como máximo esa cantidad de frames por
+    segundo; wants_frame() indica al pipeline qué frames necesita, así los
+    demás no se anotan ni se codifican si nadie más los ve.
+    """
+    def __init__(self, clip_dir='clips', pre_seconds=5, post_seconds=5, buffer_mb=32,
+                 retention_days=7, max_dir_mb=2048, fourcc='mp4v', on_missing=None, max_fps=0):
+        self.clip_dir = clip_dir
+        self.frame_interval = 1.0 / max_fps if max_fps else 0.0
+        self.on_missing = on_missing
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.buffer_bytes = int(buffer_mb * 1024 * 1024)
+        self.retention_seconds = retention_days * 86400 if retention_days else None
+        self.max_dir_bytes = int(max_dir_mb * 1024 * 1024) if max_dir_mb else None
+        self.fourcc = fourcc
+        os.makedirs(clip_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.buffers = {}      # fuente -> deque[(timestamp, jpeg)]
+        self.buffer_sizes = {}  # fuente -> bytes en el buffer
+        self.recordings = {}   # fuente -> _Recording
+        self.next_due = {}     # fuente -> timestamp desde el que se acepta el próximo frame
+
+        self.stats = {'clips_written': 0, 'clips_empty': 0, 'clips_failed': 0, 'clips_pruned': 0,
+                      'frames_evicted': 0}
+        self.writes = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name="clip-writer", daemon=True)
+        self.writer.start()
+        self.writes.put(None)  # Limpieza inicial del directorio
+
+    def wants_frame(self, source_id, timestamp):
+        """Indica si el frame de `timestamp` entra en el buffer (límite de `max_fps`)"""
+        with self.lock:
+            return timestamp >= self.next_due.get(source_id, 0.0)
+
+    def add_frame(self, source_id, jpeg, timestamp=None):
+        """Agrega un frame codificado al buffer de la fuente (y al clip en curso)"""
+        timestamp = timestamp or time.time()
+        finished = None
+        with self.lock:
+            if self.frame_interval:
+                # Cadencia fija; tras un hueco mayor a un intervalo no se acumula deuda
+                due = self.next_due.get(source_id, timestamp)
+                if timestamp - due >= self.frame_interval:
+                    due = timestamp
+                self.next_due[source_id] = due + self.frame_interval
+            frames = self.buffers.get(source_id)
+            if frames is None:
+                frames = self.buffers[source_id] = collections.deque()
+                self.buffer_sizes[source_id] = 0
+            frames.append((timestamp, jpeg))
+            size = self.buffer_sizes[source_id] + len(jpeg)
+
+            # Descartar lo más viejo por tiempo o por presupuesto de memoria
+            while frames and (timestamp - frames[0][0] > self.pre_seconds or size > self.buffer_bytes):
+                size -= len(frames.popleft()[1])
+                self.stats['frames_evicted'] += 1
+            self.buffer_sizes[source_id] = size
+
+            recording = self.recordings.get(source_id)
+            if recording:
+                recording.frames.append((timestamp, jpeg))
+                recording.bytes += len(jpeg)
+                # El clip también respeta el presupuesto: se corta antes si lo supera
+                if timestamp >= recording.end_time or recording.bytes > self.buffer_bytes * 2:
+                    finished = self.recordings.pop(source_id)
+        if finished:
+            self.writes.put(finished)
+
+    def trigger(self, source_id, name, timestamp=None):
+        """
+        Inicia un clip para la fuente con los frames previos del buffer.
+        Si ya hay uno en curso se extiende y se retorna su ruta.
+        """
+        timestamp = timestamp or time.time()
+        with self.lock:
+            recording = self.recordings.get(source_id)
+            if recording:
+                recording.end_time = max(recording.end_time, timestamp + self.post_seconds)
+                return recording.path
+            path = os.path.join(self.clip_dir, f"{name}.mp4")
+            frames = list(self.buffers.get(source_id, ()))
+            self.recordings[source_id] = _Recording(path, frames, timestamp + self.post_seconds)
+            return path
+
+    def flush(self, source_id=None):
+        """Cierra los clips en curso con los frames que ya tengan"""
+        with self.lock:
+            sources = [source_id] if source_id is not None else list(self.recordings)
+            finished = [self.recordings.pop(source) for source in sources if source in self.recordings]
+            for source in sources:
+                self.buffers.pop(source, None)
+                self.buffer_sizes.pop(source, None)
+                self.next_due.pop(source, None)
+        for recording in finished:
+            self.writes.put(recording)
+
+    def close(self, timeout=10):
+        self.flush()
+        self.writes.put(False)
+        self.writer.join(timeout=timeout)
+
+    # --- Hilo escritor ---
+
+    def _write_loop(self):
+        while True:
+            recording = self.writes.get()
+            if recording is False:
+                break
+            if recording is not None:
+                try:
+                    written = self._write_clip(recording)
+                    self.stats['clips_written' if written else 'clips_empty'] += 1
+                except Exception as e:
+                    written = False
+                    self.stats['clips_failed'] += 1
+                    print(f"ERROR: No se pudo escribir el clip {recording.path}: {e}")
+                if not written and self.on_missing:
+                    self.on_missing(recording.path)
+            try:
+                self._prune()
+            except OSError as e:
+                print(f"WARN: No se pudo limpiar el directorio de clips: {e}")
+
+    def _write_clip(self, recording):
+        """Escribe el MP4; retorna False si no había frames decodificables"""
+        frames = recording.frames
+        if not frames:
+            return False
+        duration = frames[-1][0] - frames[0][0]
+        # FPS real del buffer, así el clip dura lo mismo que el evento
+        fps = (len(frames) - 1) / duration if duration > 0 else 10.0
+        fps = min(max(fps, 1.0), 60.0)
+
+        # OpenCV elige el contenedor por la extensión: el temporal también es .mp4
+        temp_path = recording.path[:-len('.mp4')] + '.part.mp4'
+        writer = None
+        try:
+            for _, jpeg in frames:
+                image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    continue
+                if writer is None:
+                    size = (image.shape[1], image.shape[0])
+                    writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*self.fourcc), fps, size)
+                    if not writer.isOpened():
+                        raise IOError(f"codec '{self.fourcc}' no disponible")
+                elif (image.shape[1], image.shape[0]) != size:
+                    image = cv2.resize(image, size)
+                writer.write(image)
+        except Exception:
+            if writer is not None:
+                writer.release()
+                writer = None
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if writer is None:
+            return False
+        writer.release()
+        os.replace(temp_path, recording.path)
+        return True
+
+    def _prune(self):
+        """Borra clips más viejos que la retención y, si el directorio excede su tamaño, los más antiguos"""
+        clips = []
+        for name in os.listdir(self.clip_dir):
+            if name.endswith('.mp4') and not name.endswith('.part.mp4'):
+                path = os.path.join(self.clip_dir, name)
+                stat = os.stat(path)
+                clips.append((stat.st_mtime, stat.st_size, path))
+        clips.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in clips)
+        for mtime, size, path in clips:
+            expired = self.retention_seconds and now - mtime > self.retention_seconds
+            oversize = self.max_dir_bytes and total > self.max_dir_bytes
+            if not expired and not oversize:
+                break
+            os.remove(path)
+            total -= size
+            self.stats['clips_pruned'] += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                **self.stats,
+                'recording': [str(source) for source in self.recordings],
+                'buffered_frames': {str(source): len(frames) for source, frames in self.buffers.items()},
+                'buffered_mb': round(sum(self.buffer_sizes.values()) / (1024 * 1024), 2),
+                'pending_writes': self.writes.qsize()
+            }
@@ -26,19 +26,163 @@ VIDEO_PATH = AVAILABLE_VIDEOS[CURRENT_VIDEO_INDEX]
 MODEL_PATH = "best.pt"
 # Escribe el nombre exacto de la clase que representa a una persona SIN casco
 TARGET_CLASS_NAME = 'head'
+# Confianza mínima para considerar una caja de TARGET_CLASS_NAME como violación
+VIOLATION_CONF_THRESHOLD = 0.25
+
+# Backend de inferencia: 'pytorch', 'onnx', 'openvino' o 'auto' (el más rápido instalado).
+# 'onnx' requiere onnxruntime y 'openvino' requiere openvino (requirements-optional.txt); si el modelo
+# exportado no existe junto a MODEL_PATH se exporta automáticamente.
+INFERENCE_BACKEND = 'pytorch'
+INFERENCE_IMGSZ = 640
+# Precisión del modelo: 'fp32', 'fp16' o 'int8'. Las variantes cuantizadas se
+# generan con quantize_model.py y se ejecutan con ONNX Runtime.
+MODEL_PRECISION = 'fp32'
+# Ejecutar una inferencia de calentamiento al cargar el modelo
+MODEL_WARMUP = True
+# Pesos ONNX/OpenVINO desde archivos mapeados en memoria (compartidos entre procesos)
+MODEL_MMAP_WEIGHTS = False
+# Procesos de inferencia separados del proceso de Flask (0 = inferencia en el
+# mismo proceso). Los frames se pasan por memoria compartida sin serializar.
+INFERENCE_WORKERS = 0
+INFERENCE_WORKER_SLOTS = 4                 # Frames en vuelo por proceso
+INFERENCE_WORKER_THREADS = 1               # Hilos de cómputo dentro de cada proceso
+INFERENCE_MAX_FRAME_SHAPE = (1080, 1920, 3)  # Frames más grandes se envían serializados
+INFERENCE_TASK_TIMEOUT = 60                # Segundos máximos de espera por un lote
+
+# --- AJUSTES DE INFERENCIA POR FUENTE ---
+# 'default' aplica a todas las fuentes; la fuente principal ('main') o cualquier
+# id de EXTRA_CAMERAS puede sobrescribir valores. Claves disponibles:
+#   imgsz   - tamaño de entrada del modelo (múltiplo de 32)
+#   conf    - confianza mínima de las detecciones
+#   iou     - umbral IoU del NMS
+#   classes - nombres de clases a conservar (None = todas)
+#   rois    - regiones de interés normalizadas [[x1, y1, x2, y2], ...] en 0-1;
+#             solo esos recortes pasan por el modelo (None = frame completo)
+# Ejemplo: 'entrada': {'imgsz': 416, 'rois': [[0.0, 0.3, 0.6, 1.0]]}
+SOURCE_SETTINGS = {
+    'default': {'imgsz': INFERENCE_IMGSZ, 'conf': 0.25, 'iou': 0.7, 'classes': None, 'rois': None},
+}
+
+# --- DATOS GENERADOS ---
+# Directorio base del historial de incidentes, los clips y el outbox de
+# alertas (por defecto 'data' junto al código, no el directorio de trabajo)
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
 
 # --- CONFIGURACIÓN DE TELEGRAM (SEGURA) ---
 # Usa variables de entorno en producción, valores por defecto en desarrollo
 BOT_TOKEN = os.environ.get('BOT_TOKEN', "8340677870:AAHd8P1VYF3-z730UeiwpvAe9cwVYmxfKng")
 CHAT_ID = os.environ.get('CHAT_ID', " -1002703976307")
 
-# Tiempo de espera entre notificaciones
+# URL base de la Bot API (None = api.telegram.org). Para pruebas locales:
+# TELEGRAM_API_URL=http://127.0.0.1:8081/bot con fake_bot_api.py
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL')
+
+# Tiempo de espera entre notificaciones (solo sin seguimiento de incidentes)
 NOTIFICATION_COOLDOWN_SECONDS = 30
 
+# --- CONFIRMACIÓN TEMPORAL (k de n) ---
+# Una violación cuenta solo si aparece en DEBOUNCE_MIN_HITS de los últimos
+# DEBOUNCE_WINDOW frames analizados y la suma de sus confianzas llega a
+# DEBOUNCE_MIN_SCORE. Permite bajar la confianza o el imgsz del modelo sin
+# disparar alertas por falsos positivos de un solo frame.
+DEBOUNCE_ENABLED = True
+DEBOUNCE_WINDOW = 5
+DEBOUNCE_MIN_HITS = 3
+DEBOUNCE_MIN_SCORE = 1.5
+
+# --- SEGUIMIENTO DE INCIDENTES ---
+# Cada persona sin casco se sigue entre frames y es un incidente: alerta una
+# vez al confirmarse y el enfriamiento es por persona, no global
+TRACKING_ENABLED = True
+TRACK_IOU_THRESHOLD = 0.3       # IoU mínimo para asociar una caja a un track
+TRACK_MAX_AGE_SECONDS = 2.0     # Segundos sin ver a la persona para cerrar el incidente
+TRACK_MIN_HITS = 2              # Detecciones necesarias para confirmar (y alertar)
+TRACK_REALERT_SECONDS = 300     # Re-alertar si la misma persona sigue en violación
+INCIDENT_DB_PATH = os.path.join(DATA_DIR, 'incidents.db')    # Historial de incidentes (SQLite)
+INCIDENT_SNAPSHOT_DIR = os.path.join(DATA_DIR, 'incidents')  # Mejor captura de cada incidente
+
+# --- CLIPS DE VIOLACIONES ---
+# Cada fuente guarda en memoria sus últimos frames JPEG; al iniciar un
+# incidente se escribe un MP4 con los segundos previos y posteriores
+CLIPS_ENABLED = True
+CLIP_DIR = os.path.join(DATA_DIR, 'clips')
+CLIP_PRE_SECONDS = 5            # Segundos antes del evento
+CLIP_POST_SECONDS = 5           # Segundos después del evento
+CLIP_BUFFER_MB = 32             # Memoria máxima del buffer previo por fuente
+CLIP_RETENTION_DAYS = 7         # Borrar clips más antiguos (0 = sin límite)
+CLIP_MAX_DIR_MB = 2048          # Tamaño máximo del directorio (0 = sin límite)
+CLIP_FOURCC = 'mp4v'            # Codec del MP4 ('avc1' si OpenCV tiene H.264)
+CLIP_MAX_FPS = 10               # Frames por segundo del buffer (0 = todos); sin
+                                # espectadores, los demás no se anotan ni codifican
+
+# Cola del trabajador de notificaciones
+NOTIFICATION_QUEUE_SIZE = 8
+NOTIFICATION_COALESCE = True           # Agrupar alertas pendientes del mismo chat
+NOTIFICATION_DROP_POLICY = 'drop_oldest'  # 'drop_oldest' o 'drop_new' con la cola llena
+NOTIFICATION_SEND_TIMEOUT = 20         # Segundos máximos por envío
+
+# Outbox en disco: las alertas se guardan antes de enviarse y sobreviven a
+# cortes de red y reinicios (None = solo en memoria)
+NOTIFICATION_OUTBOX_DIR = os.path.join(DATA_DIR, 'outbox')
+NOTIFICATION_OUTBOX_MAX_ENTRIES = 500    # Alertas pendientes máximas (se descartan las más viejas)
+NOTIFICATION_OUTBOX_MAX_MB = 100         # Tamaño máximo del outbox
+NOTIFICATION_OUTBOX_MAX_AGE_HOURS = 24   # Alertas más viejas ya no se envían
+NOTIFICATION_RETRY_BASE_SECONDS = 2      # Primera espera tras un fallo (se duplica)
+NOTIFICATION_RETRY_MAX_SECONDS = 300     # Espera máxima entre reintentos
+NOTIFICATION_BATCH_SIZE = 10             # Alertas atrasadas por mensaje al reconectar (máx. 10)
+
+# Imágenes de la alerta: vista completa (se reutiliza el JPEG del stream si
+# cumple los límites) + recortes de las personas sin casco en un media group
+ALERT_IMAGE_MAX_WIDTH = 960            # Ancho máximo de la vista completa
+ALERT_IMAGE_MAX_KB = 150               # Tamaño máximo de cada adjunto
+ALERT_IMAGE_QUALITY = 80               # Calidad JPEG inicial (baja si no entra)
+ALERT_CROPS = 2                        # Recortes por alerta (0 = solo la vista completa)
+ALERT_CROP_PADDING = 0.25              # Margen del recorte relativo a la caja
+ALERT_MEDIA_GROUP = True               # Enviar vista y recortes en un solo mensaje
+
 # --- CONFIGURACIÓN WEB ---
 WEB_VIDEO_RESIZE = True
 WEB_VIDEO_WIDTH = 640
 WEB_VIDEO_HEIGHT = 480
+# Si nadie pide frames durante este tiempo, se deja de dibujar las detecciones
+VIEWER_TIMEOUT_SECONDS = 5
+
+# --- CONFIGURACIÓN DEL PIPELINE ---
+# Tamaño de las colas entre etapas (captura, inferencia, anotación, codificación).
+# Con 1 siempre se procesa el frame más reciente y los antiguos se descartan.
+PIPELINE_QUEUE_SIZE = 1
+# Frames de video decodificados por adelantado en un hilo propio (0 = decodificar
+# en la etapa de captura). Los archivos se rebobinan sin cortes al terminar.
+CAPTURE_PREFETCH = 8
+# Sin espectadores, decodificar solo los frames que el detector va a analizar
+# (los demás se avanzan con grab() sin decodificar)
+SKIP_DECODE_WHEN_UNWATCHED = True
+
+# --- CONFIGURACIÓN MULTI-CÁMARA ---
+# Cámaras adicionales procesadas en batch: {'id': fuente}, donde la fuente es
+# un índice de webcam, una ruta de video o una URL RTSP.
+# Ejemplo: {'entrada': 'rtsp://192.168.1.10/stream', 'patio': 1}
+EXTRA_CAMERAS = {}
+# Máximo de frames por pasada batch de YOLO
+MAX_BATCH_SIZE = 16
+
+# --- LOGS ---
+# Eventos conservados en memoria para /api/logs (buffer circular)
+LOG_CAPACITY = 20000
+
+# --- EVENTOS (SERVER-SENT EVENTS) ---
+EVENTS_STATS_INTERVAL = 1.0     # Cada cuánto se revisan cambios de estado
+EVENTS_KEEPALIVE_SECONDS = 15   # Comentario de keepalive sin eventos
+EVENTS_QUEUE_SIZE = 256         # Eventos pendientes por cliente antes de descartar
+
+# --- DETECCIÓN ADAPTATIVA ---
+# Ejecuta YOLO cada N frames o cuando hay movimiento; entre medias se
+# reutilizan las últimas detecciones. N se ajusta para respetar el presupuesto.
+ADAPTIVE_DETECTION = True
+DETECTION_LATENCY_BUDGET_MS = 15   # Costo medio de inferencia por frame
+DETECTION_MIN_INTERVAL = 1
+DETECTION_MAX_INTERVAL = 10
+MOTION_THRESHOLD = 0.02            # Diferencia media de píxeles (0-1)
 
 # --- FUNCIONES HELPER ---
 def get_current_source():
@@ -0,0 +1,96 @@
+# detection_scheduler.py - Decide en qué frames ejecutar la inferencia YOLO
+import math
+
+import cv2
+
+
+class DetectionScheduler:
+    """
+    Ejecuta el detector cada N frames o cuando el movimiento de la escena supera
+    un umbral. Entre inferencias se reutilizan las últimas detecciones.
+
+    N se ajusta automáticamente para que el costo medio de inferencia por frame
+    se mantenga dentro del presupuesto de latencia configurado.
+    """
+    def __init__(self, latency_budget_ms=15, min_interval=1, max_interval=10,
+                 motion_threshold=0.02, motion_size=(64, 36)):
+        self.latency_budget = latency_budget_ms / 1000
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.motion_threshold = motion_threshold
+        self.motion_size = motion_size
+
+        self.interval = self.min_interval
+        self.frames_since_detection = 0
+        self.avg_latency = 0.0
+        self.last_results = None
+        self.last_violation = False
+        self.reference = None
+        self.last_motion = 0.0
+
+        # Estadísticas
+        self.frames_seen = 0
+        self.frames_detected = 0
+
+    def motion_score(self, frame):
+        """
+        Diferencia media (0-1) entre el frame y el último frame analizado,
+        calculada sobre una versión pequeña en escala de grises.
+        """
+        small = cv2.resize(frame, self.motion_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.reference is None:
+            return 1.0, gray
+        score = float(cv2.absdiff(gray, self.reference).mean()) / 255.0
+        return score, gray
+
+    def should_detect(self, frame, frames=1):
+        """
+        Retorna True si se debe ejecutar la inferencia sobre este frame.
+        `frames` es cuántos frames de la fuente representa (más de 1 si el
+        lector saltó frames sin decodificarlos).
+        """
+        self.frames_seen += frames
+        self.frames_since_detection += frames
+
+        score, gray = self.motion_score(frame)
+        self.last_motion = score
+
+        # Con una violación en escena se analiza al ritmo máximo
+        interval = self.min_interval if self.last_violation else self.interval
+
+        if (self.last_results is None
+                or self.frames_since_detection >= interval
+                or score >= self.motion_threshold):
+            self.reference = gray
+            self.frames_since_detection = 0
+            self.frames_detected += 1
+            return True
+        return False
+
+    def decode_stride(self):
+        """Cada cuántos frames hace falta decodificar si nadie mira el video"""
+        return self.min_interval if self.last_violation else self.interval
+
+    def record_inference(self, results, latency, violation=False):
+        """Guarda los resultados y ajusta N según la latencia observada"""
+        self.last_results = results
+        self.last_violation = violation
+
+        if self.avg_latency == 0:
+            self.avg_latency = latency
+        else:
+            self.avg_latency = 0.8 * self.avg_latency + 0.2 * latency
+
+        if self.latency_budget > 0:
+            interval = math.ceil(self.avg_latency / self.latency_budget)
+            self.interval = min(self.max_interval, max(self.min_interval, interval))
+
+    def get_stats(self):
+        ratio = self.frames_detected / self.frames_seen if self.frames_seen else 0.0
+        return {
+            'interval': self.interval,
+            'avg_inference_ms': round(self.avg_latency * 1000, 2),
+            'motion_score': round(self.last_motion, 4),
+            'detection_ratio': round(ratio, 3)
+        }
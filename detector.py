@@ -1,41 +1,769 @@
 # detector.py
-from ultralytics import YOLO
+import ast
+import importlib.util
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+def _to_numpy(values):
+    """Convierte un tensor (torch o numpy) a un array de numpy en CPU."""
+    if hasattr(values, 'cpu'):
+        values = values.cpu()
+    if hasattr(values, 'numpy'):
+        return values.numpy()
+    return np.asarray(values)
+
+
+class DetectionAnnotator:
+    """
+    Dibuja solo las cajas y etiquetas necesarias directamente sobre el frame,
+    con colores y tamaños de texto cacheados. Reemplaza a Results.plot().
+    """
+    # Paleta BGR para clases sin color asignado
+    PALETTE = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255),
+               (49, 210, 207), (10, 249, 72), (23, 204, 146), (134, 219, 61)]
+
+    def __init__(self, class_names, target_class_id=None, line_width=2, font_scale=0.5):
+        self.class_names = class_names
+        self.line_width = line_width
+        self.font_scale = font_scale
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self.font_thickness = max(line_width - 1, 1)
+
+        # Rojo para la clase en violación, paleta para el resto
+        self.colors = {}
+        for class_id in class_names:
+            if class_id == target_class_id:
+                self.colors[class_id] = (0, 0, 255)
+            else:
+                self.colors[class_id] = self.PALETTE[int(class_id) % len(self.PALETTE)]
+
+        # (clase, confianza redondeada) -> (texto, ancho, alto)
+        self._labels = {}
+
+    def _label(self, class_id, conf):
+        key = (class_id, int(conf * 100))
+        label = self._labels.get(key)
+        if label is None:
+            text = f"{self.class_names.get(class_id, class_id)} {key[1] / 100:.2f}"
+            (w, h), _ = cv2.getTextSize(text, self.font, self.font_scale, self.font_thickness)
+            label = self._labels[key] = (text, w, h)
+        return label
+
+    def draw(self, frame, xyxy, conf, cls):
+        """Dibuja las cajas sobre `frame` (in-place) y lo retorna."""
+        for (x1, y1, x2, y2), score, class_id in zip(xyxy.astype(np.int32), conf, cls.astype(np.int32)):
+            class_id = int(class_id)
+            color = self.colors.get(class_id, self.PALETTE[0])
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, self.line_width)
+
+            text, w, h = self._label(class_id, float(score))
+            # Etiqueta arriba de la caja, o adentro si no cabe
+            top = y1 - h - 4 if y1 - h - 4 >= 0 else y1
+            cv2.rectangle(frame, (int(x1), int(top)), (int(x1 + w + 2), int(top + h + 4)), color, -1)
+            cv2.putText(frame, text, (int(x1 + 1), int(top + h + 1)), self.font, self.font_scale,
+                        (255, 255, 255), self.font_thickness, cv2.LINE_AA)
+        return frame
+
+
+class Boxes:
+    """Cajas detectadas como arrays de numpy (mismos atributos que ultralytics)."""
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.cls)
+
+
+class Detections:
+    """Resultado de un frame para backends exportados (subconjunto de Results)."""
+    def __init__(self, orig_img, xyxy, conf, cls):
+        self.orig_img = orig_img
+        self.boxes = Boxes(xyxy, conf, cls)
+
+
+def letterbox_geometry(shape, imgsz):
+    """
+    Calcula la geometría del letterbox para una resolución de entrada.
+    Retorna (ratio, (ancho, alto) redimensionado, (pad_izq, pad_arriba)).
+    """
+    height, width = shape[:2]
+    ratio = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    left = (imgsz - new_w) // 2
+    top = (imgsz - new_h) // 2
+    return ratio, (new_w, new_h), (left, top)
+
+
+class InferenceSettings:
+    """
+    Ajustes de inferencia de una fuente: tamaño de entrada, umbrales, clases a
+    conservar y regiones de interés (ROI). Las ROI se expresan como rectángulos
+    normalizados [x1, y1, x2, y2] en 0-1 y se convierten a píxeles una sola vez
+    por resolución de la fuente.
+    """
+    def __init__(self, imgsz=None, conf=None, iou=None, classes=None, rois=None):
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.classes = classes
+        self.rois = rois or []
+        self._roi_rects = {}
+        self._class_ids = None
+
+    @classmethod
+    def from_dict(cls, values):
+        values = values or {}
+        return cls(
+            imgsz=values.get('imgsz'),
+            conf=values.get('conf'),
+            iou=values.get('iou'),
+            classes=values.get('classes'),
+            rois=values.get('rois')
+        )
+
+    def to_dict(self):
+        return {'imgsz': self.imgsz, 'conf': self.conf, 'iou': self.iou,
+                'classes': self.classes, 'rois': self.rois}
+
+    def roi_rects(self, shape):
+        """ROI en píxeles para una resolución (cacheadas)."""
+        key = shape[:2]
+        rects = self._roi_rects.get(key)
+        if rects is None:
+            height, width = key
+            rects = []
+            for x1, y1, x2, y2 in self.rois:
+                left, top = int(x1 * width), int(y1 * height)
+                right, bottom = int(round(x2 * width)), int(round(y2 * height))
+                if right - left > 1 and bottom - top > 1:
+                    rects.append((left, top, right, bottom))
+            self._roi_rects[key] = rects
+        return rects
+
+    def predict_kwargs(self, class_ids):
+        """Argumentos para backend.predict (las clases se resuelven a ids una vez)."""
+        if self._class_ids is None and self.classes is not None:
+            self._class_ids = [class_ids[name] for name in self.classes if name in class_ids]
+        return {'imgsz': self.imgsz, 'conf': self.conf, 'iou': self.iou, 'classes': self._class_ids}
+
+
+def box_iou(a, b):
+    """Matriz IoU entre dos conjuntos de cajas xyxy"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def nms(xyxy, conf, cls, iou):
+    """NMS por clase sobre cajas xyxy; retorna los índices conservados."""
+    if len(conf) == 0:
+        return np.empty(0, dtype=np.int64)
+    xywh = xyxy.copy()
+    xywh[:, 2:] -= xywh[:, :2]
+    indices = cv2.dnn.NMSBoxesBatched(xywh.tolist(), conf.tolist(), cls.astype(np.int32).tolist(), 0.0, iou)
+    return np.asarray(indices, dtype=np.int64).reshape(-1)
+
+
+class UltralyticsBackend:
+    """Backend PyTorch a través de ultralytics.YOLO (comportamiento original)."""
+    name = 'pytorch'
+    # El predictor de ultralytics no admite llamadas concurrentes
+    thread_safe = False
+
+    def __init__(self, model_path, **kwargs):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.class_names = self.model.names
+
+    def predict(self, frames, imgsz=None, conf=None, iou=None, classes=None):
+        kwargs = {'imgsz': imgsz, 'conf': conf, 'iou': iou, 'classes': classes}
+        kwargs = {key: value for key, value in kwargs.items() if value is not None}
+        return list(self.model(list(frames), verbose=False, **kwargs))
+
+
+class ExportedBackend:
+    """
+    Base para backends exportados (ONNX / OpenVINO) con su propio
+    pre-procesamiento (letterbox) y post-procesamiento (NMS).
+    """
+    name = None
+    thread_safe = False
+
+    def __init__(self, model_path, imgsz=640, conf=0.25, iou=0.7, max_det=300):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.class_names = {}
+        self.dynamic_batch = False
+        # Si el modelo tiene tamaño de entrada fijo, se ignora imgsz por llamada
+        self.dynamic_imgsz = True
+
+        # Geometría del letterbox cacheada por (resolución de entrada, imgsz)
+        self._geometry = {}
+        self._canvas = {}
+
+    def geometry(self, shape, imgsz=None):
+        imgsz = imgsz or self.imgsz
+        key = (shape[0], shape[1], imgsz)
+        geometry = self._geometry.get(key)
+        if geometry is None:
+            geometry = self._geometry[key] = letterbox_geometry(shape, imgsz)
+        return geometry
+
+    def canvas(self, imgsz):
+        canvas = self._canvas.get(imgsz)
+        if canvas is None:
+            canvas = self._canvas[imgsz] = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+        return canvas
+
+    def preprocess(self, frames, imgsz=None):
+        """Letterbox + BGR→RGB + NCHW float32 normalizado."""
+        imgsz = imgsz or self.imgsz
+        canvases = []
+        for frame in frames:
+            _, (new_w, new_h), (left, top) = self.geometry(frame.shape, imgsz)
+            canvas = self.canvas(imgsz).copy()
+            canvas[top:top + new_h, left:left + new_w] = cv2.resize(
+                frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+            canvases.append(canvas)
+        return cv2.dnn.blobFromImages(canvases, 1 / 255.0, swapRB=True)
+
+    def postprocess(self, output, frames, imgsz=None, conf=None, iou=None, classes=None):
+        """Filtra por confianza y clase, aplica NMS por clase y reescala al frame original."""
+        conf_threshold = self.conf if conf is None else conf
+        iou_threshold = self.iou if iou is None else iou
+        results = []
+        for prediction, frame in zip(output, frames):
+            prediction = prediction.T  # (N, 4 + clases)
+            scores = prediction[:, 4:]
+            cls = scores.argmax(1)
+            scores = scores[np.arange(len(cls)), cls]
+
+            keep = scores >= conf_threshold
+            if classes is not None:
+                keep &= np.isin(cls, classes)
+            boxes, scores, cls = prediction[keep, :4], scores[keep], cls[keep]
+
+            # xywh centrado → xyxy en la imagen del letterbox
+            xyxy = np.empty_like(boxes)
+            xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+            xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+            indices = nms(xyxy, scores, cls, iou_threshold)[:self.max_det]
+            xyxy = xyxy[indices]
+
+            ratio, _, (left, top) = self.geometry(frame.shape, imgsz)
+            xyxy -= (left, top, left, top)
+            xyxy /= ratio
+            height, width = frame.shape[:2]
+            np.clip(xyxy[:, 0::2], 0, width, out=xyxy[:, 0::2])
+            np.clip(xyxy[:, 1::2], 0, height, out=xyxy[:, 1::2])
+
+            results.append(Detections(frame, xyxy.astype(np.float32), scores[indices].astype(np.float32),
+                                      cls[indices].astype(np.float32)))
+        return results
+
+    def infer(self, blob):
+        raise NotImplementedError
+
+    def predict(self, frames, imgsz=None, conf=None, iou=None, classes=None):
+        frames = list(frames)
+        if not self.dynamic_imgsz:
+            imgsz = None
+        if self.dynamic_batch or len(frames) == 1:
+            output = self.infer(self.preprocess(frames, imgsz))
+        else:
+            output = np.concatenate([self.infer(self.preprocess([f], imgsz)) for f in frames])
+        return self.postprocess(output, frames, imgsz, conf, iou, classes)
+
+
+class OnnxBackend(ExportedBackend):
+    """Backend ONNX Runtime (CPU)."""
+    name = 'onnx'
+    # InferenceSession.run admite llamadas concurrentes
+    thread_safe = True
+
+    def __init__(self, model_path, threads=0, mmap_weights=False, **kwargs):
+        super().__init__(model_path, **kwargs)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+
+        # Pesos desde un archivo mapeado en memoria: varios procesos comparten
+        # las mismas páginas del page cache en lugar de tener una copia cada uno
+        self._weights = None
+        if mmap_weights:
+            self._weights, initializers = load_mmap_initializers(model_path)
+            for name, value in initializers.items():
+                options.add_initializer(name, value)
+            # El pre-empaquetado copiaría los pesos a memoria privada
+            options.add_session_config_entry('session.disable_prepacking', '1')
+
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        self.dynamic_imgsz = not isinstance(model_input.shape[2], int)
+        if not self.dynamic_imgsz:
+            self.imgsz = model_input.shape[2]
+
+        # ultralytics guarda los nombres de clase en los metadatos del modelo
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if 'names' in metadata:
+            self.class_names = ast.literal_eval(metadata['names'])
+
+    def infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    """Backend OpenVINO (CPU)."""
+    name = 'openvino'
+
+    def __init__(self, model_path, threads=0, mmap_weights=True, **kwargs):
+        super().__init__(model_path, **kwargs)
+        from openvino.runtime import Core
+
+        core = Core()
+        # OpenVINO puede leer el .bin de pesos mapeado en memoria (compartido entre procesos)
+        core.set_property({'ENABLE_MMAP': bool(mmap_weights)})
+        model = core.read_model(model_path)
+        input_shape = model.inputs[0].get_partial_shape()
+        self.dynamic_batch = input_shape[0].is_dynamic
+        self.dynamic_imgsz = input_shape[2].is_dynamic
+        if not self.dynamic_imgsz:
+            self.imgsz = input_shape[2].get_length()
+        properties = {'INFERENCE_NUM_THREADS': threads} if threads else {}
+        self.compiled = core.compile_model(model, 'CPU', properties)
+        self.output = self.compiled.outputs[0]
+
+        # El export de ultralytics deja metadata.yaml junto al .xml
+        metadata_path = os.path.join(os.path.dirname(model_path), 'metadata.yaml')
+        if os.path.exists(metadata_path):
+            import yaml
+            with open(metadata_path, 'r', encoding='utf-8') as file:
+                self.class_names = yaml.safe_load(file).get('names', {})
+
+    def infer(self, blob):
+        return self.compiled(blob)[self.output]
+
+
+def weights_file_paths(onnx_path):
+    """Rutas del archivo plano de pesos y su índice para un modelo ONNX."""
+    return onnx_path + '.weights', onnx_path + '.weights.json'
+
+
+def export_weights_file(onnx_path, alignment=4096):
+    """
+    Escribe los initializers del modelo ONNX en un archivo plano (alineado a
+    página) más un índice JSON, para poder mapearlo en memoria.
+    """
+    import onnx
+    from onnx import numpy_helper
+
+    weights_path, index_path = weights_file_paths(onnx_path)
+    model = onnx.load(onnx_path)
+    index = {}
+    offset = 0
+    with open(weights_path, 'wb') as file:
+        for tensor in model.graph.initializer:
+            array = np.ascontiguousarray(numpy_helper.to_array(tensor))
+            padding = (-offset) % alignment
+            file.write(b'\0' * padding)
+            offset += padding
+            file.write(array.tobytes())
+            index[tensor.name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+            offset += array.nbytes
+
+    with open(index_path, 'w', encoding='utf-8') as file:
+        json.dump(index, file)
+    return weights_path
+
+
+def load_mmap_initializers(onnx_path):
+    """
+    Mapea en memoria el archivo de pesos (creándolo si no existe o está
+    desactualizado) y retorna (memmap, {nombre: OrtValue}) sin copiar datos.
+    """
+    from onnxruntime import OrtValue
+
+    weights_path, index_path = weights_file_paths(onnx_path)
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(onnx_path):
+        export_weights_file(onnx_path)
+
+    with open(index_path, 'r', encoding='utf-8') as file:
+        index = json.load(file)
+
+    # Copy-on-write: las páginas se comparten mientras nadie las escriba
+    weights = np.memmap(weights_path, dtype=np.uint8, mode='c')
+    initializers = {}
+    for name, info in index.items():
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape'])) if info['shape'] else 1
+        array = np.frombuffer(weights, dtype=dtype, count=count, offset=info['offset']).reshape(info['shape'])
+        initializers[name] = OrtValue.ortvalue_from_numpy(array)
+    return weights, initializers
+
+
+class ModelRegistry:
+    """
+    Registro de modelos del proceso: cada combinación (ruta, backend, imgsz,
+    opciones del backend) se carga una sola vez y todos los detectores
+    comparten la misma instancia. Se cuenta cuántos detectores la usan y se
+    descarta al liberarla el último. El backend pytorch acepta cualquier
+    tamaño de entrada y no usa opciones, así que se comparte por ruta.
+    """
+    _backends = {}
+    _users = {}
+    _loading = {}  # clave -> Lock de carga (cargas de modelos distintos no se bloquean)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_path, backend, imgsz, kwargs):
+        if backend == 'pytorch':
+            return (os.path.abspath(model_path), backend)
+        return (os.path.abspath(model_path), backend, imgsz, tuple(sorted(kwargs.items())))
+
+    @classmethod
+    def get(cls, model_path, backend='pytorch', imgsz=640, warmup=False, **kwargs):
+        """Retorna el backend compartido, cargándolo (y calentándolo) la primera vez"""
+        backend = resolve_backend(backend)
+        key = cls._key(model_path, backend, imgsz, kwargs)
+
+        with cls._lock:
+            load_lock = cls._loading.setdefault(key, threading.Lock())
+
+        # El lock global solo protege los diccionarios; la carga, exportación
+        # y calentamiento se serializan por clave
+        with load_lock:
+            with cls._lock:
+                instance = cls._backends.get(key)
+            if instance is None:
+                start = time.perf_counter()
+                instance = create_backend(model_path, backend, imgsz=imgsz, **kwargs)
+                instance.lock = threading.Lock()
+                if warmup:
+                    warmup_backend(instance, imgsz)
+                print(f"INFO: Modelo '{model_path}' ({backend}) registrado en "
+                      f"{time.perf_counter() - start:.2f} s")
+            with cls._lock:
+                cls._backends[key] = instance
+                cls._users[key] = cls._users.get(key, 0) + 1
+            return instance
+
+    @classmethod
+    def release(cls, instance):
+        """Descuenta un usuario del backend; con el último se quita del registro"""
+        with cls._lock:
+            for key, registered in cls._backends.items():
+                if registered is instance:
+                    cls._users[key] -= 1
+                    if cls._users[key] <= 0:
+                        del cls._backends[key]
+                        del cls._users[key]
+                    return
+
+    @classmethod
+    def preload(cls, model_path, backend='pytorch', imgsz=640, **kwargs):
+        """
+        Carga y calienta un modelo en el proceso actual antes de crear
+        detectores. Los procesos hijos solo heredan esa copia con el método de
+        inicio 'fork'; con 'spawn' (el predeterminado de ProcessPoolDetector)
+        cada trabajador carga la suya, y para compartir las páginas de pesos
+        entre ellos se usa mmap_weights=True.
+        """
+        return cls.get(model_path, backend, imgsz, warmup=True, **kwargs)
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            return {f"{os.path.basename(path)}:{backend}:{imgsz}"
+                    + ''.join(f":{name}={value}" for name, value in options): users
+                    for (path, backend, imgsz, options), users in cls._users.items()}
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._backends.clear()
+            cls._users.clear()
+            cls._loading.clear()
+
+
+def warmup_backend(backend, imgsz=640):
+    """
+    Ejecuta una inferencia con un frame vacío para que la inicialización
+    diferida (grafo, asignación de memoria) no la pague el primer frame real.
+    """
+    backend.predict([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)])
+
+
+BACKENDS = {
+    'pytorch': UltralyticsBackend,
+    'onnx': OnnxBackend,
+    'openvino': OpenVinoBackend,
+}
+
+
+def exported_model_path(model_path, backend):
+    """Ruta donde ultralytics deja el modelo exportado para un backend."""
+    base, _ = os.path.splitext(model_path)
+    if backend == 'onnx':
+        return base + '.onnx'
+    if backend == 'openvino':
+        return os.path.join(base + '_openvino_model', os.path.basename(base) + '.xml')
+    return model_path
+
+
+def quantized_model_path(model_path, precision):
+    """Ruta de la variante cuantizada (ONNX) de un modelo: best_int8.onnx, best_fp16.onnx."""
+    base, _ = os.path.splitext(model_path)
+    return f"{base}_{precision}.onnx"
+
+
+def export_model(model_path, backend, imgsz=640):
+    """
+    Exporta un modelo .pt al formato del backend (ONNX u OpenVINO) y
+    retorna la ruta del modelo exportado.
+    """
+    from ultralytics import YOLO
+    print(f"INFO: Exportando '{model_path}' a {backend}...")
+    YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=(backend == 'onnx'))
+    return exported_model_path(model_path, backend)
+
+
+def resolve_backend(backend):
+    """Resuelve 'auto' al backend más rápido instalado."""
+    if backend != 'auto':
+        return backend
+    if importlib.util.find_spec('openvino') is not None:
+        return 'openvino'
+    if importlib.util.find_spec('onnxruntime') is not None:
+        return 'onnx'
+    return 'pytorch'
+
+
+def create_backend(model_path, backend='pytorch', imgsz=640, export=True, **kwargs):
+    """
+    Crea el backend de inferencia. Si el modelo es un .pt y el backend es
+    exportado, usa el archivo exportado (exportándolo primero si no existe).
+    """
+    backend = resolve_backend(backend)
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de inferencia desconocido: {backend}")
+
+    if backend == 'pytorch':
+        return UltralyticsBackend(model_path)
+
+    path = model_path
+    if model_path.endswith('.pt'):
+        path = exported_model_path(model_path, backend)
+        if not os.path.exists(path):
+            if not export:
+                raise FileNotFoundError(f"No existe el modelo exportado: {path}")
+            path = export_model(model_path, backend, imgsz=imgsz)
+    return BACKENDS[backend](path, imgsz=imgsz, **kwargs)
+
 
 class HelmetDetector:
     """
     Clase para manejar el modelo YOLO de detección de objetos.
     """
-    def __init__(self, model_path):
+    def __init__(self, model_path, target_class='head', conf_threshold=0.25, backend='pytorch', imgsz=640,
+                 precision='fp32', warmup=False, mmap_weights=False):
         """
-        Inicializa y carga el modelo YOLO.
+        Inicializa y carga el modelo YOLO con el backend indicado
+        ('pytorch', 'onnx', 'openvino' o 'auto').
+        Con precision 'fp16' o 'int8' se carga la variante cuantizada generada
+        por quantize_model.py (siempre a través de ONNX Runtime).
+        El modelo se obtiene del ModelRegistry, así que varios detectores con la
+        misma ruta comparten una sola copia cargada.
+        El nombre de la clase objetivo se resuelve una sola vez a su id numérico.
         """
         try:
-            self.model = YOLO(model_path)
-            self.class_names = self.model.names
-            print(f"INFO: Modelo '{model_path}' cargado. Clases: {self.class_names}")
+            if precision != 'fp32':
+                model_path = quantized_model_path(model_path, precision)
+                if not os.path.exists(model_path):
+                    raise FileNotFoundError(f"No existe la variante cuantizada: {model_path} "
+                                            f"(generarla con quantize_model.py)")
+                backend = 'onnx'
+            kwargs = {'mmap_weights': mmap_weights} if resolve_backend(backend) != 'pytorch' else {}
+            self.backend = ModelRegistry.get(model_path, backend, imgsz=imgsz, warmup=warmup, **kwargs)
+            self.class_names = self.backend.class_names
+            print(f"INFO: Modelo '{model_path}' cargado con backend '{self.backend.name}'. "
+                  f"Clases: {self.class_names}")
         except Exception as e:
             print(f"ERROR: No se pudo cargar el modelo YOLO desde '{model_path}': {e}")
             raise  # Detiene la ejecución si el modelo no carga
 
-    def detect_on_frame(self, frame):
+        self._init_classes(target_class, conf_threshold)
+
+    def _init_classes(self, target_class, conf_threshold):
+        """Resuelve la clase objetivo a su id y prepara el anotador"""
+        self.class_ids = {name: int(class_id) for class_id, name in self.class_names.items()}
+        self.conf_threshold = conf_threshold
+        self.target_class_id = self.class_ids.get(target_class)
+        if self.target_class_id is None:
+            print(f"WARN: La clase objetivo '{target_class}' no existe en el modelo.")
+
+        self.annotator = DetectionAnnotator(self.class_names, self.target_class_id)
+
+    def close(self):
+        """Libera el modelo en el ModelRegistry (se descarta si ningún otro detector lo usa)"""
+        backend, self.backend = self.backend, None
+        if backend is not None:
+            ModelRegistry.release(backend)
+
+    def detect_on_frame(self, frame, settings=None):
         """
         Realiza la detección de objetos en un solo frame.
+        `settings` (InferenceSettings) permite ajustar tamaño, umbrales, clases y ROI.
+        """
+        return self._predict([frame], settings)
+
+    def detect_batch(self, frames, settings=None):
+        """
+        Realiza la detección sobre varios frames en una sola pasada del modelo.
+        `settings` puede ser un InferenceSettings común o una lista con uno por
+        frame; los frames con los mismos ajustes se procesan juntos.
+        Retorna una lista con los resultados de cada frame, en el mismo orden,
+        con el mismo formato que detect_on_frame.
         """
-        return self.model(frame)
+        if not frames:
+            return []
+        if not isinstance(settings, (list, tuple)):
+            return [[r] for r in self._predict(frames, settings)]
 
-    def find_violation(self, results, target_class):
+        # Agrupar por ajustes para hacer una pasada por grupo
+        groups = {}
+        for index, frame_settings in enumerate(settings):
+            groups.setdefault(id(frame_settings), (frame_settings, []))[1].append(index)
+
+        results = [None] * len(frames)
+        for frame_settings, indices in groups.values():
+            for index, result in zip(indices, self._predict([frames[i] for i in indices], frame_settings)):
+                results[index] = [result]
+        return results
+
+    def _backend_predict(self, frames, **kwargs):
+        """Llama al backend compartido, serializando si no admite concurrencia"""
+        if self.backend.thread_safe:
+            return self.backend.predict(frames, **kwargs)
+        with self.backend.lock:
+            return self.backend.predict(frames, **kwargs)
+
+    def _predict(self, frames, settings):
+        """Ejecuta el backend; con ROI solo los recortes pasan por el modelo."""
+        if settings is None:
+            return self._backend_predict(frames)
+
+        kwargs = settings.predict_kwargs(self.class_ids)
+        if not settings.rois:
+            return self._backend_predict(frames, **kwargs)
+
+        crops, owners = [], []
+        for index, frame in enumerate(frames):
+            for left, top, right, bottom in settings.roi_rects(frame.shape):
+                crops.append(frame[top:bottom, left:right])
+                owners.append((index, left, top))
+
+        merged = [([], [], []) for _ in frames]
+        if crops:
+            for (index, left, top), result in zip(owners, self._backend_predict(crops, **kwargs)):
+                xyxy, conf, cls = self.boxes_arrays([result])
+                merged[index][0].append(xyxy + (left, top, left, top))
+                merged[index][1].append(conf)
+                merged[index][2].append(cls)
+
+        results = []
+        for frame, (xyxy, conf, cls) in zip(frames, merged):
+            if xyxy:
+                xyxy, conf, cls = np.concatenate(xyxy), np.concatenate(conf), np.concatenate(cls)
+                # ROI superpuestas pueden detectar la misma caja dos veces
+                if len(xyxy) > 1 and len(settings.rois) > 1:
+                    keep = nms(xyxy, conf, cls, settings.iou or 0.7)
+                    xyxy, conf, cls = xyxy[keep], conf[keep], cls[keep]
+            else:
+                xyxy = np.empty((0, 4), dtype=np.float32)
+                conf = cls = np.empty(0, dtype=np.float32)
+            results.append(Detections(frame, xyxy.astype(np.float32), conf, cls))
+        return results
+
+    def find_violation(self, results, target_class=None):
         """
         Revisa los resultados de la detección para encontrar la clase objetivo (violación).
         """
+        return self.find_violations(results, target_class)['count'] > 0
+
+    def find_violations(self, results, target_class=None, conf_threshold=None):
+        """
+        Busca las cajas de la clase objetivo con una sola operación vectorizada
+        sobre boxes.cls / boxes.conf.
+        Retorna un dict con 'count', 'max_conf' e 'indices' de las cajas en violación.
+        """
+        class_id = self.target_class_id if target_class is None else self.class_ids.get(target_class)
+        threshold = self.conf_threshold if conf_threshold is None else conf_threshold
+
+        _, conf, cls = self.boxes_arrays(results)
+        if class_id is None or len(cls) == 0:
+            return {'count': 0, 'max_conf': 0.0, 'indices': np.empty(0, dtype=np.int64)}
+
+        indices = np.flatnonzero((cls == class_id) & (conf >= threshold))
+        return {
+            'count': int(len(indices)),
+            'max_conf': float(conf[indices].max()) if len(indices) else 0.0,
+            'indices': indices
+        }
+
+    def boxes_arrays(self, results):
+        """
+        Extrae (xyxy, conf, cls) como arrays de numpy de todos los resultados.
+        """
+        xyxy, conf, cls = [], [], []
         for r in results:
-            for box in r.boxes:
-                class_name = self.class_names[int(box.cls[0])]
-                if class_name == target_class:
-                    return True
-        return False
+            if r.boxes is None or len(r.boxes) == 0:
+                continue
+            xyxy.append(_to_numpy(r.boxes.xyxy))
+            conf.append(_to_numpy(r.boxes.conf))
+            cls.append(_to_numpy(r.boxes.cls))
 
-    def draw_detections(self, results):
+        if not cls:
+            return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+        if len(cls) == 1:
+            return xyxy[0], conf[0], cls[0]
+        return np.concatenate(xyxy), np.concatenate(conf), np.concatenate(cls)
+
+    def draw_detections(self, results, frame=None, out=None):
         """
         Dibuja los cuadros de detección en el frame.
+        Si se pasa `frame`, las detecciones se dibujan sobre él en lugar de sobre
+        la imagen original (útil para reutilizar detecciones de frames previos).
+        Si se pasa `out` (un buffer reutilizable con la misma forma), el frame se
+        copia ahí antes de dibujar; si no, se dibuja sobre una copia nueva. El
+        frame de entrada nunca se modifica (para dibujar sobre él, pasar out=frame).
         """
-        return results[0].plot()
\ No newline at end of file
+        image = results[0].orig_img if frame is None else frame
+        if out is None:
+            image = image.copy()
+        elif out is not image:
+            np.copyto(out, image)
+            image = out
+
+        xyxy, conf, cls = self.boxes_arrays(results)
+        return self.annotator.draw(image, xyxy, conf, cls)
\ No newline at end of file
@@ -0,0 +1,63 @@
+# event_hub.py - Publicación/suscripción de eventos para clientes Server-Sent Events
+import itertools
+import json
+import threading
+
+from pipeline import LatestQueue
+
+
+class EventHub:
+    """
+    Reparte eventos (estado, violaciones, logs) a todos los clientes SSE.
+    Cada evento se serializa una sola vez y se encola en la cola acotada de
+    cada suscriptor; un cliente lento pierde sus eventos más antiguos en lugar
+    de frenar a los demás.
+    """
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self):
+        """Registra un cliente; retorna la cola de la que debe leer"""
+        subscriber = LatestQueue(self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    @staticmethod
+    def format(event, data, event_id=None):
+        """Mensaje SSE listo para enviar"""
+        message = f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        if event_id is not None:
+            message = f"id: {event_id}\n" + message
+        return message
+
+    def publish(self, event, data):
+        """Envía el evento a todos los suscriptores (no bloquea)"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        if not subscribers:
+            return
+        message = self.format(event, data, next(self.ids))
+        for subscriber in subscribers:
+            subscriber.put(message)
+        self.published += 1
+
+    def get_stats(self):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        return {
+            'subscribers': len(subscribers),
+            'published': self.published,
+            'dropped': sum(s.dropped for s in subscribers)
+        }
@@ -0,0 +1,135 @@
+# fake_bot_api.py - Servidor local que imita la Bot API de Telegram para pruebas
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeBotAPI:
+    """
+    Imita los métodos de la Bot API que usa TelegramNotifier (getMe, sendPhoto,
+    sendMediaGroup, sendVideo, sendMessage). Permite simular latencia, fallos
+    aleatorios y caídas completas para probar el notificador sin red.
+    """
+    def __init__(self, host='127.0.0.1', port=8081, latency=0.0, fail_rate=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.down = False
+        self.lock = threading.Lock()
+        self.message_id = 0
+        self.requests = {}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        """Inicia el servidor en un hilo de fondo"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, method):
+        with self.lock:
+            return self.requests.get(method, 0)
+
+    def _message(self, chat_id):
+        with self.lock:
+            self.message_id += 1
+            message_id = self.message_id
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id) if str(chat_id).lstrip('-').isdigit() else 0, 'type': 'group'}
+        }
+
+    def handle(self, method, chat_id):
+        """Retorna (status HTTP, cuerpo JSON) para una llamada a la API"""
+        if self.latency:
+            time.sleep(self.latency)
+        if self.down:
+            return 502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'}
+        if method != 'getMe' and random.random() < self.fail_rate:
+            return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+
+        with self.lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        elif method == 'sendMediaGroup':
+            result = [self._message(chat_id)]
+        else:
+            result = self._message(chat_id)
+        return 200, {'ok': True, 'result': result}
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                chat_id = _extract_chat_id(body)
+                status, payload = api.handle(method, chat_id)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _extract_chat_id(body):
+    """Busca chat_id en un cuerpo JSON o multipart sin parsearlo completo"""
+    marker = b'name="chat_id"'
+    index = body.find(marker)
+    if index >= 0:
+        value = body[index + len(marker):].lstrip(b'\r\n').split(b'\r\n', 1)[0]
+        return value.decode(errors='ignore').strip()
+    try:
+        return str(json.loads(body or b'{}').get('chat_id', 0))
+    except ValueError:
+        values = parse_qs(body.decode(errors='ignore'))
+        return values.get('chat_id', ['0'])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot API de Telegram falsa para pruebas locales")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="Segundos de demora por respuesta")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Fracción de envíos que fallan (0-1)")
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.host, args.port, args.latency, args.fail_rate)
+    print(f"INFO: Bot API falsa escuchando en {api.base_url}  (TELEGRAM_API_URL={api.base_url})")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"INFO: Peticiones recibidas: {api.requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# frame_store.py - Almacén compartido del último frame procesado
+import base64
+import threading
+
+import numpy as np
+
+
+class FrameStore:
+    """
+    Guarda el último frame anotado como ndarray y como bytes JPEG, junto con un
+    número de secuencia. Cada consumidor toma la representación que necesita
+    sin volver a codificar ni decodificar.
+
+    Los arrays se guardan en un anillo de buffers preasignados que se reutilizan
+    entre frames, por lo que el loop de video no asigna memoria nueva en cada
+    publicación. Los buffers se entregan en orden circular y un buffer
+    entregado no se vuelve a entregar hasta que se publica y otro lo
+    reemplaza (o hasta que se publica uno entregado después, lo que indica que
+    su frame se descartó en el camino). Así varias etapas en hilos distintos
+    pueden tener frames en vuelo sin pisarse.
+    """
+    def __init__(self, num_buffers=4, max_buffers=16):
+        self.num_buffers = max(2, num_buffers)
+        self.max_buffers = max(self.num_buffers, max_buffers)
+        self._buffers = []
+        self._published_index = -1
+        self._in_flight = {}  # índice -> orden de entrega de los buffers sin publicar
+        self._acquire_count = 0
+        self._cursor = 0
+        self._cond = threading.Condition()
+
+        self.seq = 0
+        self.jpeg = None
+        self.violation = False
+        self._base64 = None
+        self._base64_seq = -1
+
+    def acquire(self, shape, dtype=np.uint8):
+        """
+        Retorna un buffer libre con la forma indicada para escribir el siguiente
+        frame. Nunca retorna el buffer publicado actualmente ni uno entregado
+        que todavía no se publicó.
+        """
+        with self._cond:
+            if not self._buffers or self._buffers[0].shape != tuple(shape) or self._buffers[0].dtype != dtype:
+                # Cambio de resolución: se reasigna el anillo completo
+                self._buffers = [np.empty(shape, dtype=dtype) for _ in range(self.num_buffers)]
+                self._published_index = -1
+                self._in_flight.clear()
+                self._cursor = 0
+
+            count = len(self._buffers)
+            index = next((i % count for i in range(self._cursor, self._cursor + count)
+                          if i % count != self._published_index and i % count not in self._in_flight), None)
+            if index is None:
+                if count < self.max_buffers:
+                    # Más frames en vuelo que buffers: el anillo crece
+                    self._buffers.append(np.empty(shape, dtype=dtype))
+                    index = count
+                else:
+                    # Límite alcanzado: se recicla el entregado hace más tiempo
+                    index = min(self._in_flight, key=self._in_flight.get)
+
+            self._cursor = index + 1
+            self._acquire_count += 1
+            self._in_flight[index] = self._acquire_count
+            return self._buffers[index]
+
+    def publish(self, frame, jpeg, violation=False):
+        """
+        Publica un nuevo frame. Si `frame` no es un buffer obtenido con acquire()
+        se copia en uno. Retorna el número de secuencia asignado.
+        """
+        if frame is not None and not self._owns(frame):
+            target = self.acquire(frame.shape, frame.dtype)
+            np.copyto(target, frame)
+            frame = target
+
+        with self._cond:
+            if frame is not None:
+                index = self._index_of(frame)
+                order = self._in_flight.pop(index, None)
+                if order is not None:
+                    # Los entregados antes que este y no publicados se descartaron
+                    for stale in [i for i, o in self._in_flight.items() if o < order]:
+                        del self._in_flight[stale]
+                self._published_index = index
+            self.jpeg = jpeg
+            self.violation = violation
+            self.seq += 1
+            self._cond.notify_all()
+            return self.seq
+
+    def _owns(self, frame):
+        with self._cond:
+            return self._index_of(frame) >= 0
+
+    def _index_of(self, frame):
+        for i, buffer in enumerate(self._buffers):
+            if buffer is frame:
+                return i
+        return -1
+
+    def get_frame(self, copy=True):
+        """
+        Retorna (seq, frame, violation). Con copy=False se retorna el buffer
+        compartido, válido solo hasta que se publiquen otros frames.
+        """
+        with self._cond:
+            if self._published_index < 0:
+                return self.seq, None, self.violation
+            frame = self._buffers[self._published_index]
+            if copy:
+                frame = frame.copy()
+            return self.seq, frame, self.violation
+
+    def get_jpeg(self):
+        """Retorna (seq, jpeg, violation)."""
+        with self._cond:
+            return self.seq, self.jpeg, self.violation
+
+    def get_base64(self):
+        """Retorna el JPEG actual en base64, generado una sola vez por frame."""
+        with self._cond:
+            if self.jpeg is None:
+                return None
+            if self._base64_seq != self.seq:
+                self._base64 = base64.b64encode(self.jpeg).decode('utf-8')
+                self._base64_seq = self.seq
+            return self._base64
+
+    def wait_for_frame(self, last_seq, timeout=1.0):
+        """Espera un frame más nuevo que last_seq y retorna (seq, jpeg)."""
+        with self._cond:
+            if self.seq == last_seq:
+                self._cond.wait(timeout)
+            if self.seq == last_seq:
+                return last_seq, None
+            return self.seq, self.jpeg
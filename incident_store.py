@@ -0,0 +1,189 @@
+# incident_store.py - Historial de incidentes (eventos de violación) en SQLite
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import cv2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id          INTEGER PRIMARY KEY,
+    source      TEXT    NOT NULL,
+    start_time  REAL    NOT NULL,
+    end_time    REAL,
+    hits        INTEGER NOT NULL DEFAULT 1,
+    max_conf    REAL    NOT NULL DEFAULT 0,
+    box         TEXT,
+    snapshot    TEXT,
+    alerts      INTEGER NOT NULL DEFAULT 0,
+    clip        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_start ON incidents (start_time);
+CREATE INDEX IF NOT EXISTS idx_incidents_source_start ON incidents (source, start_time);
+"""
+
+
+class IncidentStore:
+    """
+    Guarda un registro por track de violación. Las escrituras (y la
+    codificación de la mejor captura) se hacen en un hilo propio para no
+    frenar el pipeline; las consultas usan su propia conexión (modo WAL).
+    """
+    def __init__(self, db_path='incidents.db', snapshot_dir='incidents', jpeg_quality=90):
+        self.db_path = db_path
+        self.snapshot_dir = snapshot_dir
+        self.jpeg_quality = jpeg_quality
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        # Bases creadas antes de los clips
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(incidents)')]
+        if 'clip' not in columns:
+            self.conn.execute('ALTER TABLE incidents ADD COLUMN clip TEXT')
+        self.conn.commit()
+        self.read_lock = threading.Lock()
+
+        # Para acotar por start_time las consultas que solo dan `start`: la
+        # duración del incidente cerrado más largo y el inicio de los abiertos
+        self.span_lock = threading.Lock()
+        row = self.conn.execute('SELECT MAX(end_time - start_time) FROM incidents').fetchone()
+        self.longest = row[0] or 0.0
+        self.open_starts = dict(self.conn.execute('SELECT id, start_time FROM incidents WHERE end_time IS NULL'))
+
+        self.writes = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name="incident-writer", daemon=True)
+        self.writer.start()
+
+    def next_id(self):
+        """Primer id libre (los tracks usan su id como clave del incidente)"""
+        with self.read_lock:
+            row = self.conn.execute('SELECT MAX(id) FROM incidents').fetchone()
+        return (row[0] or 0) + 1
+
+    # --- Escritura (asíncrona) ---
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        while True:
+            task = self.writes.get()
+            if task is None:
+                break
+            try:
+                task(conn)
+                conn.commit()
+            except Exception as e:
+                print(f"ERROR: No se pudo guardar el incidente: {e}")
+            finally:
+                self.writes.task_done()
+        conn.close()
+
+    def record_start(self, track, clip=None):
+        data = track.to_dict()
+        with self.span_lock:
+            self.open_starts[track.id] = data['start_time']
+
+        def write(conn):
+            conn.execute(
+                'INSERT OR REPLACE INTO incidents (id, source, start_time, hits, max_conf, box, clip) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (track.id, data['source'], data['start_time'], data['hits'], data['max_conf'],
+                 json.dumps(data['box']), clip))
+        self.writes.put(write)
+
+    def record_alert(self, track):
+        alerts = track.alerts
+        self.writes.put(lambda conn: conn.execute('UPDATE incidents SET alerts = ? WHERE id = ?', (alerts, track.id)))
+
+    def record_end(self, track):
+        """Cierra el incidente y guarda la mejor captura del track"""
+        data = track.to_dict()
+        frame = track.best_frame
+        track.best_frame = None
+        with self.span_lock:
+            self.open_starts.pop(track.id, None)
+            self.longest = max(self.longest, data['end_time'] - data['start_time'])
+
+        def write(conn):
+            snapshot = None
+            if frame is not None and self.snapshot_dir:
+                snapshot = os.path.join(self.snapshot_dir, f"incident_{track.id}.jpg")
+                cv2.imwrite(snapshot, frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            conn.execute(
+                'UPDATE incidents SET end_time = ?, hits = ?, max_conf = ?, box = ?, snapshot = ?, alerts = ? '
+                'WHERE id = ?',
+                (data['end_time'], data['hits'], data['max_conf'], json.dumps(data['box']), snapshot, data['alerts'],
+                 track.id))
+        self.writes.put(write)
+
+    def clear_clip(self, path):
+        """Quita la ruta de un clip que no llegó a escribirse"""
+        self.writes.put(lambda conn: conn.execute('UPDATE incidents SET clip = NULL WHERE clip = ?', (path,)))
+
+    def flush(self, timeout=5):
+        """Espera a que se escriban los incidentes pendientes"""
+        deadline = time.time() + timeout
+        while self.writes.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        self.flush()
+        self.writes.put(None)
+        self.writer.join(timeout=5)
+        self.conn.close()
+
+    # --- Consultas ---
+
+    @staticmethod
+    def _row(row):
+        keys = ('id', 'source', 'start_time', 'end_time', 'hits', 'max_conf', 'box', 'snapshot', 'alerts', 'clip')
+        incident = dict(zip(keys, row))
+        incident['box'] = json.loads(incident['box']) if incident['box'] else None
+        incident['active'] = incident['end_time'] is None
+        return incident
+
+    def query(self, start=None, end=None, source=None, limit=100, offset=0):
+        """
+        Incidentes que se solapan con [start, end] (timestamps), los más
+        recientes primero. Ambos extremos acotan start_time para que el índice
+        limite el rango: un incidente que sigue abierto en `start` empezó a
+        lo sumo la duración del más largo antes, o es uno de los abiertos.
+        """
+        clauses, params = [], []
+        if end is not None:
+            clauses.append('start_time <= ?')
+            params.append(end)
+        if start is not None:
+            with self.span_lock:
+                lower = min([start - self.longest] + list(self.open_starts.values()))
+            clauses.append('start_time >= ?')
+            params.append(lower)
+            clauses.append('(end_time IS NULL OR end_time >= ?)')
+            params.append(start)
+        if source is not None:
+            clauses.append('source = ?')
+            params.append(str(source))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        sql = (f'SELECT id, source, start_time, end_time, hits, max_conf, box, snapshot, alerts, clip '
+               f'FROM incidents {where} ORDER BY start_time DESC LIMIT ? OFFSET ?')
+        with self.read_lock:
+            rows = self.conn.execute(sql, params + [limit, offset]).fetchall()
+        return [self._row(row) for row in rows]
+
+    def get(self, incident_id):
+        with self.read_lock:
+            row = self.conn.execute(
+                'SELECT id, source, start_time, end_time, hits, max_conf, box, snapshot, alerts, clip '
+                'FROM incidents WHERE id = ?', (incident_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def count(self, start=None, end=None):
+        return len(self.query(start, end, limit=-1))
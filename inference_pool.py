@@ -0,0 +1,382 @@
+# inference_pool.py - Inferencia en procesos trabajadores con frames en memoria compartida
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from detector import Detections, HelmetDetector, InferenceSettings
+
+
+def _worker_main(worker_id, shm_name, slot_bytes, detector_kwargs, threads, tasks, results):
+    """
+    Proceso trabajador: carga su propio detector y atiende tareas. Cada tarea
+    indica qué ranuras de su anillo de memoria compartida contienen los frames;
+    solo se devuelven los arrays (xyxy, conf, cls) de cada frame.
+    """
+    if threads:
+        os.environ.setdefault('OMP_NUM_THREADS', str(threads))
+        cv2.setNumThreads(threads)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        detector = HelmetDetector(**detector_kwargs)
+    except Exception as e:
+        results.put(('error', worker_id, str(e)))
+        shm.close()
+        return
+    results.put(('ready', worker_id, detector.class_names))
+
+    settings_cache = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        task_id, items, settings_key = task
+        settings = None
+        if settings_key is not None:
+            settings = settings_cache.get(settings_key)
+            if settings is None:
+                settings = settings_cache[settings_key] = InferenceSettings.from_dict(json.loads(settings_key))
+
+        # Vistas sobre la memoria compartida (sin copias); los frames que no
+        # cabían en una ranura llegan serializados como arrays
+        frames = [np.ndarray(item[1], dtype=item[2], buffer=shm.buf, offset=item[0] * slot_bytes)
+                  if isinstance(item, tuple) else item for item in items]
+        try:
+            detections = detector._predict(frames, settings)
+            arrays = [detector.boxes_arrays([r]) for r in detections]
+            results.put(('result', task_id, arrays))
+        except Exception as e:
+            results.put(('failed', task_id, str(e)))
+        finally:
+            detections = None
+            frames = None
+
+    shm.close()
+
+
+class _Worker:
+    """Estado del lado padre de un proceso trabajador"""
+    def __init__(self, index, shm, tasks, process, slots):
+        self.index = index
+        self.shm = shm
+        self.tasks = tasks
+        self.process = process
+        self.free_slots = list(range(slots))
+        self.alive = True
+
+
+class ProcessInferencePool:
+    """
+    Pool de procesos de inferencia. Cada proceso tiene un anillo de ranuras en
+    multiprocessing.shared_memory donde el proceso padre copia los frames; por
+    las colas solo viajan índices de ranura y los resultados compactos.
+    """
+    def __init__(self, detector_kwargs, workers=2, slots=4, max_frame_shape=(1080, 1920, 3),
+                 threads=1, start_method='spawn', startup_timeout=300, task_timeout=60):
+        self.detector_kwargs = detector_kwargs
+        self.num_workers = max(1, workers)
+        self.slots = max(1, slots)
+        self.slot_bytes = int(np.prod(max_frame_shape))
+        self.threads = threads
+        self.startup_timeout = startup_timeout
+        self.task_timeout = task_timeout
+        self.context = multiprocessing.get_context(start_method)
+
+        self.workers = []
+        self.results = None
+        self.class_names = None
+        self.pending = {}
+        self.task_ids = itertools.count()
+        self.condition = threading.Condition()
+        self.collector = None
+        self.running = False
+
+        self.stats = {'tasks': 0, 'frames': 0, 'failed': 0, 'pickled_frames': 0}
+        self.avg_roundtrip = 0.0
+
+    def start(self):
+        """Lanza los procesos y espera a que todos carguen el modelo"""
+        if self.running:
+            return
+        self.results = self.context.Queue()
+        for index in range(self.num_workers):
+            shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+            tasks = self.context.Queue()
+            self.workers.append(_Worker(index, shm, tasks, self._spawn(index, shm, tasks), self.slots))
+
+        ready = 0
+        deadline = time.time() + self.startup_timeout
+        while ready < self.num_workers:
+            try:
+                kind, worker_id, payload = self.results.get(timeout=max(0.1, deadline - time.time()))
+            except queue.Empty:
+                self.stop()
+                raise TimeoutError("Los procesos de inferencia no iniciaron a tiempo")
+            if kind == 'error':
+                self.stop()
+                raise RuntimeError(f"El proceso de inferencia {worker_id} no pudo cargar el modelo: {payload}")
+            self.class_names = payload
+            ready += 1
+
+        self.running = True
+        self.collector = threading.Thread(target=self._collect_loop, name="inference-collector", daemon=True)
+        self.collector.start()
+        print(f"INFO: {self.num_workers} procesos de inferencia listos "
+              f"({self.slots} ranuras de {self.slot_bytes / 1e6:.1f} MB cada uno)")
+
+    def _spawn(self, index, shm, tasks):
+        process = self.context.Process(
+            target=_worker_main,
+            args=(index, shm.name, self.slot_bytes, self.detector_kwargs, self.threads, tasks, self.results),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _restart(self, worker):
+        """
+        Termina un proceso colgado y lanza otro sobre la misma memoria
+        compartida. Queda fuera de servicio hasta que el nuevo cargue el
+        modelo (el colector recibe su 'ready').
+        """
+        with self.condition:
+            worker.alive = False
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(timeout=2)
+        if worker.process.is_alive():
+            worker.process.kill()  # Detenido o ignorando SIGTERM
+            worker.process.join(timeout=2)
+        print(f"WARN: Reiniciando el proceso de inferencia {worker.index}")
+        # Cola nueva: la anterior puede tener tareas que ya no tienen dueño
+        worker.tasks.cancel_join_thread()
+        worker.tasks = self.context.Queue()
+        worker.process = self._spawn(worker.index, worker.shm, worker.tasks)
+
+    def _fail_worker_tasks(self, worker, message):
+        """Saca del registro las tareas de un trabajador, libera sus ranuras y las falla"""
+        with self.condition:
+            lost = [task_id for task_id, entry in self.pending.items() if entry[1] is worker]
+            entries = [self.pending.pop(task_id) for task_id in lost]
+            worker.free_slots = list(range(self.slots))
+            self.condition.notify_all()
+        for future, _, _, _, _ in entries:
+            self.stats['failed'] += 1
+            if not future.done():
+                future.set_exception(RuntimeError(message))
+
+    def _abandon(self, futures):
+        """Tras un timeout: reinicia los trabajadores que no respondieron y falla sus tareas"""
+        waiting = {id(future) for future in futures if not future.done()}
+        with self.condition:
+            hung = {id(entry[1]): entry[1] for entry in self.pending.values() if id(entry[0]) in waiting}
+        for worker in hung.values():
+            self._restart(worker)
+            self._fail_worker_tasks(worker, f"El proceso de inferencia {worker.index} no respondió")
+
+    def _acquire(self, count):
+        """Elige el trabajador vivo con más ranuras libres, esperando si hace falta"""
+        with self.condition:
+            while True:
+                alive = [w for w in self.workers if w.alive]
+                if not alive or not self.running:
+                    raise RuntimeError("No hay procesos de inferencia disponibles")
+                worker = max(alive, key=lambda w: len(w.free_slots))
+                if len(worker.free_slots) >= count:
+                    slots = worker.free_slots[:count]
+                    del worker.free_slots[:count]
+                    return worker, slots
+                self.condition.wait(timeout=0.5)
+
+    def _release(self, worker, slots):
+        with self.condition:
+            worker.free_slots.extend(slots)
+            self.condition.notify_all()
+
+    def submit(self, frames, settings=None):
+        """
+        Copia los frames a las ranuras de un trabajador y encola la tarea.
+        Retorna un Future con la lista de Detections (una por frame).
+        """
+        if len(frames) > self.slots:
+            raise ValueError(f"Como máximo {self.slots} frames por tarea")
+        worker, slots = self._acquire(len(frames))
+
+        items = []
+        for slot, frame in zip(slots, frames):
+            if frame.nbytes <= self.slot_bytes:
+                view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=worker.shm.buf, offset=slot * self.slot_bytes)
+                np.copyto(view, frame)
+                items.append((slot, frame.shape, frame.dtype.str))
+            else:
+                items.append(frame)
+                self.stats['pickled_frames'] += 1
+
+        settings_key = json.dumps(settings.to_dict(), sort_keys=True) if settings is not None else None
+        future = Future()
+        task_id = next(self.task_ids)
+        with self.condition:
+            self.pending[task_id] = (future, worker, slots, frames, time.perf_counter())
+        worker.tasks.put((task_id, items, settings_key))
+        return future
+
+    def predict(self, frames, settings=None):
+        """Reparte los frames entre los trabajadores y espera todos los resultados"""
+        if not frames:
+            return []
+        alive = max(1, sum(w.alive for w in self.workers))
+        chunk = min(self.slots, math.ceil(len(frames) / alive))
+        futures = [self.submit(frames[i:i + chunk], settings) for i in range(0, len(frames), chunk)]
+
+        # Con timeout: un proceso colgado (vivo pero sin responder) no bloquea al llamador
+        deadline = time.perf_counter() + self.task_timeout if self.task_timeout else None
+        results = []
+        for future in futures:
+            remaining = max(0.0, deadline - time.perf_counter()) if deadline else None
+            try:
+                results.extend(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                self._abandon(futures)
+                raise TimeoutError(f"La inferencia no respondió en {self.task_timeout} s") from None
+        return results
+
+    def _collect_loop(self):
+        """Recibe resultados de los trabajadores y resuelve los Futures"""
+        while self.running:
+            # En cada vuelta, no solo al quedar ocioso: con otros procesos
+            # respondiendo, las tareas de uno caído quedarían colgadas
+            self._check_workers()
+            try:
+                kind, task_id, payload = self.results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind in ('ready', 'error'):
+                self._worker_restarted(task_id, kind, payload)
+                continue
+
+            with self.condition:
+                entry = self.pending.pop(task_id, None)
+            if entry is None:
+                continue
+            future, worker, slots, frames, started = entry
+            self._release(worker, slots)
+
+            if kind == 'result':
+                roundtrip = time.perf_counter() - started
+                self.avg_roundtrip = roundtrip if self.avg_roundtrip == 0 else 0.9 * self.avg_roundtrip + 0.1 * roundtrip
+                self.stats['tasks'] += 1
+                self.stats['frames'] += len(frames)
+                future.set_result([Detections(frame, xyxy.astype(np.float32), conf, cls)
+                                   for frame, (xyxy, conf, cls) in zip(frames, payload)])
+            else:
+                self.stats['failed'] += 1
+                future.set_exception(RuntimeError(f"Error en el proceso de inferencia: {payload}"))
+
+    def _worker_restarted(self, worker_id, kind, payload):
+        """Un proceso reiniciado terminó de cargar el modelo (o falló al hacerlo)"""
+        worker = self.workers[worker_id]
+        if kind == 'error':
+            print(f"ERROR: El proceso de inferencia {worker_id} no pudo reiniciarse: {payload}")
+            return
+        with self.condition:
+            worker.free_slots = list(range(self.slots))
+            worker.alive = True
+            self.condition.notify_all()
+        print(f"INFO: Proceso de inferencia {worker_id} reiniciado")
+
+    def _check_workers(self):
+        """Marca los procesos caídos y falla sus tareas pendientes"""
+        for worker in self.workers:
+            if worker.alive and not worker.process.is_alive():
+                worker.alive = False
+                print(f"ERROR: El proceso de inferencia {worker.index} terminó "
+                      f"(código {worker.process.exitcode})")
+                self._fail_worker_tasks(worker, f"El proceso de inferencia {worker.index} terminó")
+
+    def get_stats(self):
+        with self.condition:
+            in_flight = len(self.pending)
+        return {
+            **self.stats,
+            'workers': self.num_workers,
+            'alive': sum(w.alive and w.process.is_alive() for w in self.workers),
+            'in_flight': in_flight,
+            'avg_roundtrip_ms': round(self.avg_roundtrip * 1000, 2)
+        }
+
+    def stop(self, timeout=5):
+        """Detiene los procesos y libera la memoria compartida"""
+        self.running = False
+        for worker in self.workers:
+            try:
+                worker.tasks.put(None)
+            except (ValueError, OSError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.alive = False
+        if self.collector and self.collector.is_alive():
+            self.collector.join(timeout=timeout)
+
+        with self.condition:
+            entries = list(self.pending.values())
+            self.pending.clear()
+            self.condition.notify_all()
+        for future, *_ in entries:
+            if not future.done():
+                future.set_exception(RuntimeError("Pool de inferencia detenido"))
+
+        for worker in self.workers:
+            worker.shm.close()
+            worker.shm.unlink()
+        self.workers = []
+
+
+class ProcessPoolDetector(HelmetDetector):
+    """
+    HelmetDetector cuya inferencia corre en un pool de procesos. El proceso
+    principal no carga el modelo: toma los nombres de clase de los trabajadores
+    y conserva el resto de la API (violaciones, dibujo) sin cambios.
+    """
+    def __init__(self, model_path, target_class='head', conf_threshold=0.25, workers=2, slots=4,
+                 max_frame_shape=(1080, 1920, 3), threads=1, start_method='spawn', task_timeout=60, **kwargs):
+        detector_kwargs = dict(model_path=model_path, target_class=target_class,
+                               conf_threshold=conf_threshold, **kwargs)
+        self.pool = ProcessInferencePool(detector_kwargs, workers=workers, slots=slots,
+                                         max_frame_shape=max_frame_shape, threads=threads,
+                                         start_method=start_method, task_timeout=task_timeout)
+        self.pool.start()
+        self.backend = None
+        self.class_names = self.pool.class_names
+        self._init_classes(target_class, conf_threshold)
+
+    def _predict(self, frames, settings):
+        return self.pool.predict(frames, settings)
+
+    def get_stats(self):
+        return self.pool.get_stats()
+
+    def close(self):
+        self.pool.stop()
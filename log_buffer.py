@@ -0,0 +1,76 @@
+# log_buffer.py - Buffer circular de logs con números de secuencia
+import itertools
+
+
+class LogRingBuffer:
+    """
+    Buffer circular de capacidad fija para los eventos del sistema.
+    Cada entrada recibe un número de secuencia creciente y ocupa la ranura
+    seq % capacity, así que escribir nunca mueve ni copia las demás entradas.
+
+    No usa locks: la asignación de la secuencia (next sobre itertools.count) y
+    la escritura de la ranura son atómicas bajo el GIL. Los lectores validan el
+    número de secuencia de cada ranura, de modo que una entrada que todavía no
+    se escribió o que ya fue sobrescrita nunca se devuelve por error.
+    """
+    def __init__(self, capacity=10000):
+        self.capacity = max(1, capacity)
+        self._slots = [None] * self.capacity
+        self._counter = itertools.count(1)
+        self._head = 0  # Última secuencia escrita (aproximada con escritores concurrentes)
+
+    def append(self, entry):
+        """Agrega la entrada (dict) asignándole 'seq'; retorna la secuencia"""
+        seq = next(self._counter)
+        entry['seq'] = seq
+        self._slots[seq % self.capacity] = entry
+        if seq > self._head:
+            self._head = seq
+        return seq
+
+    @property
+    def last_seq(self):
+        return self._head
+
+    def _entry(self, seq):
+        entry = self._slots[seq % self.capacity]
+        return entry if entry is not None and entry['seq'] == seq else None
+
+    def since(self, seq=0, limit=None):
+        """
+        Entradas con secuencia mayor a `seq`, de la más antigua a la más nueva.
+        Si el cliente quedó atrás más que la capacidad, empieza por la más
+        antigua que sigue en el buffer. `limit` permite paginar.
+        """
+        start = max(seq + 1, self._head - self.capacity + 1, 1)
+        entries = []
+        current = start
+        # Se avanza mientras las ranuras tengan la secuencia esperada, lo que
+        # también recoge entradas escritas después de leer _head
+        while limit is None or len(entries) < limit:
+            entry = self._entry(current)
+            if entry is None:
+                if current <= self._head - self.capacity:
+                    # Sobrescrita mientras se leía: saltar a la más antigua vigente
+                    current = self._head - self.capacity + 1
+                    continue
+                break
+            entries.append(entry)
+            current += 1
+        return entries
+
+    def latest(self, count=100):
+        """Las `count` entradas más recientes, de la más nueva a la más antigua"""
+        entries = []
+        current = self._head
+        while current > 0 and len(entries) < count:
+            entry = self._entry(current)
+            if entry is None and current <= self._head - self.capacity:
+                break
+            if entry is not None:
+                entries.append(entry)
+            current -= 1
+        return entries
+
+    def __len__(self):
+        return min(self._head, self.capacity)
@@ -2,53 +2,81 @@
 import cv2
 import time
 import config  # Importamos nuestro archivo de configuración
-from detector import HelmetDetector
+from detector import HelmetDetector, InferenceSettings
 from notifier import TelegramNotifier
+from video_source import VideoSource
+from violation_tracker import ViolationDebouncer
 
 def main():
     # Inicializar los componentes desde nuestros módulos
-    detector = HelmetDetector(config.MODEL_PATH)
+    detector = HelmetDetector(
+        config.MODEL_PATH,
+        target_class=config.TARGET_CLASS_NAME,
+        conf_threshold=config.VIOLATION_CONF_THRESHOLD,
+        backend=config.INFERENCE_BACKEND,
+        imgsz=config.INFERENCE_IMGSZ,
+        precision=config.MODEL_PRECISION,
+        warmup=config.MODEL_WARMUP,
+        mmap_weights=config.MODEL_MMAP_WEIGHTS
+    )
     notifier = TelegramNotifier(config.BOT_TOKEN, config.CHAT_ID)
+    settings = InferenceSettings.from_dict({**config.SOURCE_SETTINGS.get('default', {}),
+                                            **config.SOURCE_SETTINGS.get('main', {})})
 
-    # Configurar la fuente de video
+    # Configurar la fuente de video (mismo lector con prefetch que la app web,
+    # pero los archivos terminan en lugar de repetirse)
     source = config.WEBCAM_ID if config.USE_WEBCAM else config.VIDEO_PATH
-    cap = cv2.VideoCapture(source)
-    if not cap.isOpened():
-        print(f"ERROR: No se pudo abrir la fuente de video: {source}")
+    video = VideoSource(prefetch=config.CAPTURE_PREFETCH, loop=False)
+    try:
+        video.open(source)
+    except Exception as e:
+        print(f"ERROR: {e}")
         return
 
+    debouncer = ViolationDebouncer(config.DEBOUNCE_WINDOW, config.DEBOUNCE_MIN_HITS,
+                                   config.DEBOUNCE_MIN_SCORE) if config.DEBOUNCE_ENABLED else None
     last_notification_time = 0
     print("INFO: Iniciando la detección en tiempo real. Presiona 'q' para salir.")
 
     # Bucle principal
     while True:
-        ret, frame = cap.read()
+        ret, frame = video.read()
         if not ret:
-            print("INFO: Fin del stream de video.")
-            break
+            if video.ended() or not video.is_opened():
+                print("INFO: Fin del stream de video.")
+                break
+            # Sin frame a tiempo (lector atrasado o cámara lenta): seguir esperando
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+            continue
 
         # 1. Realizar detección
-        results = detector.detect_on_frame(frame)
+        results = detector.detect_on_frame(frame, settings)
         
-        # 2. Comprobar si hay violaciones
-        is_violation = detector.find_violation(results, config.TARGET_CLASS_NAME)
+        # 2. Comprobar si hay violaciones (confirmadas en k de los últimos n frames)
+        violation = detector.find_violations(results)
+        is_violation = violation['count'] > 0
+        if debouncer:
+            is_violation = debouncer.update('main', violation['max_conf'] if is_violation else 0.0)
         
-        # 3. Enviar notificación si es necesario (con cooldown)
+        # 3. Dibujar una sola vez; el mismo frame sirve para la alerta y la pantalla
+        annotated_frame = detector.draw_detections(results)
+
+        # 4. Enviar notificación si es necesario (con cooldown)
         current_time = time.time()
         if is_violation and (current_time - last_notification_time) > config.NOTIFICATION_COOLDOWN_SECONDS:
-            annotated_frame = detector.draw_detections(results)
             if notifier.send_alert(annotated_frame):
                 last_notification_time = current_time # Actualizar solo si se envió
 
-        # 4. Mostrar el video en pantalla
-        display_frame = detector.draw_detections(results)
-        cv2.imshow("Detector de Cascos", display_frame)
+        # 5. Mostrar el video en pantalla
+        cv2.imshow("Detector de Cascos", annotated_frame)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
             
-    # Liberar recursos
-    cap.release()
+    # Liberar recursos (las alertas en cola se envían antes de cerrar)
+    video.release()
+    notifier.close(timeout=config.NOTIFICATION_SEND_TIMEOUT)
     cv2.destroyAllWindows()
     print("INFO: Aplicación finalizada.")
 
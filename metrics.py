@@ -0,0 +1,117 @@
+# metrics.py - Histogramas de latencia y exposición en formato de texto Prometheus
+import threading
+from bisect import bisect_left
+
+# Límites superiores en segundos, de 1 ms a 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Histogram:
+    """
+    Histograma de buckets fijos. Registrar una observación es una búsqueda
+    binaria y tres sumas, así que puede quedar activo en producción.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # El último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """Retorna (conteos acumulados por bucket, suma, cantidad)"""
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class MetricsRegistry:
+    """
+    Familias de histogramas con etiquetas. Los gauges y contadores se pasan al
+    renderizar, tomados de las estadísticas que el sistema ya mantiene.
+    """
+    def __init__(self, prefix='helmet'):
+        self.prefix = prefix
+        self.families = {}  # nombre -> (ayuda, {etiquetas: Histogram})
+        self.lock = threading.Lock()
+
+    def histogram(self, name, help_text='', **labels):
+        key = tuple(sorted(labels.items()))
+        family = self.families.get(name)
+        if family is None or key not in family[1]:
+            with self.lock:
+                family = self.families.setdefault(name, (help_text, {}))
+                family[1].setdefault(key, Histogram())
+        return family[1][key]
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def describe(self, name, help_text):
+        """Asigna el texto de ayuda de una familia de histogramas"""
+        with self.lock:
+            _, histograms = self.families.get(name, ('', {}))
+            self.families[name] = (help_text, histograms)
+
+    def render(self, metrics=()):
+        """
+        Texto de exposición Prometheus. `metrics` es una lista de
+        (nombre, tipo, ayuda, [(etiquetas, valor), ...]) para gauges y contadores.
+        """
+        lines = []
+        with self.lock:
+            families = {name: (help_text, dict(histograms)) for name, (help_text, histograms) in self.families.items()}
+
+        for name, (help_text, histograms) in sorted(families.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for key, histogram in sorted(histograms.items()):
+                labels = dict(key)
+                cumulative, total, count = histogram.snapshot()
+                for bound, value in zip(histogram.buckets + ('+Inf',), cumulative):
+                    lines.append(f"{full_name}_bucket{_format_labels({**labels, 'le': bound})} {value}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
+
+        for name, metric_type, help_text, samples in metrics:
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
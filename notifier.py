@@ -1,27 +1,79 @@
 # notifier.py - Versión actualizada para aplicación web
-import cv2
 import telegram
 import asyncio
 import threading
+import time
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime
 
+from alert_images import AlertImageBuilder
+
 class TelegramNotifier:
     """
     Clase para gestionar las notificaciones de alerta a través de un bot de Telegram.
     Versión actualizada para aplicación web.
+
+    Un único hilo trabajador con su propio loop de eventos envía las alertas
+    desde una cola acotada, reutilizando la sesión HTTP del bot.
     """
-    def __init__(self, token, chat_id):
+    # Políticas cuando la cola está llena
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEW = 'drop_new'
+
+    def __init__(self, token, chat_id, queue_size=8, coalesce=True, drop_policy=DROP_OLDEST,
+                 base_url=None, send_timeout=20, image_builder=None, media_group=True,
+                 outbox=None, retry_base=2, retry_max=300, batch_size=10):
         """
         Inicializa el bot de Telegram si se proporcionan credenciales válidas.
+        Con `coalesce`, una alerta nueva reemplaza la imagen de otra pendiente
+        para el mismo chat en lugar de encolarse. `base_url` permite apuntar a
+        un servidor compatible con la Bot API (por ejemplo fake_bot_api.py).
+        `image_builder` prepara los adjuntos (vista completa y recortes); con
+        `media_group` varios adjuntos se envían en un solo mensaje.
+
+        Con `outbox` (NotificationOutbox) cada alerta se persiste antes de
+        enviarse y se borra al entregarse. Si el envío falla se reintenta con
+        espera exponencial (`retry_base` a `retry_max` segundos) y, al volver
+        la conexión, las pendientes se envían en lotes de hasta `batch_size`.
         """
         self.token = token
         self.chat_id = chat_id
         self.bot = None
         self.last_error = None
-        
+
+        self.queue_size = max(1, queue_size)
+        self.coalesce = coalesce
+        self.drop_policy = drop_policy
+        self.send_timeout = send_timeout
+        self.image_builder = image_builder or AlertImageBuilder()
+        self.media_group = media_group
+
+        self.outbox = outbox
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.batch_size = max(1, min(batch_size, 10))  # Límite de un media group
+        self.retry_at = 0
+        self.failures = 0
+        self.session_ready = False
+        self.outbox_futures = {}  # id en el outbox -> futures de quienes esperan la entrega
+        # Hay alertas atrasadas (de un corte o de una ejecución anterior)
+        self.backlog = bool(outbox and outbox.pending())
+
+        # Cola compartida entre los hilos productores y el loop del trabajador
+        self.queue = deque()
+        self.queue_lock = threading.Lock()
+        self.loop = None
+        self.wakeup = None
+        self.worker = None
+        self.running = False
+
+        self.stats = {'sent': 0, 'failed': 0, 'coalesced': 0, 'dropped': 0, 'retried': 0, 'expired': 0}
+
         if token and chat_id:
             try:
-                self.bot = telegram.Bot(token=token)
+                kwargs = {'base_url': base_url} if base_url else {}
+                self.bot = telegram.Bot(token=token, **kwargs)
                 print("INFO: Notificador de Telegram inicializado correctamente.")
             except Exception as e:
                 self.last_error = str(e)
@@ -30,51 +82,284 @@ class TelegramNotifier:
         else:
             print("INFO: Credenciales de Telegram no proporcionadas. Notificaciones desactivadas.")
 
-    def send_alert(self, image_with_violation):
+    def start(self):
+        """Inicia el hilo trabajador (se llama automáticamente al primer envío)"""
+        if self.running or not self.bot:
+            return
+        self.running = True
+        ready = threading.Event()
+        self.worker = threading.Thread(target=self._run_worker, args=(ready,), name="telegram-notifier", daemon=True)
+        self.worker.start()
+        ready.wait(timeout=5)
+
+    def _run_worker(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.wakeup = asyncio.Event()
+        ready.set()
+        try:
+            self.loop.run_until_complete(self._worker_main())
+        finally:
+            self.loop.close()
+
+    async def _initialize_session(self):
+        try:
+            await self.bot.initialize()
+            self.session_ready = True
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"WARN: No se pudo inicializar la sesión del bot: {e}")
+
+    async def _worker_main(self):
         """
-        Envía la alerta de forma no bloqueante usando threading.
+        Loop del trabajador: toma alertas de la cola y las envía de a una. Con
+        outbox, las alertas nuevas se persisten y el envío sale del outbox,
+        respetando la espera entre reintentos.
+        """
+        await self._initialize_session()
+
+        while self.running:
+            alert = self._next_alert()
+            if alert is not None:
+                await self._process(alert)
+                continue
+
+            if self.outbox and self.outbox.pending() and time.time() >= self.retry_at:
+                await self._drain_outbox()
+                continue
+
+            self.wakeup.clear()
+            # Volver a revisar por si llegó algo entre _next_alert y clear
+            if not self.queue:
+                timeout = None
+                if self.outbox and self.outbox.pending():
+                    timeout = max(0.0, self.retry_at - time.time())
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+        try:
+            await self.bot.shutdown()
+        except Exception:
+            pass
+
+    async def _process(self, alert):
+        """Prepara los adjuntos de una alerta nueva y la envía o la persiste"""
+        try:
+            # La codificación corre fuera del loop para no frenar otros envíos
+            attachments = await self.loop.run_in_executor(
+                None, self.image_builder.build, alert['image'], alert['jpeg'],
+                alert['boxes'] if self.media_group else None)
+            if self.outbox:
+                entry_id, dropped = await self.loop.run_in_executor(
+                    None, self.outbox.put, alert['chat_id'], alert['caption'], attachments)
+                self.outbox_futures[entry_id] = alert['futures']
+                self._resolve_entries(dropped, False, 'dropped')
+                return
+            await asyncio.wait_for(self._async_send_alert(attachments, alert['caption'], alert['chat_id']),
+                                   timeout=self.send_timeout)
+            self.stats['sent'] += 1
+            print("INFO: Alerta enviada a Telegram con éxito.")
+            self._resolve(alert, True)
+        except Exception as e:
+            self.last_error = str(e)
+            self.stats['failed'] += 1
+            print(f"ERROR: Fallo al enviar la notificación: {e}")
+            self._resolve(alert, False)
+
+    async def _drain_outbox(self):
+        """Envía las alertas pendientes más viejas del mismo chat (una o un lote)"""
+        # Con conexión se envía de a una; solo lo atrasado se agrupa en lotes
+        limit = self.batch_size if self.backlog else 1
+        entries, expired = await self.loop.run_in_executor(None, self.outbox.peek, limit)
+        self._resolve_entries(expired, False, 'expired')
+        if not entries:
+            return
+        chat_id = entries[0]['chat_id']
+        batch = [entries[0]]
+        for entry in entries[1:]:
+            if entry['chat_id'] != chat_id:
+                break
+            batch.append(entry)
+
+        try:
+            if not self.session_ready:
+                await asyncio.wait_for(self.bot.initialize(), timeout=self.send_timeout)
+                self.session_ready = True
+            if len(batch) == 1:
+                send = self._async_send_alert(batch[0]['attachments'], batch[0]['caption'], chat_id)
+            else:
+                send = self._async_send_batch(batch, chat_id)
+            await asyncio.wait_for(send, timeout=self.send_timeout)
+        except telegram.error.BadRequest as e:
+            # Rechazo definitivo (chat inválido, adjunto corrupto): reintentar no sirve
+            self.last_error = str(e)
+            print(f"ERROR: Telegram rechazó {len(batch)} alerta(s), se descartan: {e}")
+            for entry in batch:
+                self.outbox.remove(entry['id'])
+            self._resolve_entries([entry['id'] for entry in batch], False, 'failed')
+            return
+        except Exception as e:
+            self.last_error = str(e)
+            self.failures += 1
+            self.backlog = True
+            self.stats['retried'] += 1
+            delay = min(self.retry_max, self.retry_base * 2 ** (self.failures - 1))
+            if isinstance(e, telegram.error.RetryAfter):
+                delay = max(delay, float(getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)()))
+            self.retry_at = time.time() + delay
+            print(f"ERROR: Fallo al enviar la notificación ({self.outbox.pending()} pendiente(s), "
+                  f"reintento en {delay:.0f} s): {e}")
+            return
+
+        for entry in batch:
+            self.outbox.remove(entry['id'])
+        if self.failures or len(batch) > 1:
+            print(f"INFO: {len(batch)} alerta(s) pendiente(s) enviada(s) a Telegram.")
+        else:
+            print("INFO: Alerta enviada a Telegram con éxito.")
+        self.failures = 0
+        self.retry_at = 0
+        if not self.outbox.pending():
+            self.backlog = False
+        self._resolve_entries([entry['id'] for entry in batch], True, 'sent')
+
+    def _resolve_entries(self, entry_ids, delivered, stat):
+        """Resuelve las alertas del outbox que terminaron (entregadas o descartadas)"""
+        for entry_id in entry_ids:
+            self.stats[stat] += 1
+            for future in self.outbox_futures.pop(entry_id, ()):
+                if not future.done():
+                    future.set_result(delivered)
+
+    def _next_alert(self):
+        with self.queue_lock:
+            return self.queue.popleft() if self.queue else None
+
+    @staticmethod
+    def _resolve(alert, delivered):
+        for future in alert['futures']:
+            if not future.done():
+                future.set_result(delivered)
+
+    def send_alert(self, image_with_violation, caption=None, jpeg=None, boxes=None):
+        """
+        Encola la alerta de forma no bloqueante. `jpeg` son los bytes ya
+        codificados de la misma imagen (se reutilizan si cumplen los límites)
+        y `boxes` las cajas xyxy en violación para los recortes.
+        Retorna un Future que se resuelve a True/False según el resultado real
+        del envío, o None si la alerta no fue aceptada (bot no disponible o cola llena).
         """
         if not self.bot:
             print("WARN: Bot de Telegram no disponible")
-            return False
-        
-        def send_async():
-            try:
-                # Crear nuevo loop de eventos para este hilo
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Ejecutar el envío asíncrono
-                loop.run_until_complete(self._async_send_alert(image_with_violation))
-                loop.close()
-                
-                print("INFO: Alerta enviada a Telegram con éxito.")
-                return True
-                
-            except Exception as e:
-                self.last_error = str(e)
-                print(f"ERROR: Fallo al enviar la notificación: {e}")
-                return False
-        
-        # Ejecutar en hilo separado para no bloquear Flask
-        thread = threading.Thread(target=send_async, daemon=True)
-        thread.start()
-        
-        return True  # Retorna True inmediatamente (envío asíncrono)
-
-    async def _async_send_alert(self, image_with_violation):
+            return None
+
+        self.start()
+        future = Future()
+        chat_id = self.chat_id
+
+        with self.queue_lock:
+            pending = None
+            if self.coalesce:
+                pending = next((a for a in self.queue if a['chat_id'] == chat_id), None)
+
+            if pending is not None:
+                # Ráfaga de alertas: se envía solo la imagen más reciente
+                pending['image'] = image_with_violation
+                pending['jpeg'] = jpeg
+                pending['boxes'] = boxes
+                pending['count'] += 1
+                pending['caption'] = caption or self._default_caption(pending['count'])
+                pending['futures'].append(future)
+                self.stats['coalesced'] += 1
+            else:
+                if len(self.queue) >= self.queue_size:
+                    if self.drop_policy == self.DROP_NEW:
+                        self.stats['dropped'] += 1
+                        print("WARN: Cola de notificaciones llena, alerta descartada")
+                        return None
+                    dropped = self.queue.popleft()
+                    self.stats['dropped'] += 1
+                    self._resolve(dropped, False)
+                self.queue.append({
+                    'image': image_with_violation,
+                    'jpeg': jpeg,
+                    'boxes': boxes,
+                    'caption': caption or self._default_caption(1),
+                    'chat_id': chat_id,
+                    'count': 1,
+                    'futures': [future]
+                })
+
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+        return future
+
+    def pending(self):
+        """Cantidad de alertas en cola"""
+        with self.queue_lock:
+            return len(self.queue)
+
+    def get_stats(self):
+        return {**self.stats, 'pending': self.pending(), 'last_error': self.last_error,
+                'images': self.image_builder.get_stats(),
+                'outbox': self.outbox.get_stats() if self.outbox else {},
+                'retry_in_s': round(max(0.0, self.retry_at - time.time()), 1)}
+
+    def close(self, timeout=5):
         """
-        Función asíncrona que realmente envía la foto.
+        Detiene el hilo trabajador y cierra la sesión HTTP. Antes espera (hasta
+        `timeout`) a que se procesen las alertas que siguen en la cola.
         """
+        if not self.running:
+            return
+        deadline = time.time() + timeout
+        while self.pending() and time.time() < deadline and self.worker.is_alive():
+            time.sleep(0.05)
+        self.running = False
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        if self.worker and self.worker.is_alive():
+            self.worker.join(timeout=timeout)
+
+    @staticmethod
+    def _default_caption(count):
         caption = f"🚨 ALERTA DE SEGURIDAD 🚨\n\n" \
-                 f"Se ha detectado una persona sin casco de seguridad.\n" \
-                 f"Fecha y hora: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n" \
-                 f"Sistema de monitoreo automático."
-        
-        _, buffer = cv2.imencode('.jpg', image_with_violation)
-        
+                  f"Se ha detectado una persona sin casco de seguridad.\n"
+        if count > 1:
+            caption += f"Detecciones agrupadas: {count}\n"
+        return caption + f"Fecha y hora: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n" \
+                         f"Sistema de monitoreo automático."
+
+    async def _async_send_batch(self, entries, chat_id):
+        """
+        Envía varias alertas atrasadas en un solo media group: la vista
+        completa de cada una y una leyenda con la hora de cada evento.
+        """
+        lines = [f"🚨 {len(entries)} alertas retrasadas por falta de conexión:"]
+        for entry in entries:
+            summary = (entry['caption'] or '').strip().splitlines()
+            lines.append(f"• {datetime.fromtimestamp(entry['created']).strftime('%d/%m %H:%M:%S')} "
+                         f"{summary[0] if summary else ''}")
+        caption = '\n'.join(lines)[:1024]  # Límite de leyenda de Telegram
+        media = [telegram.InputMediaPhoto(media=entry['attachments'][0], caption=caption if i == 0 else None)
+                 for i, entry in enumerate(entries)]
+        await self.bot.send_media_group(chat_id=chat_id or self.chat_id, media=media)
+
+    async def _async_send_alert(self, attachments, caption=None, chat_id=None):
+        """
+        Función asíncrona que realmente envía las fotos (JPEG ya codificados).
+        """
+        caption = caption or self._default_caption(1)
+        if self.media_group and len(attachments) > 1:
+            # Un solo mensaje; la leyenda va en la primera foto
+            media = [telegram.InputMediaPhoto(media=data, caption=caption if i == 0 else None)
+                     for i, data in enumerate(attachments[:10])]
+            await self.bot.send_media_group(chat_id=chat_id or self.chat_id, media=media)
+            return
+
         await self.bot.send_photo(
-            chat_id=self.chat_id,
-            photo=buffer.tobytes(),
+            chat_id=chat_id or self.chat_id,
+            photo=attachments[0],
             caption=caption
-        )
\ No newline at end of file
+        )
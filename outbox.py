@@ -0,0 +1,151 @@
+# outbox.py - Cola persistente de alertas pendientes de envío
+import json
+import os
+import threading
+import time
+
+SUFFIX = '.alert'
+
+
+class NotificationOutbox:
+    """
+    Guarda cada alerta en disco antes de enviarla, para que un corte de red o
+    un reinicio no la pierda. Cada alerta es un archivo propio que se escribe
+    una sola vez (temporal + fsync + rename atómico) y se borra al entregarse;
+    nunca se modifica, por lo que un corte a mitad de escritura deja a lo sumo
+    un temporal que se descarta al iniciar.
+
+    Formato: una línea JSON de cabecera seguida de los adjuntos JPEG concatenados.
+    """
+    def __init__(self, directory='outbox', max_entries=500, max_mb=100, max_age_hours=24):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        self.max_age = max_age_hours * 3600 if max_age_hours else None
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.entries = []  # [(id, bytes, created)] en orden de llegada
+        self.next_id = 1
+        self._load()
+
+    def _path(self, entry_id):
+        return os.path.join(self.directory, f"{entry_id:016d}{SUFFIX}")
+
+    def _load(self):
+        """Reconstruye el índice desde el directorio (alertas de una ejecución anterior)"""
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)  # Escritura interrumpida
+                continue
+            if not name.endswith(SUFFIX):
+                continue
+            try:
+                with open(path, 'rb') as file:
+                    header = json.loads(file.readline())
+                self.entries.append((header['id'], os.path.getsize(path), header['created']))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"WARN: Alerta pendiente ilegible descartada ({name}): {e}")
+                os.remove(path)
+        self.entries.sort()
+        if self.entries:
+            self.next_id = self.entries[-1][0] + 1
+            print(f"INFO: {len(self.entries)} alerta(s) pendiente(s) recuperada(s) del outbox")
+
+    def _sync_directory(self):
+        if not hasattr(os, 'O_DIRECTORY'):
+            return  # Windows: el rename ya es suficiente
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def put(self, chat_id, caption, attachments):
+        """
+        Persiste una alerta. Retorna (id, ids descartados), donde los
+        descartados son las alertas más viejas que excedían los límites.
+        """
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            created = time.time()
+            header = {'id': entry_id, 'chat_id': chat_id, 'caption': caption, 'created': created,
+                      'sizes': [len(data) for data in attachments]}
+
+            path = self._path(entry_id)
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(json.dumps(header).encode() + b'\n')
+                for data in attachments:
+                    file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+            self._sync_directory()
+            self.entries.append((entry_id, os.path.getsize(path), created))
+
+            # Límites: cantidad y tamaño total; se descartan las más viejas
+            dropped = []
+            total = sum(size for _, size, _ in self.entries)
+            while len(self.entries) > 1 and ((self.max_entries and len(self.entries) > self.max_entries)
+                                             or (self.max_bytes and total > self.max_bytes)):
+                old_id, size, _ = self.entries.pop(0)
+                total -= size
+                self._remove_file(old_id)
+                dropped.append(old_id)
+            return entry_id, dropped
+
+    def peek(self, limit=1):
+        """
+        Retorna hasta `limit` alertas pendientes (las más viejas primero) como
+        dicts con 'id', 'chat_id', 'caption', 'created' y 'attachments', más la
+        lista de ids descartados por antigüedad.
+        """
+        with self.lock:
+            expired = []
+            if self.max_age:
+                now = time.time()
+                while self.entries and now - self.entries[0][2] > self.max_age:
+                    old_id = self.entries.pop(0)[0]
+                    self._remove_file(old_id)
+                    expired.append(old_id)
+            ids = [entry[0] for entry in self.entries[:limit]]
+
+        entries = []
+        for entry_id in ids:
+            try:
+                with open(self._path(entry_id), 'rb') as file:
+                    header = json.loads(file.readline())
+                    attachments = [file.read(size) for size in header.pop('sizes')]
+                entries.append({**header, 'attachments': attachments})
+            except (OSError, ValueError, KeyError) as e:
+                print(f"WARN: Alerta pendiente ilegible descartada ({entry_id}): {e}")
+                self.remove(entry_id)
+                expired.append(entry_id)
+        return entries, expired
+
+    def remove(self, entry_id):
+        """Borra una alerta entregada (o descartada definitivamente)"""
+        with self.lock:
+            self.entries = [entry for entry in self.entries if entry[0] != entry_id]
+            self._remove_file(entry_id)
+
+    def _remove_file(self, entry_id):
+        try:
+            os.remove(self._path(entry_id))
+        except FileNotFoundError:
+            pass
+
+    def pending(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'pending': len(self.entries),
+                'bytes': sum(size for _, size, _ in self.entries),
+                'oldest_age_s': round(time.time() - self.entries[0][2], 1) if self.entries else None
+            }
@@ -0,0 +1,187 @@
+# pipeline.py - Pipeline por etapas (captura / inferencia / anotación / codificación)
+import threading
+import time
+from collections import deque
+
+
+class LatestQueue:
+    """
+    Cola acotada con política "drop-oldest": si está llena, descarta el elemento
+    más antiguo para que el consumidor siempre reciba el frame más reciente.
+    """
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, int(maxsize))
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        """Agrega un elemento descartando el más antiguo si no hay espacio."""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Obtiene el siguiente elemento o None si se agota el tiempo de espera."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def clear(self):
+        """Vacía la cola."""
+        with self._cond:
+            self._items.clear()
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+
+class PipelineStage:
+    """
+    Etapa del pipeline que corre en su propio hilo.
+
+    Si no tiene cola de entrada, la etapa es una fuente y `func` se llama sin
+    argumentos; en otro caso se llama con cada elemento recibido. Si `func`
+    retorna None el elemento no se propaga a la siguiente etapa.
+    """
+    def __init__(self, name, func, in_queue=None, out_queue=None):
+        self.name = name
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.thread = None
+        self.running = False
+
+        # Métricas de la etapa
+        self.processed = 0
+        self.errors = 0
+        self.last_latency = 0.0
+        self.avg_latency = 0.0
+        self.avg_interval = 0.0
+        self.last_output_time = None
+        self.on_error = None
+        self.observer = None  # observer(nombre, latencia) por cada elemento procesado
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+
+    def _run(self):
+        while self.running:
+            if self.in_queue is not None:
+                item = self.in_queue.get(timeout=0.1)
+                if item is None:
+                    continue
+
+            start = time.perf_counter()
+            try:
+                result = self.func() if self.in_queue is None else self.func(item)
+            except Exception as e:
+                self.errors += 1
+                if self.on_error:
+                    self.on_error(self.name, e)
+                time.sleep(0.1)
+                continue
+
+            if result is None:
+                continue
+
+            self._record_latency(time.perf_counter() - start)
+            if self.out_queue is not None:
+                self.out_queue.put(result)
+
+    def _record_latency(self, latency):
+        self.processed += 1
+        self.last_latency = latency
+        # Media móvil exponencial para no guardar historial
+        if self.processed == 1:
+            self.avg_latency = latency
+        else:
+            self.avg_latency = 0.9 * self.avg_latency + 0.1 * latency
+
+        now = time.perf_counter()
+        if self.last_output_time is not None:
+            interval = now - self.last_output_time
+            self.avg_interval = interval if self.avg_interval == 0 else 0.9 * self.avg_interval + 0.1 * interval
+        self.last_output_time = now
+
+        if self.observer:
+            self.observer(self.name, latency)
+
+    def get_fps(self):
+        """FPS efectivo a la salida de la etapa."""
+        return 1.0 / self.avg_interval if self.avg_interval > 0 else 0.0
+
+    def get_stats(self):
+        stats = {
+            'processed': self.processed,
+            'errors': self.errors,
+            'latency_ms': round(self.last_latency * 1000, 2),
+            'avg_latency_ms': round(self.avg_latency * 1000, 2),
+        }
+        if self.in_queue is not None:
+            stats['queue_depth'] = self.in_queue.qsize()
+            stats['dropped'] = self.in_queue.dropped
+        return stats
+
+
+class FramePipeline:
+    """
+    Encadena etapas con colas acotadas entre ellas. El FPS total queda limitado
+    por la etapa más lenta en lugar de por la suma de todas.
+    """
+    def __init__(self, queue_size=1):
+        self.queue_size = queue_size
+        self.stages = []
+
+    def add_stage(self, name, func):
+        """Agrega una etapa conectada a la salida de la anterior."""
+        in_queue = None
+        if self.stages:
+            in_queue = LatestQueue(self.queue_size)
+            self.stages[-1].out_queue = in_queue
+        stage = PipelineStage(name, func, in_queue=in_queue)
+        self.stages.append(stage)
+        return stage
+
+    def set_error_handler(self, handler):
+        for stage in self.stages:
+            stage.on_error = handler
+
+    def set_observer(self, observer):
+        """Registra una función que recibe (etapa, latencia) de cada elemento"""
+        for stage in self.stages:
+            stage.observer = observer
+
+    def start(self):
+        # Arrancar del final hacia el inicio para que nadie produzca sin consumidor
+        for stage in reversed(self.stages):
+            stage.start()
+
+    def stop(self, timeout=5):
+        for stage in self.stages:
+            stage.running = False
+        for stage in self.stages:
+            stage.stop(timeout=timeout)
+
+    def is_running(self):
+        return any(stage.running for stage in self.stages)
+
+    def get_stats(self):
+        """Retorna latencia y profundidad de cola por etapa, y el FPS efectivo."""
+        stats = {stage.name: stage.get_stats() for stage in self.stages}
+        stats['fps'] = round(self.stages[-1].get_fps(), 2) if self.stages else 0.0
+        return stats
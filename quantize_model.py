@@ -0,0 +1,207 @@
+# quantize_model.py - Genera variantes cuantizadas (FP16 / INT8) del modelo y un reporte
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+import config
+from detector import (ExportedBackend, OnnxBackend, box_iou, exported_model_path, export_model,
+                      quantized_model_path)
+
+
+def sample_frames(video_paths, count, step):
+    """Toma hasta `count` frames, uno cada `step`, repartidos entre los videos"""
+    frames = []
+    per_video = max(1, count // max(1, len(video_paths)))
+    for path in video_paths:
+        cap = cv2.VideoCapture(path)
+        index = 0
+        taken = 0
+        while taken < per_video:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % step == 0:
+                frames.append(frame)
+                taken += 1
+            index += 1
+        cap.release()
+    return frames
+
+
+class VideoCalibrationReader:
+    """Alimenta la calibración INT8 de ONNX Runtime con frames de nuestros videos"""
+
+    def __init__(self, frames, input_name, imgsz):
+        self.preprocessor = ExportedBackend(None, imgsz=imgsz)
+        self.input_name = input_name
+        self.frames = iter(frames)
+
+    def get_next(self):
+        frame = next(self.frames, None)
+        if frame is None:
+            return None
+        return {self.input_name: self.preprocessor.preprocess([frame])}
+
+
+def quantize_fp16(onnx_path, output_path):
+    """Convierte los pesos a FP16 manteniendo entradas/salidas en FP32"""
+    import onnx
+    from onnxconverter_common import float16
+
+    model = onnx.load(onnx_path)
+    model_fp16 = float16.convert_float_to_float16(model, keep_io_types=True)
+    onnx.save(model_fp16, output_path)
+    return output_path
+
+
+def quantize_int8(onnx_path, output_path, frames, imgsz):
+    """Cuantización estática INT8 calibrada con frames reales"""
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+    del session
+
+    quantize_static(
+        onnx_path,
+        output_path,
+        VideoCalibrationReader(frames, input_name, imgsz),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    return output_path
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB"""
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def match_count(reference, candidate, iou_threshold=0.5):
+    """Cantidad de cajas de referencia emparejadas (greedy por IoU)"""
+    iou = box_iou(reference, candidate)
+    matched = 0
+    while iou.size and iou.max() >= iou_threshold:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        matched += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return matched
+
+
+def target_boxes(result, class_id, conf):
+    """Cajas de la clase objetivo con confianza suficiente"""
+    boxes = result.boxes
+    mask = (boxes.cls == class_id) & (boxes.conf >= conf)
+    return boxes.xyxy[mask]
+
+
+def evaluate(path, frames, imgsz, reference=None, class_id=None, conf=0.25):
+    """Mide latencia, memoria y acuerdo de la clase objetivo contra la referencia"""
+    memory_before = rss_mb()
+    backend = OnnxBackend(path, imgsz=imgsz, conf=conf)
+    memory = rss_mb() - memory_before
+    if class_id is None:
+        class_id = {name: i for i, name in backend.class_names.items()}.get(config.TARGET_CLASS_NAME, 0)
+
+    backend.predict(frames[:3])  # Calentamiento
+
+    latencies = []
+    heads = []
+    for frame in frames:
+        start = time.perf_counter()
+        result = backend.predict([frame])[0]
+        latencies.append(time.perf_counter() - start)
+        heads.append(target_boxes(result, class_id, conf))
+
+    latencies = np.array(latencies) * 1000
+    report = {
+        'model': path,
+        'size_mb': round(os.path.getsize(path) / 1e6, 2),
+        'load_memory_mb': round(memory, 1),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'head_boxes': int(sum(len(h) for h in heads))
+    }
+
+    if reference is not None:
+        ref_total = sum(len(h) for h in reference)
+        matched = sum(match_count(r, h) for r, h in zip(reference, heads))
+        frame_agreement = np.mean([(len(r) > 0) == (len(h) > 0) for r, h in zip(reference, heads)])
+        report['head_recall_vs_fp32'] = round(matched / ref_total, 4) if ref_total else 1.0
+        report['head_precision_vs_fp32'] = round(matched / report['head_boxes'], 4) if report['head_boxes'] else 1.0
+        report['violation_frame_agreement'] = round(float(frame_agreement), 4)
+
+    return report, heads, class_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera variantes FP16/INT8 del modelo de cascos")
+    parser.add_argument('--model', default=config.MODEL_PATH)
+    parser.add_argument('--videos', nargs='+', default=sorted(set(config.AVAILABLE_VIDEOS)))
+    parser.add_argument('--precisions', nargs='+', default=['fp16', 'int8'], choices=['fp16', 'int8'])
+    parser.add_argument('--calibration-frames', type=int, default=200)
+    parser.add_argument('--eval-frames', type=int, default=200)
+    parser.add_argument('--imgsz', type=int, default=config.INFERENCE_IMGSZ)
+    parser.add_argument('--report', default='quantization_report.json')
+    args = parser.parse_args()
+
+    # Modelo FP32 de referencia en ONNX
+    onnx_path = exported_model_path(args.model, 'onnx')
+    if not os.path.exists(onnx_path):
+        onnx_path = export_model(args.model, 'onnx', imgsz=args.imgsz)
+
+    calibration = sample_frames(args.videos, args.calibration_frames, step=7)
+    evaluation = sample_frames(args.videos, args.eval_frames, step=5)
+    if not calibration or not evaluation:
+        print(f"ERROR: No se pudieron leer frames de: {args.videos}")
+        return
+    print(f"INFO: {len(calibration)} frames de calibración, {len(evaluation)} de evaluación")
+
+    reports = []
+    report, reference, class_id = evaluate(onnx_path, evaluation, args.imgsz)
+    report['precision'] = 'fp32'
+    reports.append(report)
+
+    for precision in args.precisions:
+        output_path = quantized_model_path(args.model, precision)
+        try:
+            print(f"INFO: Generando variante {precision} → {output_path}")
+            if precision == 'fp16':
+                quantize_fp16(onnx_path, output_path)
+            else:
+                quantize_int8(onnx_path, output_path, calibration, args.imgsz)
+            report, _, _ = evaluate(output_path, evaluation, args.imgsz, reference, class_id)
+            report['precision'] = precision
+            reports.append(report)
+        except ImportError as e:
+            print(f"ERROR: La variante {precision} requiere el paquete '{e.name}'; "
+                  f"instálalo con: pip install -r requirements-optional.txt")
+        except Exception as e:
+            print(f"WARN: No se pudo generar la variante {precision}: {e}")
+
+    with open(args.report, 'w', encoding='utf-8') as file:
+        json.dump(reports, file, indent=2)
+
+    print(f"\n{'precisión':<10} {'MB':>7} {'media(ms)':>10} {'p95(ms)':>9} {'recall':>8} {'acuerdo':>8}")
+    for r in reports:
+        print(f"{r['precision']:<10} {r['size_mb']:>7.1f} {r['mean_ms']:>10.1f} {r['p95_ms']:>9.1f} "
+              f"{r.get('head_recall_vs_fp32', 1.0):>8.3f} {r.get('violation_frame_agreement', 1.0):>8.3f}")
+    print(f"\nINFO: Reporte guardado en {args.report}")
+
+
+if __name__ == "__main__":
+    main()
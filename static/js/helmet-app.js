@@ -12,11 +12,25 @@ class HelmetDetectionApp {
         // Intervalos para actualizaciones
         this.updateInterval = null;
         this.logsInterval = null;
+        this.lastLogSeq = null;  // Secuencia del último log recibido
+        this.eventSource = null;
+        this.eventErrors = 0;     // Errores seguidos del canal SSE
+        this.eventsRetryTimeout = null;
+        this.eventsRetryDelay = null;  // Espera actual para reintentar SSE (con backoff)
+        this.status = {};
+        this.streamRetryTimeout = null;
         
         // Configuración
         this.config = {
-            frameUpdateInterval: 100,  // 100ms = 10 FPS
+            streamUrl: '/api/stream',  // Stream MJPEG del video
+            eventsUrl: '/api/events',  // Canal Server-Sent Events
+            statusUpdateInterval: 1000, // 1 segundo
             logsUpdateInterval: 2000,  // 2 segundos
+            maxLogEntries: 100,        // Logs visibles en la lista
+            streamRetryDelay: 2000,    // Reintento del stream tras error
+            maxEventErrors: 3,         // Errores SSE seguidos antes de pasar a consultas periódicas
+            eventsRetryDelay: 5000,    // Primer reintento de SSE en modo consultas
+            eventsRetryMaxDelay: 60000, // Espera máxima entre reintentos de SSE
             buttonCooldown: 1000,      // 1 segundo entre clicks
             notificationDuration: 4000  // 4 segundos
         };
@@ -208,8 +222,8 @@ async changeVideoSource() {
             this.showNotification('Fuente de video cambiada correctamente', 'success');
             this.updateSourceStatus('active', `Activa: ${data.current_source}`);
             
-            // Forzar actualización del frame
-            setTimeout(() => this.updateFrame(), 1000);
+            // Forzar actualización del estado
+            setTimeout(() => this.updateStatus(), 1000);
         } else {
             this.showNotification(`Error: ${data.error}`, 'error');
             this.updateSourceStatus('error', 'Error cambiando fuente');
@@ -344,10 +358,29 @@ async updateCurrentSource() {
         // Detener actualizaciones previas si existen
         this.stopUpdates();
 
-        // Actualizar frames
+        // Conectar stream de video
+        this.startStream();
+
+        // Con SSE el servidor envía solo los cambios; si no, se consulta periódicamente
+        if (window.EventSource) {
+            this.startEvents();
+        } else {
+            this.startPolling();
+        }
+        
+        this.log('Actualizaciones automáticas iniciadas');
+    }
+
+    /**
+     * Consulta estado y logs periódicamente (sin SSE o si el canal falla)
+     */
+    startPolling(immediate = true) {
+        this.stopPolling();
+
+        // Actualizar estado y estadísticas
         this.updateInterval = setInterval(() => {
-            this.updateFrame();
-        }, this.config.frameUpdateInterval);
+            this.updateStatus();
+        }, this.config.statusUpdateInterval);
         
         // Actualizar logs
         this.logsInterval = setInterval(() => {
@@ -355,16 +388,16 @@ async updateCurrentSource() {
         }, this.config.logsUpdateInterval);
         
         // Primera actualización inmediata
-        this.updateFrame();
-        this.updateLogs();
-        
-        this.log('Actualizaciones automáticas iniciadas');
+        if (immediate) {
+            this.updateStatus();
+            this.updateLogs();
+        }
     }
 
     /**
-     * Detiene las actualizaciones automáticas
+     * Detiene las consultas periódicas
      */
-    stopUpdates() {
+    stopPolling() {
         if (this.updateInterval) {
             clearInterval(this.updateInterval);
             this.updateInterval = null;
@@ -376,6 +409,175 @@ async updateCurrentSource() {
         }
     }
 
+    /**
+     * Detiene las actualizaciones automáticas
+     */
+    stopUpdates() {
+        this.stopPolling();
+        this.stopEvents();
+        this.stopStream();
+
+        if (this.eventsRetryTimeout) {
+            clearTimeout(this.eventsRetryTimeout);
+            this.eventsRetryTimeout = null;
+        }
+        this.eventsRetryDelay = null;
+    }
+
+    /**
+     * Se suscribe al canal de eventos del servidor (estado, violaciones y logs)
+     */
+    startEvents() {
+        this.stopEvents();
+
+        const source = new EventSource(this.config.eventsUrl);
+        this.eventSource = source;
+
+        // Estado completo al conectar (y al reconectar)
+        source.addEventListener('hello', (event) => {
+            this.eventErrors = 0;
+            if (this.updateInterval) {
+                // El canal volvió: se dejan las consultas periódicas
+                this.log('Canal de eventos restablecido');
+                this.stopPolling();
+            }
+            this.eventsRetryDelay = null;
+            const data = JSON.parse(event.data);
+            this.status = Object.assign({}, data.status);
+            this.applyStatus(this.status);
+            this.setConnectionStatus(true);
+            // Recuperar logs perdidos mientras no hubo conexión
+            this.updateLogs();
+        });
+
+        // Solo los campos que cambiaron
+        source.addEventListener('stats', (event) => {
+            Object.assign(this.status, JSON.parse(event.data));
+            this.applyStatus(this.status);
+        });
+
+        source.addEventListener('violation', (event) => {
+            const violation = JSON.parse(event.data);
+            if (violation.source === 'main') {
+                this.status.violation = violation.active;
+                this.applyStatus(this.status);
+            }
+        });
+
+        source.addEventListener('log', (event) => {
+            const log = JSON.parse(event.data);
+            if (this.lastLogSeq === null) return;
+            if (log.seq === this.lastLogSeq + 1) {
+                this.appendLogs([log]);
+                this.lastLogSeq = log.seq;
+            } else if (log.seq > this.lastLogSeq) {
+                // Hueco en la secuencia: pedir el delta completo
+                this.updateLogs();
+            }
+        });
+
+        // EventSource reconecta solo; mientras tanto se marca desconectado.
+        // Si falla varias veces seguidas (proxy sin soporte, error del servidor)
+        // se pasa a consultas periódicas y se reintenta SSE cada vez más espaciado
+        source.onerror = () => {
+            if (this.updateInterval) {
+                // Reintento desde el modo consultas: sigue consultando
+                this.stopEvents();
+                this.scheduleEventsRetry();
+                return;
+            }
+            this.setConnectionStatus(false);
+            this.eventErrors += 1;
+            if (this.eventErrors >= this.config.maxEventErrors) {
+                this.log('Canal de eventos no disponible, usando consultas periódicas');
+                this.stopEvents();
+                this.startPolling();
+                this.scheduleEventsRetry();
+            }
+        };
+    }
+
+    /**
+     * Programa un nuevo intento de SSE con espera exponencial
+     */
+    scheduleEventsRetry() {
+        if (this.eventsRetryTimeout) {
+            clearTimeout(this.eventsRetryTimeout);
+        }
+        const delay = this.eventsRetryDelay || this.config.eventsRetryDelay;
+        this.eventsRetryDelay = Math.min(delay * 2, this.config.eventsRetryMaxDelay);
+        this.eventsRetryTimeout = setTimeout(() => {
+            this.eventsRetryTimeout = null;
+            this.startEvents();
+        }, delay);
+    }
+
+    /**
+     * Cierra el canal de eventos
+     */
+    stopEvents() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+    }
+
+    /**
+     * Aplica el estado compacto recibido por eventos
+     */
+    applyStatus(status) {
+        this.isDetectionActive = status.detection_active;
+        this.updateDetectionStatus(status.detection_active, status.violation);
+        this.updateStats(status);
+    }
+
+    /**
+     * Conecta el elemento de video al stream MJPEG del servidor
+     */
+    startStream() {
+        const videoFeed = this.elements.videoFeed;
+        if (!videoFeed) return;
+
+        if (this.streamRetryTimeout) {
+            clearTimeout(this.streamRetryTimeout);
+            this.streamRetryTimeout = null;
+        }
+
+        videoFeed.onload = () => {
+            videoFeed.style.display = 'block';
+            this.elements.videoPlaceholder.style.display = 'none';
+        };
+
+        videoFeed.onerror = () => {
+            videoFeed.style.display = 'none';
+            this.elements.videoPlaceholder.style.display = '';
+            this.setConnectionStatus(false);
+
+            // Reintentar la conexión del stream
+            this.streamRetryTimeout = setTimeout(
+                () => this.startStream(), this.config.streamRetryDelay);
+        };
+
+        // Parámetro para evitar caché al reconectar
+        videoFeed.src = `${this.config.streamUrl}?t=${Date.now()}`;
+    }
+
+    /**
+     * Cierra la conexión del stream MJPEG
+     */
+    stopStream() {
+        if (this.streamRetryTimeout) {
+            clearTimeout(this.streamRetryTimeout);
+            this.streamRetryTimeout = null;
+        }
+
+        const videoFeed = this.elements.videoFeed;
+        if (videoFeed) {
+            videoFeed.onerror = null;
+            videoFeed.removeAttribute('src');
+        }
+    }
+
     /**
      * Pausa las actualizaciones (cuando la página no está visible)
      */
@@ -393,11 +595,11 @@ async updateCurrentSource() {
     }
 
     /**
-     * Actualiza el frame del video
+     * Actualiza el estado de detección y las estadísticas
      */
-    async updateFrame() {
+    async updateStatus() {
         try {
-            const response = await fetch('/api/frame');
+            const response = await fetch('/api/status');
             
             if (!response.ok) {
                 throw new Error(`HTTP ${response.status}: ${response.statusText}`);
@@ -409,27 +611,17 @@ async updateCurrentSource() {
                 throw new Error(data.error);
             }
             
-            if (data.frame) {
-                // Actualizar imagen
-                this.elements.videoFeed.src = `data:image/jpeg;base64,${data.frame}`;
-                this.elements.videoFeed.style.display = 'block';
-                this.elements.videoPlaceholder.style.display = 'none';
-                
-                // Actualizar estados
-                this.isDetectionActive = data.detection_active;
-                this.updateDetectionStatus(data.detection_active, data.violation);
-                
-                // Actualizar estadísticas
-                if (data.stats) {
-                    this.updateStats(data.stats);
-                }
+            if (data.success) {
+                // Mismo estado compacto que publica el canal de eventos
+                this.status = data;
+                this.applyStatus(this.status);
                 
                 // Marcar como conectado
                 this.setConnectionStatus(true);
             }
             
         } catch (error) {
-            console.error('Error actualizando frame:', error);
+            console.error('Error actualizando estado:', error);
             this.setConnectionStatus(false);
             this.handleConnectionError(error);
         }
@@ -440,14 +632,27 @@ async updateCurrentSource() {
      */
     async updateLogs() {
         try {
-            const response = await fetch('/api/logs');
+            // Primera carga: los más recientes; luego solo las entradas nuevas
+            const url = this.lastLogSeq === null
+                ? `/api/logs?limit=${this.config.maxLogEntries}`
+                : `/api/logs?since=${this.lastLogSeq}`;
+            const response = await fetch(url);
             
             if (!response.ok) {
                 throw new Error(`HTTP ${response.status}: ${response.statusText}`);
             }
             
-            const logs = await response.json();
-            this.updateLogsDisplay(logs);
+            const data = await response.json();
+            if (Array.isArray(data)) {
+                this.updateLogsDisplay(data);
+                this.lastLogSeq = data.length ? data[0].seq : 0;
+            } else {
+                if (data.reset) {
+                    this.updateLogsDisplay([]);
+                }
+                this.appendLogs(data.logs);
+                this.lastLogSeq = data.last_seq;
+            }
             
         } catch (error) {
             console.error('Error actualizando logs:', error);
@@ -458,10 +663,14 @@ async updateCurrentSource() {
      * Maneja errores de conexión
      */
     handleConnectionError(error) {
-        // Si hay muchos errores consecutivos, reducir frecuencia de actualizaciones
-        if (!this.isConnected) {
-            this.config.frameUpdateInterval = Math.min(this.config.frameUpdateInterval * 1.5, 5000);
-            this.startUpdates(); // Reiniciar con nueva frecuencia
+        // Si hay muchos errores consecutivos, reducir frecuencia de las consultas
+        // (solo las consultas: el stream y el reintento de SSE siguen su curso)
+        if (!this.isConnected && this.updateInterval) {
+            const interval = Math.min(this.config.statusUpdateInterval * 1.5, 5000);
+            if (interval !== this.config.statusUpdateInterval) {
+                this.config.statusUpdateInterval = interval;
+                this.startPolling(false); // Reiniciar con nueva frecuencia, sin consultar ya
+            }
         }
     }
 
@@ -478,7 +687,7 @@ async updateCurrentSource() {
                 statusEl.innerHTML = '<i class="fas fa-circle"></i> Conectado';
                 
                 // Restaurar frecuencia normal si estaba reducida
-                this.config.frameUpdateInterval = 100;
+                this.config.statusUpdateInterval = 1000;
             } else {
                 statusEl.className = 'connection-status disconnected';
                 statusEl.innerHTML = '<i class="fas fa-circle"></i> Desconectado';
@@ -554,17 +763,41 @@ async updateCurrentSource() {
         
         // Agregar cada log
         logs.forEach(log => {
-            const logElement = document.createElement('div');
-            logElement.className = 'log-entry';
-            logElement.innerHTML = `
-                <span class="log-timestamp">${this.escapeHtml(log.timestamp)}</span>
-                <span class="log-level log-${log.level.toLowerCase()}">${this.escapeHtml(log.level)}</span>
-                <span>${this.escapeHtml(log.message)}</span>
-            `;
-            this.elements.logsContainer.appendChild(logElement);
+            this.elements.logsContainer.appendChild(this.createLogElement(log));
         });
     }
 
+    /**
+     * Agrega logs nuevos (del más antiguo al más nuevo) al inicio de la lista
+     */
+    appendLogs(logs) {
+        const container = this.elements.logsContainer;
+        if (!container || !Array.isArray(logs) || logs.length === 0) return;
+
+        logs.forEach(log => {
+            container.insertBefore(this.createLogElement(log), container.firstChild);
+        });
+
+        // Mantener el límite de entradas visibles
+        while (container.children.length > this.config.maxLogEntries) {
+            container.removeChild(container.lastChild);
+        }
+    }
+
+    /**
+     * Crea el elemento HTML de una entrada de log
+     */
+    createLogElement(log) {
+        const logElement = document.createElement('div');
+        logElement.className = 'log-entry';
+        logElement.innerHTML = `
+            <span class="log-timestamp">${this.escapeHtml(log.timestamp)}</span>
+            <span class="log-level log-${log.level.toLowerCase()}">${this.escapeHtml(log.level)}</span>
+            <span>${this.escapeHtml(log.message)}</span>
+        `;
+        return logElement;
+    }
+
     /**
      * Activa/desactiva la detección
      */
@@ -589,7 +822,7 @@ async updateCurrentSource() {
             this.isDetectionActive = data.detection_active;
             
             // Actualizar inmediatamente
-            this.updateFrame();
+            this.updateStatus();
             
             const status = data.detection_active ? 'activada' : 'desactivada';
             this.showNotification(`Detección ${status} correctamente`, 'success');
@@ -811,11 +1044,12 @@ window.HelmetDetectionAPI = {
     getInstance: () => helmetApp,
     
     /**
-     * Fuerza una actualización del frame
+     * Fuerza una actualización del estado y reconecta el stream
      */
     forceUpdate: () => {
         if (helmetApp) {
-            helmetApp.updateFrame();
+            helmetApp.updateStatus();
+            helmetApp.startStream();
         }
     },
     
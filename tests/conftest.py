@@ -0,0 +1,37 @@
+# conftest.py - Fixtures compartidas de las pruebas
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+
+
+@pytest.fixture
+def web_system(tmp_path, monkeypatch):
+    """
+    WebHelmetSystem real sobre el video de prueba, sin modelo ni Telegram y con
+    todos los archivos de datos dentro de un directorio temporal.
+    """
+    monkeypatch.setattr(config, 'MODEL_PATH', str(tmp_path / 'sin_modelo.onnx'))
+    monkeypatch.setattr(config, 'INFERENCE_BACKEND', 'onnx')
+    monkeypatch.setattr(config, 'BOT_TOKEN', None)
+    monkeypatch.setattr(config, 'USE_WEBCAM', False)
+    monkeypatch.setattr(config, 'VIDEO_PATH', os.path.join(ROOT, 'video_prueba.mp4'))
+    monkeypatch.setattr(config, 'EXTRA_CAMERAS', {})
+    monkeypatch.setattr(config, 'EVENTS_STATS_INTERVAL', 0.1)
+    monkeypatch.setattr(config, 'EVENTS_KEEPALIVE_SECONDS', 1)
+    monkeypatch.setattr(config, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(config, 'INCIDENT_DB_PATH', str(tmp_path / 'incidents.db'))
+    monkeypatch.setattr(config, 'INCIDENT_SNAPSHOT_DIR', str(tmp_path / 'incidents'))
+    monkeypatch.setattr(config, 'CLIP_DIR', str(tmp_path / 'clips'))
+    monkeypatch.setattr(config, 'NOTIFICATION_OUTBOX_DIR', str(tmp_path / 'outbox'))
+
+    import app
+    monkeypatch.setattr(app, 'helmet_system', None)
+    system = app.get_helmet_system()
+    yield system
+    system.stop()
@@ -0,0 +1,31 @@
+# test_clip_recorder.py - Clips MP4 con buffer previo al evento
+import os
+
+import cv2
+import numpy as np
+
+from clip_recorder import ClipRecorder
+
+
+def record(tmp_path, frames):
+    missing = []
+    recorder = ClipRecorder(str(tmp_path / 'clips'), pre_seconds=5, post_seconds=0, on_missing=missing.append)
+    for timestamp, jpeg in enumerate(frames):
+        recorder.add_frame('cam', jpeg, timestamp=100.0 + timestamp)
+    path = recorder.trigger('cam', 'incidente', timestamp=100.0 + len(frames))
+    recorder.close()
+    return recorder, path, missing
+
+
+def test_clip_is_written_and_counted(tmp_path):
+    _, jpeg = cv2.imencode('.jpg', np.zeros((48, 64, 3), dtype=np.uint8))
+    recorder, path, missing = record(tmp_path, [jpeg.tobytes()] * 5)
+    assert os.path.exists(path) and missing == []
+    assert recorder.stats['clips_written'] == 1
+
+
+def test_clip_without_decodable_frames_is_reported_missing(tmp_path):
+    recorder, path, missing = record(tmp_path, [b'no es un jpeg'] * 3)
+    assert not os.path.exists(path)
+    assert missing == [path]
+    assert recorder.stats['clips_written'] == 0 and recorder.stats['clips_empty'] == 1
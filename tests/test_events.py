@@ -0,0 +1,56 @@
+# test_events.py - Canal Server-Sent Events (/api/events)
+import json
+import time
+
+import app
+
+
+def read_events(response, wanted, timeout=10):
+    """Lee el stream SSE hasta ver todos los eventos de `wanted`; retorna {evento: data}"""
+    events = {}
+    buffer = ''
+    deadline = time.time() + timeout
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while '\n\n' in buffer:
+            message, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in message.splitlines() if not line.startswith(':'))
+            if 'event' in fields:
+                events.setdefault(fields['event'], json.loads(fields['data']))
+        if wanted <= events.keys() or time.time() > deadline:
+            break
+    return events
+
+
+def test_events_stream_sends_hello_and_stats(web_system):
+    client = app.app.test_client()
+    response = client.get('/api/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+
+    # Un cambio de estado después de conectar debe llegar como delta 'stats'
+    web_system.is_detection_active = True
+    events = read_events(response, {'hello', 'stats'})
+    response.close()
+
+    assert 'hello' in events
+    assert set(events['hello']['status']) >= {'detection_active', 'violation', 'camera_active'}
+    assert isinstance(events['hello']['last_log_seq'], int)
+    assert 'stats' in events
+    assert events['stats'].get('detection_active') is True
+
+
+def test_get_status_reports_frame_store_violation(web_system):
+    web_system.frame_store.publish(None, b'jpeg', True)
+    assert web_system.get_status()['violation'] is True
+
+
+def test_stop_ends_the_events_thread(web_system):
+    assert web_system.events_thread.is_alive()
+    web_system.stop()
+    assert not web_system.events_thread.is_alive()
+
+
+def test_api_status_returns_the_compact_status(web_system):
+    data = app.app.test_client().get('/api/status').get_json()
+    assert data.pop('success') is True
+    assert data.keys() == web_system.get_status().keys()
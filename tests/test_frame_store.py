@@ -0,0 +1,53 @@
+# test_frame_store.py - Anillo de buffers de FrameStore
+import numpy as np
+
+from frame_store import FrameStore
+
+SHAPE = (4, 4, 3)
+
+
+def test_consecutive_acquires_return_distinct_buffers():
+    store = FrameStore()
+    first = store.acquire(SHAPE)
+    second = store.acquire(SHAPE)
+    assert first is not second
+
+
+def test_buffer_in_flight_is_not_reused_until_published():
+    store = FrameStore(num_buffers=2)
+    acquired = [store.acquire(SHAPE) for _ in range(5)]
+    # Más frames en vuelo que buffers iniciales: ninguno se repite
+    assert len({id(buffer) for buffer in acquired}) == 5
+
+
+def test_published_buffer_is_never_handed_out():
+    store = FrameStore()
+    frame = store.acquire(SHAPE)
+    frame[:] = 7
+    store.publish(frame, b'jpeg')
+    for _ in range(10):
+        buffer = store.acquire(SHAPE)
+        assert buffer is not frame
+        store.publish(buffer, b'jpeg')
+        frame = buffer
+
+
+def test_dropped_frames_are_recycled_after_a_later_publish():
+    store = FrameStore(num_buffers=4, max_buffers=4)
+    dropped = store.acquire(SHAPE)          # Descartado en una cola intermedia
+    published = store.acquire(SHAPE)
+    store.publish(published, b'jpeg')
+    # Sin crecer el anillo, el descartado vuelve a estar disponible
+    handed_out = {id(store.acquire(SHAPE)) for _ in range(3)}
+    assert id(dropped) in handed_out
+    assert id(published) not in handed_out
+
+
+def test_get_frame_returns_published_content():
+    store = FrameStore()
+    frame = store.acquire(SHAPE)
+    frame[:] = 3
+    store.publish(frame, b'jpeg', violation=True)
+    seq, copy, violation = store.get_frame()
+    assert seq == 1 and violation is True
+    assert np.array_equal(copy, np.full(SHAPE, 3, dtype=np.uint8))
@@ -0,0 +1,75 @@
+# test_incidents.py - Seguimiento de violaciones e historial de incidentes
+import numpy as np
+
+from incident_store import IncidentStore
+from violation_tracker import ViolationTracker
+
+BOX = [10, 10, 50, 50]
+
+
+def test_frame_is_copied_only_for_confirmed_tracks():
+    tracker = ViolationTracker(min_hits=3)
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+
+    started, _, _ = tracker.update('cam', [BOX], [0.5], 0.0, frame)
+    tracker.update('cam', [BOX], [0.9], 0.1, frame)
+    track = started[0]
+    assert track.best_frame is None  # Aún sin confirmar: sin copias
+
+    frame[:] = 3
+    tracker.update('cam', [BOX], [0.6], 0.2, frame)
+    assert track.best_frame is not None and track.best_frame is not frame
+    assert (track.best_frame == 3).all()
+
+    # Con confianza menor que la máxima no se vuelve a copiar
+    frame[:] = 4
+    tracker.update('cam', [BOX], [0.7], 0.3, frame)
+    assert (track.best_frame == 3).all()
+
+
+def test_tracks_share_one_copy_per_frame():
+    tracker = ViolationTracker(min_hits=1)
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    started, _, _ = tracker.update('cam', [BOX, [100, 100, 140, 140]], [0.5, 0.6], 0.0, frame)
+    assert started[0].best_frame is started[1].best_frame is not frame
+
+
+def test_query_by_start_bounds_start_time(tmp_path):
+    store = IncidentStore(str(tmp_path / 'incidents.db'), snapshot_dir=None)
+    tracker = ViolationTracker(min_hits=1, max_age=0)
+    try:
+        # Incidente largo [100, 200], uno corto [300, 301] y uno abierto desde 400
+        long_track = tracker.update('cam', [BOX], [0.9], 100.0)[0][0]
+        store.record_start(long_track)
+        long_track.last_seen = 200.0
+        store.record_end(long_track)
+        short = tracker.update('otra', [BOX], [0.9], 300.0)[0][0]
+        store.record_start(short)
+        short.last_seen = 301.0
+        store.record_end(short)
+        still_open = tracker.update('tercera', [BOX], [0.9], 400.0)[0][0]
+        store.record_start(still_open)
+        store.flush()
+
+        assert [i['id'] for i in store.query(start=150)] == [still_open.id, short.id, long_track.id]
+        assert [i['id'] for i in store.query(start=250)] == [still_open.id, short.id]
+        assert [i['id'] for i in store.query(start=350, end=500)] == [still_open.id]
+        assert [i['id'] for i in store.query(start=1000)] == [still_open.id]
+
+        plan = store.conn.execute('EXPLAIN QUERY PLAN SELECT id FROM incidents WHERE start_time >= ? '
+                                  'AND (end_time IS NULL OR end_time >= ?)', (0, 0)).fetchall()
+        assert 'idx_incidents_start' in str(plan)
+    finally:
+        store.close()
+
+
+def test_clear_clip_removes_missing_clip_path(tmp_path):
+    store = IncidentStore(str(tmp_path / 'datos' / 'incidents.db'), snapshot_dir=None)
+    try:
+        track = ViolationTracker(min_hits=1).update('cam', [BOX], [0.9], 0.0)[0][0]
+        store.record_start(track, clip='clips/incidente.mp4')
+        store.clear_clip('clips/incidente.mp4')
+        store.flush()
+        assert store.get(track.id)['clip'] is None
+    finally:
+        store.close()
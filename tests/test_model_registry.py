@@ -0,0 +1,83 @@
+# test_model_registry.py - Carga compartida y liberación de modelos
+import threading
+import time
+
+import pytest
+
+import detector
+from detector import ModelRegistry
+
+
+class FakeBackend:
+    name = 'fake'
+    class_names = {0: 'head', 1: 'helmet'}
+
+    def __init__(self, model_path, **kwargs):
+        self.model_path = model_path
+        self.kwargs = kwargs
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    loads = []
+
+    def create_backend(model_path, backend='pytorch', imgsz=640, **kwargs):
+        loads.append(model_path)
+        time.sleep(0.2)
+        return FakeBackend(model_path, **kwargs)
+
+    monkeypatch.setattr(detector, 'create_backend', create_backend)
+    ModelRegistry.clear()
+    yield loads
+    ModelRegistry.clear()
+
+
+def test_same_key_is_loaded_once_and_released(registry):
+    first = ModelRegistry.get('a.onnx', 'onnx')
+    second = ModelRegistry.get('a.onnx', 'onnx')
+    assert first is second and registry == ['a.onnx']
+    assert list(ModelRegistry.get_stats().values()) == [2]
+
+    ModelRegistry.release(first)
+    assert list(ModelRegistry.get_stats().values()) == [1]
+    ModelRegistry.release(second)
+    assert ModelRegistry.get_stats() == {}
+
+
+def test_backend_options_are_part_of_the_key(registry):
+    plain = ModelRegistry.get('a.onnx', 'onnx', mmap_weights=False)
+    mapped = ModelRegistry.get('a.onnx', 'onnx', mmap_weights=True)
+    threaded = ModelRegistry.get('a.onnx', 'onnx', mmap_weights=True, threads=2)
+    assert len({id(plain), id(mapped), id(threaded)}) == 3
+
+
+def test_different_models_load_concurrently(registry):
+    threads = [threading.Thread(target=ModelRegistry.get, args=(name, 'onnx')) for name in ('a.onnx', 'b.onnx')]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Cada carga tarda 0.2 s: en paralelo no llegan a sumar 0.4 s
+    assert time.perf_counter() - start < 0.35
+    assert sorted(registry) == ['a.onnx', 'b.onnx']
+
+
+def test_detector_close_releases_its_model(registry):
+    first = detector.HelmetDetector('a.onnx', backend='onnx')
+    second = detector.HelmetDetector('a.onnx', backend='onnx')
+    first.close()
+    assert first.backend is None and list(ModelRegistry.get_stats().values()) == [1]
+    second.close()
+    second.close()
+    assert ModelRegistry.get_stats() == {}
+
+
+def test_pytorch_models_are_shared_across_input_sizes(registry):
+    small = ModelRegistry.get('a.pt', 'pytorch', imgsz=320)
+    large = ModelRegistry.get('a.pt', 'pytorch', imgsz=640)
+    assert small is large and registry == ['a.pt']
+
+    # Los exportados tienen forma de entrada fija: uno por tamaño
+    exported = {id(ModelRegistry.get('a.onnx', 'onnx', imgsz=size)) for size in (320, 640)}
+    assert len(exported) == 2
@@ -0,0 +1,196 @@
+# test_notifier.py - Entrega de alertas contra la Bot API falsa (fake_bot_api.py)
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from fake_bot_api import FakeBotAPI
+from notifier import TelegramNotifier
+from outbox import NotificationOutbox
+
+
+@pytest.fixture
+def api():
+    server = FakeBotAPI(port=0).start()
+    yield server
+    server.stop()
+
+
+def make_notifier(api, directory):
+    return TelegramNotifier('123:test', '1', coalesce=False, base_url=api.base_url,
+                            outbox=NotificationOutbox(str(directory)), retry_base=0.2, retry_max=0.5)
+
+
+def make_alert():
+    frame = np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8)
+    _, encoded = cv2.imencode('.jpg', frame)
+    return frame, encoded.tobytes()
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_alert_is_delivered_with_crops_as_media_group(api, tmp_path):
+    notifier = make_notifier(api, tmp_path / 'outbox')
+    frame, jpeg = make_alert()
+    try:
+        with_crops = notifier.send_alert(frame, jpeg=jpeg, boxes=[[20, 20, 80, 120]])
+        assert with_crops.result(timeout=10) is True
+        single = notifier.send_alert(frame, jpeg=jpeg)
+        assert single.result(timeout=10) is True
+    finally:
+        notifier.close()
+
+    # Vista completa + recorte en un solo mensaje; sin cajas, una foto
+    assert api.count('sendMediaGroup') == 1
+    assert api.count('sendPhoto') == 1
+    assert notifier.outbox.pending() == 0
+    assert notifier.get_stats()['sent'] == 2
+
+
+def test_alerts_from_an_outage_are_retried_from_the_outbox(api, tmp_path):
+    notifier = make_notifier(api, tmp_path / 'outbox')
+    frame, jpeg = make_alert()
+    api.down = True
+    try:
+        futures = [notifier.send_alert(frame, jpeg=jpeg) for _ in range(3)]
+        assert wait_until(lambda: notifier.outbox.pending() == 3 and notifier.stats['retried'] > 0)
+        assert not any(future.done() for future in futures)
+
+        api.down = False
+        assert [future.result(timeout=10) for future in futures] == [True] * 3
+    finally:
+        notifier.close()
+
+    # Lo atrasado sale en un solo media group, no en tres mensajes
+    assert api.count('sendMediaGroup') == 1
+    assert api.count('sendPhoto') == 0
+    assert notifier.outbox.pending() == 0
+
+
+def test_outbox_survives_a_restart(api, tmp_path):
+    frame, jpeg = make_alert()
+    api.down = True
+    first = make_notifier(api, tmp_path / 'outbox')
+    try:
+        first.send_alert(frame, jpeg=jpeg)
+        first.send_alert(frame, jpeg=jpeg)
+        assert wait_until(lambda: first.outbox.pending() == 2)
+    finally:
+        first.close()
+
+    api.down = False
+    second = make_notifier(api, tmp_path / 'outbox')
+    try:
+        assert second.outbox.pending() == 2
+        second.start()
+        assert wait_until(lambda: second.outbox.pending() == 0)
+    finally:
+        second.close()
+    assert api.count('sendMediaGroup') == 1
+
+
+def make_direct_notifier(api, **kwargs):
+    """Notificador sin outbox: cada alerta se envía directamente desde la cola"""
+    return TelegramNotifier('123:test', '1', base_url=api.base_url, **kwargs)
+
+
+def start_busy(notifier, frame, jpeg):
+    """Envía una alerta y espera a que el trabajador la tome (la Bot API responde lento)"""
+    future = notifier.send_alert(frame, jpeg=jpeg)
+    assert wait_until(lambda: notifier.pending() == 0)
+    return future
+
+
+def test_direct_send_reports_delivery_result(api):
+    notifier = make_direct_notifier(api)
+    frame, jpeg = make_alert()
+    try:
+        assert notifier.send_alert(frame, jpeg=jpeg).result(timeout=10) is True
+        api.down = True
+        assert notifier.send_alert(frame, jpeg=jpeg).result(timeout=10) is False
+    finally:
+        notifier.close()
+    assert notifier.stats['sent'] == 1 and notifier.stats['failed'] == 1
+    assert notifier.last_error
+
+
+def test_full_queue_drops_oldest_alert(api):
+    notifier = make_direct_notifier(api, queue_size=2, coalesce=False)
+    frame, jpeg = make_alert()
+    api.latency = 0.3
+    try:
+        busy = start_busy(notifier, frame, jpeg)
+        oldest, middle, newest = (notifier.send_alert(frame, jpeg=jpeg) for _ in range(3))
+        assert oldest.result(timeout=1) is False  # Desplazada por la más nueva
+        assert [f.result(timeout=10) for f in (busy, middle, newest)] == [True] * 3
+    finally:
+        notifier.close()
+    assert notifier.stats['dropped'] == 1
+    assert api.count('sendPhoto') == 3
+
+
+def test_full_queue_rejects_new_alert_with_drop_new(api):
+    notifier = make_direct_notifier(api, queue_size=1, coalesce=False, drop_policy=TelegramNotifier.DROP_NEW)
+    frame, jpeg = make_alert()
+    api.latency = 0.3
+    try:
+        busy = start_busy(notifier, frame, jpeg)
+        queued = notifier.send_alert(frame, jpeg=jpeg)
+        assert notifier.send_alert(frame, jpeg=jpeg) is None
+        assert busy.result(timeout=10) is True and queued.result(timeout=10) is True
+    finally:
+        notifier.close()
+    assert notifier.stats['dropped'] == 1
+
+
+def test_pending_alerts_for_the_same_chat_are_coalesced(api):
+    notifier = make_direct_notifier(api, coalesce=True)
+    frame, jpeg = make_alert()
+    api.latency = 0.3
+    try:
+        busy = start_busy(notifier, frame, jpeg)
+        burst = [notifier.send_alert(frame, jpeg=jpeg) for _ in range(3)]
+        assert notifier.pending() == 1
+        assert [f.result(timeout=10) for f in [busy] + burst] == [True] * 4
+    finally:
+        notifier.close()
+    # Una foto por la alerta en curso y una sola para la ráfaga
+    assert api.count('sendPhoto') == 2
+    assert notifier.stats['coalesced'] == 2
+
+
+def test_notify_benchmark_throughput_and_cleanup(tmp_path, monkeypatch):
+    import tempfile
+    from argparse import Namespace
+
+    import benchmark_pipeline
+
+    directories = []
+    make_directory = tempfile.mkdtemp
+
+    def mkdtemp(**kwargs):
+        directories.append(make_directory(dir=str(tmp_path), **kwargs))
+        return directories[-1]
+
+    monkeypatch.setattr(tempfile, 'mkdtemp', mkdtemp)
+    report = benchmark_pipeline.run_notify_test(Namespace(bot_latency=0.01, notify_alerts=20, outage_seconds=0.5))
+
+    # Con 10 ms por petición el trabajador no debería bajar de 10 alertas/s
+    assert report['online']['delivered'] == 20 and report['online']['alerts_per_s'] > 10
+    # Lo acumulado en el corte se vacía en lotes, no una petición por alerta
+    assert report['outage']['delivered'] == 20
+    assert report['outage']['requests'] < report['outage']['persisted']
+    assert directories and not any(os.path.exists(path) for path in directories)
+
+    # Una caída de throughput respecto al baseline cuenta como regresión
+    slower = {'notifier': {'online': {'alerts_per_s': report['online']['alerts_per_s'] * 0.5}}}
+    assert benchmark_pipeline.compare(slower, {'notifier': report}, 0.15)
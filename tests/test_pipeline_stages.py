@@ -0,0 +1,112 @@
+# test_pipeline_stages.py - Dibujo de detecciones y codificación bajo demanda
+import numpy as np
+
+import detector
+from detector import Detections, ModelRegistry
+
+
+class FakeBackend:
+    name = 'fake'
+    class_names = {0: 'head', 1: 'helmet'}
+
+
+def make_detector(monkeypatch):
+    monkeypatch.setattr(ModelRegistry, 'get', classmethod(lambda cls, *args, **kwargs: FakeBackend()))
+    monkeypatch.setattr(ModelRegistry, 'release', classmethod(lambda cls, instance: None))
+    return detector.HelmetDetector('modelo.onnx', backend='onnx')
+
+
+def make_results(frame):
+    xyxy = np.array([[10, 10, 50, 50]], dtype=np.float32)
+    return [Detections(frame, xyxy, np.array([0.9], dtype=np.float32), np.array([0]))]
+
+
+def test_draw_detections_does_not_modify_the_original(monkeypatch):
+    helmet_detector = make_detector(monkeypatch)
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+
+    annotated = helmet_detector.draw_detections(make_results(frame))
+    assert annotated is not frame and annotated.any()
+    assert not frame.any()
+
+    out = np.empty_like(frame)
+    assert helmet_detector.draw_detections(make_results(frame), frame, out=out) is out
+    assert not frame.any()
+
+
+def test_draw_detections_in_place_with_out_frame(monkeypatch):
+    helmet_detector = make_detector(monkeypatch)
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    assert helmet_detector.draw_detections(make_results(frame), frame, out=frame) is frame
+    assert frame.any()
+
+
+def make_packet(captured_at=0.0, results=False):
+    frame = np.full((48, 64, 3), 128, dtype=np.uint8)
+    return {'frame': frame, 'violation': False, 'violation_info': None, 'fresh': False,
+            'results': make_results(frame) if results else None, 'captured_at': captured_at, 'index': 0}
+
+
+def run_stages(system, packet):
+    return system.encode_stage(system.annotation_stage(packet))
+
+
+def test_encode_stage_skips_jpeg_without_consumers(web_system):
+    if web_system.clips:
+        web_system.clips.close()
+        web_system.clips = None
+    web_system.last_viewed = 0
+    skipped = web_system.stats['frames_not_encoded']
+
+    run_stages(web_system, make_packet())
+    assert web_system.stats['frames_not_encoded'] > skipped
+
+    web_system.mark_viewed()
+    run_stages(web_system, make_packet())
+    _, jpeg, _ = web_system.frame_store.get_jpeg()
+    assert jpeg is not None and jpeg[:2] == b'\xff\xd8'
+
+
+def test_clip_buffer_gets_annotated_frames_at_its_own_rate(web_system, monkeypatch):
+    web_system.detector = make_detector(monkeypatch)
+    web_system.clips.frame_interval = 0.1
+    web_system.last_viewed = 0
+    skipped = web_system.stats['frames_not_encoded']
+
+    # Sin espectadores: el frame que entra al buffer se anota y codifica
+    first = run_stages(web_system, make_packet(100.0, results=True))
+    assert first['clip'] and first['annotated'] is not first['frame']
+    assert web_system.clips.get_stats()['buffered_frames'] == {'main': 1}
+
+    # El siguiente llega antes del intervalo del buffer: ni anotación ni JPEG
+    second = run_stages(web_system, make_packet(100.05, results=True))
+    assert not second['clip'] and second['annotated'] is second['frame']
+    assert web_system.stats['frames_not_encoded'] == skipped + 1
+
+    third = run_stages(web_system, make_packet(100.1, results=True))
+    assert third['clip'] and web_system.clips.get_stats()['buffered_frames'] == {'main': 2}
+
+
+def test_violations_are_counted_on_the_rising_edge(web_system):
+    before = web_system.stats['violations_detected']
+    # Una violación que dura varios frames cuenta una vez
+    assert web_system.publish_violation_state('prueba', True) is True
+    assert web_system.publish_violation_state('prueba', True) is False
+    assert web_system.publish_violation_state('prueba', True) is False
+    web_system.publish_violation_state('prueba', False)
+    web_system.publish_violation_state('prueba', True)
+    assert web_system.stats['violations_detected'] - before == 2
+
+
+def test_dispatch_buffers_clip_frames_by_capture_time(web_system, monkeypatch):
+    import app
+    web_system.detector = make_detector(monkeypatch)
+    web_system.clips.frame_interval = 0.1
+    scheduler = app.MultiSourceScheduler(web_system, max_batch_size=2)
+    camera = app.CameraSource('cam2', 'sin_abrir.mp4')
+    frame = np.full((48, 64, 3), 128, dtype=np.uint8)
+
+    # Los frames llegan juntos pero se capturaron con 0.1 s de diferencia
+    for captured_at in (100.0, 100.05, 100.1):
+        scheduler.dispatch(camera, make_results(frame), captured_at)
+    assert web_system.clips.get_stats()['buffered_frames'] == {'cam2': 2}
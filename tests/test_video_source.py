@@ -0,0 +1,80 @@
+# test_video_source.py - Lectura con prefetch y fin de stream
+import os
+import threading
+import time
+
+import cv2
+
+from video_source import FrameReader, VideoSource
+
+VIDEO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'video_prueba.mp4')
+
+
+class StalledCamera:
+    """Cámara en vivo que no entrega frames (red lenta, USB trabado)"""
+    def grab(self):
+        time.sleep(0.01)
+        return False
+
+    def retrieve(self):
+        return False, None
+
+
+class BlockedCamera:
+    """Cámara cuyo grab() queda bloqueado hasta `unblock` (driver colgado)"""
+    def __init__(self):
+        self.unblock = threading.Event()
+        self.in_grab = threading.Event()
+        self.released = False
+
+    def grab(self):
+        assert not self.released, "grab() sobre una captura liberada"
+        self.in_grab.set()
+        self.unblock.wait(5)
+        return False
+
+    def retrieve(self):
+        return False, None
+
+    def release(self):
+        self.released = True
+
+
+def test_live_source_timeout_is_not_end_of_stream():
+    reader = FrameReader(StalledCamera(), is_file=False, prefetch=4)
+    try:
+        assert reader.read(timeout=0.1) == (None, 0)
+        assert not reader.ended
+    finally:
+        reader.stop()
+
+
+def test_file_without_loop_ends_after_last_frame():
+    total = int(cv2.VideoCapture(VIDEO).get(cv2.CAP_PROP_FRAME_COUNT))
+    video = VideoSource(prefetch=4, loop=False)
+    video.open(VIDEO)
+    frames = 0
+    try:
+        while True:
+            ret, _ = video.read()
+            if ret:
+                frames += 1
+            elif video.ended():
+                break
+    finally:
+        video.release()
+    assert frames == total
+
+
+def test_capture_is_released_only_after_the_reader_exits():
+    camera = BlockedCamera()
+    reader = FrameReader(camera, is_file=False, prefetch=1)
+    assert camera.in_grab.wait(1)
+
+    # El hilo sigue dentro de grab(): no se puede liberar todavía
+    reader.stop(timeout=0.1, release=True)
+    assert reader.thread.is_alive() and not camera.released
+
+    camera.unblock.set()
+    reader.thread.join(timeout=2)
+    assert camera.released
@@ -0,0 +1,235 @@
+# video_source.py - Fuente de captura de video intercambiable en caliente
+import queue
+import threading
+import time
+
+import cv2
+
+from pipeline import LatestQueue
+
+
+class FrameReader:
+    """
+    Decodifica en un hilo propio hacia una cola acotada, para que la decodificación
+    se solape con la inferencia. En archivos la cola bloquea (no se pierden
+    frames y se respeta el orden) y al llegar al final se rebobina sin cortar;
+    en cámaras y streams se conserva solo lo más reciente.
+
+    Cada elemento de la cola es (frame, avance), donde avance es la cantidad de
+    frames de la fuente que representa (más de 1 si se saltaron con grab()).
+    """
+    def __init__(self, cap, is_file, prefetch, loop=True, stride=None):
+        self.cap = cap
+        self.is_file = is_file
+        self.loop = loop
+        self.stride = stride or (lambda: 1)
+        self.queue = queue.Queue(maxsize=max(1, prefetch)) if is_file else LatestQueue(1)
+        self.stopped = threading.Event()
+        self.ended = False
+        # La captura se libera solo cuando el hilo ya no la usa
+        self.release_lock = threading.Lock()
+        self.release_cap = False
+        self.released = False
+        self.rewinds = 0
+        self.thread = threading.Thread(target=self._run, name="video-reader", daemon=True)
+        self.thread.start()
+
+    def _next(self):
+        """Avanza la captura; con stride > 1 los frames intermedios solo se hacen grab()"""
+        advance = 0
+        for _ in range(max(1, self.stride()) - 1):
+            if not self.cap.grab():
+                return None, advance
+            advance += 1
+        if not self.cap.grab():
+            return None, advance
+        ret, frame = self.cap.retrieve()
+        return (frame if ret else None), advance + 1
+
+    def _run(self):
+        try:
+            self._read_loop()
+        finally:
+            with self.release_lock:
+                if self.release_cap:
+                    self._release()
+
+    def _release(self):
+        if not self.released:
+            self.released = True
+            self.cap.release()
+
+    def _read_loop(self):
+        failures = 0
+        pending = 0  # Frames salteados antes de un rebobinado
+        while not self.stopped.is_set():
+            frame, advance = self._next()
+            pending += advance
+            if frame is None:
+                if self.is_file and self.loop and failures < 2:
+                    # Rebobinar y seguir leyendo sin devolver un fallo al consumidor
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.rewinds += 1
+                    failures += 1
+                    continue
+                if self.is_file:
+                    self.ended = True
+                    break
+                failures += 1
+                time.sleep(min(0.5, 0.01 * failures))
+                continue
+
+            failures = 0
+            item = (frame, max(1, pending))
+            pending = 0
+            if not self.is_file:
+                self.queue.put(item)
+                continue
+            while not self.stopped.is_set():
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def read(self, timeout=1.0):
+        """Retorna (frame, avance) o (None, 0) si no hubo frame a tiempo"""
+        if self.is_file:
+            try:
+                return self.queue.get(timeout=timeout if not self.ended else 0.01)
+            except queue.Empty:
+                return None, 0
+        item = self.queue.get(timeout=timeout)
+        return item if item is not None else (None, 0)
+
+    def stop(self, timeout=2, release=False):
+        """
+        Detiene el hilo lector. Con `release` también libera la captura: aquí
+        si el hilo terminó a tiempo, o el propio hilo al salir si sigue dentro
+        de grab()/retrieve() (liberarla antes sería usarla después de liberada).
+        """
+        with self.release_lock:
+            self.release_cap = self.release_cap or release
+        self.stopped.set()
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        if release:
+            with self.release_lock:
+                if not self.thread.is_alive():
+                    self._release()
+
+
+class VideoSource:
+    """
+    Envuelve un cv2.VideoCapture separado del detector y del notificador.
+    Cambiar de fuente abre la nueva captura primero y solo entonces reemplaza
+    la anterior, por lo que un cambio fallido deja la fuente actual intacta.
+
+    Con `prefetch` > 0 la decodificación corre en un FrameReader en segundo
+    plano. `decode_stride` permite decodificar solo 1 de cada N frames (los
+    demás se avanzan con grab(), sin decodificar la imagen).
+    """
+    def __init__(self, webcam_width=640, webcam_height=480, webcam_fps=30, prefetch=0, loop=True):
+        self.webcam_width = webcam_width
+        self.webcam_height = webcam_height
+        self.webcam_fps = webcam_fps
+        self.prefetch = prefetch
+        self.loop = loop
+
+        self.cap = None
+        self.reader = None
+        self.source = None
+        self.is_file = False
+        self.frame_interval = 1 / 30
+        self.decode_stride = 1
+        self.last_advance = 1   # Frames de la fuente que representó la última lectura
+        self.eof = False
+        self.generation = 0  # Se incrementa en cada cambio de fuente
+        self.lock = threading.Lock()
+
+    def open(self, source):
+        """Abre `source` (índice de webcam, ruta o URL) y reemplaza la captura actual"""
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            cap.release()
+            raise Exception(f"No se pudo abrir la fuente de video: {source}")
+
+        is_file = isinstance(source, str) and not source.lower().startswith(('rtsp://', 'http://', 'https://'))
+        frame_interval = 1 / 30
+
+        # Configurar propiedades de la cámara
+        if isinstance(source, int):
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.webcam_width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.webcam_height)
+            cap.set(cv2.CAP_PROP_FPS, self.webcam_fps)
+        elif is_file:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_interval = 1 / fps if fps and fps > 0 else 1 / 30
+
+        reader = None
+        if self.prefetch > 0:
+            reader = FrameReader(cap, is_file, self.prefetch, loop=self.loop, stride=lambda: self.decode_stride)
+
+        with self.lock:
+            old_cap, old_reader = self.cap, self.reader
+            self.cap = cap
+            self.reader = reader
+            self.source = source
+            self.is_file = is_file
+            self.frame_interval = frame_interval
+            self.eof = False
+            self.generation += 1
+
+        if old_reader:
+            old_reader.stop(release=True)
+        elif old_cap:
+            old_cap.release()
+        return True
+
+    def read(self):
+        """Lee un frame; en archivos, al llegar al final vuelve al inicio"""
+        reader = self.reader
+        if reader:
+            frame, advance = reader.read()
+            if frame is None:
+                return False, None
+            self.last_advance = advance
+            return True, frame
+
+        with self.lock:
+            if not self.cap:
+                return False, None
+            advance = 0
+            for _ in range(max(1, self.decode_stride) - 1):
+                if not self.cap.grab():
+                    break
+                advance += 1
+            ret, frame = self.cap.read()
+            if not ret and self.is_file:
+                if self.loop:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                else:
+                    self.eof = True
+            self.last_advance = advance + 1
+            return ret, frame
+
+    def ended(self):
+        """True si una fuente de archivo sin bucle llegó al final"""
+        reader = self.reader
+        if reader:
+            return reader.ended and reader.queue.empty()
+        return self.eof
+
+    def is_opened(self):
+        with self.lock:
+            return self.cap is not None and self.cap.isOpened()
+
+    def release(self):
+        with self.lock:
+            reader, cap = self.reader, self.cap
+            self.reader = None
+            self.cap = None
+        if reader:
+            reader.stop(release=True)
+        elif cap:
+            cap.release()
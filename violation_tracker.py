@@ -0,0 +1,200 @@
+# violation_tracker.py - Confirmación temporal y seguimiento de violaciones entre frames
+import itertools
+
+import numpy as np
+
+from detector import box_iou
+
+
+class ViolationDebouncer:
+    """
+    Confirmación k-de-n por fuente: una violación se considera real cuando en
+    los últimos `window` frames analizados hubo al menos `min_hits` con
+    violación y la suma de sus confianzas llega a `min_score`. Un falso
+    positivo de un solo frame (o varios de baja confianza) no dispara alertas.
+    Cada fuente guarda solo un array fijo de `window` confianzas.
+    """
+    def __init__(self, window=5, min_hits=3, min_score=1.5):
+        self.window = max(1, window)
+        self.min_hits = min(max(1, min_hits), self.window)
+        self.min_score = min_score
+        self.sources = {}  # fuente -> [array de confianzas, posición, confirmada]
+
+    def update(self, source_id, conf):
+        """Registra la confianza máxima en violación de un frame (0 si no hubo); retorna si está confirmada"""
+        state = self.sources.get(source_id)
+        if state is None:
+            state = self.sources[source_id] = [np.zeros(self.window, dtype=np.float32), 0, False]
+        scores = state[0]
+        scores[state[1]] = conf
+        state[1] = (state[1] + 1) % self.window
+        state[2] = bool(np.count_nonzero(scores) >= self.min_hits and scores.sum() >= self.min_score)
+        return state[2]
+
+    def is_confirmed(self, source_id):
+        state = self.sources.get(source_id)
+        return state[2] if state else False
+
+    def reset(self, source_id=None):
+        if source_id is None:
+            self.sources.clear()
+        else:
+            self.sources.pop(source_id, None)
+
+    def get_stats(self):
+        return {
+            'window': self.window,
+            'min_hits': self.min_hits,
+            'min_score': self.min_score,
+            'sources': {str(source): {'hits': int(np.count_nonzero(state[0])),
+                                      'score': round(float(state[0].sum()), 3),
+                                      'confirmed': state[2]}
+                        for source, state in list(self.sources.items())}
+        }
+
+
+class Track:
+    """Una persona sin casco seguida a lo largo de varios frames"""
+    def __init__(self, track_id, source_id, box, conf, now):
+        self.id = track_id
+        self.source_id = source_id
+        self.box = box
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+        self.max_conf = conf
+        self.best_box = box
+        self.best_frame = None   # Copia del frame con mayor confianza (solo tracks confirmados)
+        self.last_alert = None
+        self.alerts = 0
+
+    def to_dict(self):
+        return {
+            'track_id': self.id,
+            'source': str(self.source_id),
+            'start_time': self.first_seen,
+            'end_time': self.last_seen,
+            'hits': self.hits,
+            'max_conf': round(float(self.max_conf), 4),
+            'box': [round(float(v), 1) for v in self.best_box],
+            'alerts': self.alerts
+        }
+
+
+class ViolationTracker:
+    """
+    Asocia las cajas de la clase objetivo de cada frame con los tracks abiertos
+    de su fuente: primero por IoU y, si no hay solapamiento, por cercanía del
+    centro (movimientos rápidos o pocas inferencias). Cada track es un evento:
+    alerta al confirmarse (`min_hits` frames) y vuelve a alertar solo tras
+    `realert_seconds`, de modo que el enfriamiento es por persona y no global.
+    """
+    def __init__(self, iou_threshold=0.3, max_age=2.0, min_hits=2, realert_seconds=300, first_id=1):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = max(1, min_hits)
+        self.realert_seconds = realert_seconds
+        self.tracks = {}  # fuente -> [Track]
+        self.ids = itertools.count(first_id)
+
+    def _match(self, tracks, boxes):
+        """Emparejamiento greedy; retorna [(índice de track, índice de caja)]"""
+        if not tracks or len(boxes) == 0:
+            return []
+        previous = np.array([t.box for t in tracks], dtype=np.float32)
+
+        # 1) Por IoU
+        iou = box_iou(previous, boxes)
+        pairs = []
+        while iou.size and iou.max() >= self.iou_threshold:
+            i, j = np.unravel_index(iou.argmax(), iou.shape)
+            pairs.append((int(i), int(j)))
+            iou[i, :] = -1
+            iou[:, j] = -1
+
+        # 2) Por distancia entre centros, relativa al tamaño de la caja del track
+        centers_a = (previous[:, :2] + previous[:, 2:]) / 2
+        centers_b = (boxes[:, :2] + boxes[:, 2:]) / 2
+        sizes = np.maximum(previous[:, 2:] - previous[:, :2], 1).max(axis=1)
+        distance = np.linalg.norm(centers_a[:, None] - centers_b[None], axis=2) / sizes[:, None]
+        for i, j in pairs:
+            distance[i, :] = np.inf
+            distance[:, j] = np.inf
+        while distance.size and distance.min() <= 1.0:
+            i, j = np.unravel_index(distance.argmin(), distance.shape)
+            pairs.append((int(i), int(j)))
+            distance[i, :] = np.inf
+            distance[:, j] = np.inf
+        return pairs
+
+    def update(self, source_id, boxes, confs, now, frame=None, alert=True):
+        """
+        Procesa las cajas en violación de un frame analizado.
+        Retorna (tracks nuevos, tracks que deben alertar, tracks terminados).
+        `frame` se copia solo para tracks confirmados (`min_hits`), al
+        confirmarse y cuando mejora su confianza máxima; los que no llegan a
+        confirmarse no generan incidente y no necesitan captura. Una sola
+        copia por llamada se comparte entre los tracks que la necesiten.
+        Con `alert=False` (violación aún no confirmada) los tracks acumulan
+        detecciones pero no alertan.
+        """
+        tracks = self.tracks.setdefault(source_id, [])
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        confs = np.asarray(confs, dtype=np.float32).reshape(-1)
+        snapshot = None
+
+        def capture(track):
+            nonlocal snapshot
+            if frame is not None and track.hits >= self.min_hits:
+                if snapshot is None:
+                    snapshot = frame.copy()
+                track.best_frame = snapshot
+
+        matched_tracks = set()
+        matched_boxes = set()
+        for i, j in self._match(tracks, boxes):
+            track = tracks[i]
+            track.box = boxes[j]
+            track.last_seen = now
+            track.hits += 1
+            if confs[j] > track.max_conf:
+                track.max_conf = float(confs[j])
+                track.best_box = boxes[j]
+                capture(track)
+            elif track.best_frame is None:
+                capture(track)
+            matched_tracks.add(i)
+            matched_boxes.add(j)
+
+        started = []
+        for j in range(len(boxes)):
+            if j not in matched_boxes:
+                track = Track(next(self.ids), source_id, boxes[j], float(confs[j]), now)
+                capture(track)
+                started.append(track)
+
+        ended = [t for i, t in enumerate(tracks) if i not in matched_tracks and now - t.last_seen > self.max_age]
+        tracks[:] = [t for t in tracks if t not in ended] + started
+
+        alerts = []
+        for track in (tracks if alert else ()):
+            if track.hits < self.min_hits:
+                continue
+            if track.last_alert is None or now - track.last_alert >= self.realert_seconds:
+                track.last_alert = now
+                track.alerts += 1
+                alerts.append(track)
+        return started, alerts, ended
+
+    def active(self, source_id=None):
+        if source_id is not None:
+            return list(self.tracks.get(source_id, []))
+        return [t for tracks in self.tracks.values() for t in tracks]
+
+    def flush(self, source_id=None):
+        """Termina todos los tracks abiertos (por ejemplo al cambiar de fuente)"""
+        sources = [source_id] if source_id is not None else list(self.tracks)
+        ended = []
+        for source in sources:
+            ended += self.tracks.pop(source, [])
+        return ended